@@ -30,7 +30,11 @@ def escape_url(raw):
 
 
 def make_run(rPr, text):
-    return '<w:r>{}{}</w:r>'.format(rPr, "<w:br/>".join(
+    return make_run_from_prefix('<w:r>{}'.format(rPr), text)
+
+
+def make_run_from_prefix(run_prefix, text):
+    return '{}{}</w:r>'.format(run_prefix, "<w:br/>".join(
         ('<w:t xml:space="preserve">{}</w:t>'.format(text) for text in docx_escape(text).split('\n'))
     ))
 
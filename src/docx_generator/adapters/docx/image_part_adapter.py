@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from typing import IO, Dict, Iterable, Union
+
+from docx.document import Document as DocType
+from docx.image.image import Image
+from docx.opc.packuri import PackURI
+from docx.package import ImageParts
+from docx.parts.image import ImagePart
+
+
+class IndexedImageParts(ImageParts):
+    """
+    Image parts of a package, indexed by the sha1 of their content.
+
+    python-docx and docxcompose look for an existing part holding the same image before adding a new one,
+    but hash every image part of the package to do so. The index makes the lookup constant,
+    so that every reference to an image, whichever global or filter added it, points to a single media part.
+    """
+
+    def __init__(self, image_parts: Iterable[ImagePart] = ()):
+        super().__init__()
+        self._parts_by_sha1: Dict[str, ImagePart] = dict()
+        self._used_numbers = set()
+        self._next_number = 1
+
+        for image_part in image_parts:
+            self.append(image_part)
+
+    def append(self, item: ImagePart) -> None:
+        super().append(item)
+        self._parts_by_sha1.setdefault(item.sha1, item)
+        self._used_numbers.add(item.partname.idx)
+
+    def get_or_add_image_part(self, image_descriptor: Union[str, IO[bytes]]) -> ImagePart:
+        image = Image.from_file(image_descriptor)
+        image_part = self._parts_by_sha1.get(image.sha1)
+        if image_part is not None:
+            return image_part
+
+        return self._add_image_part(image)
+
+    def _add_image_part(self, image) -> ImagePart:
+        partname = self._next_image_partname(image.ext)
+        if isinstance(image, Image):
+            image_part = ImagePart.from_image(image, partname)
+        else:
+            # docxcompose copies image parts through a wrapper lacking the Image API, later pictures using the part would fail.
+            # The image is parsed from the blob when needed instead.
+            image_part = ImagePart(partname, image.content_type, image.blob)
+
+        self.append(image_part)
+        return image_part
+
+    def _get_by_sha1(self, sha1: str) -> ImagePart:
+        return self._parts_by_sha1.get(sha1)
+
+    def _next_image_partname(self, ext: str) -> PackURI:
+        while self._next_number in self._used_numbers:
+            self._next_number += 1
+
+        return PackURI('/word/media/image{}.{}'.format(self._next_number, ext))
+
+
+def index_image_parts(document: DocType) -> None:
+    """
+    Replaces the image parts collection of the document package by an IndexedImageParts
+
+    :param document: docx.document.Document
+
+    :return: None
+    """
+    package = document.part.package
+    if isinstance(package.image_parts, IndexedImageParts):
+        return
+
+    # image_parts is a lazy property of the package, stored in the package attributes once computed
+    package.__dict__['image_parts'] = IndexedImageParts(package.image_parts)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import hashlib
+import io
+import re
+import zipfile
+from typing import Iterator
+
+from docx.opc.constants import RELATIONSHIP_TYPE
+from docx.oxml.ns import nsmap
+from docxtpl import DocxTemplate
+from lxml import etree
+
+_JINJA_TAG = re.compile(r'{{.+}}|{%.+%}')
+
+# Paragraphs which may hold a Jinja tag, evaluated by libxml2 on the whole part at once
+_PARAGRAPHS_WITH_JINJA_OPENING = etree.XPath(
+    "//w:p[contains(string(.), '{{') or contains(string(.), '{%')]",
+    namespaces=nsmap
+)
+
+_FOOTNOTES_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml'
+
+
+def _get_part_element(part) -> etree._Element:
+    element = getattr(part, 'element', None)
+    if element is not None:
+        return element
+
+    # docxtpl stores rendered footnotes as a raw xml string
+    blob = part.blob
+    if isinstance(blob, str):
+        blob = blob.encode('utf-8')
+    return etree.fromstring(blob)
+
+
+def _iter_rendered_parts(template: DocxTemplate) -> Iterator[etree._Element]:
+    """
+    Generate the root element of each part rendered by docxtpl: body, headers, footers and footnotes.
+    """
+    document = template.docx
+    yield document.element.body
+
+    for relationship in document.part.rels.values():
+        if relationship.is_external:
+            continue
+        if relationship.reltype in (RELATIONSHIP_TYPE.HEADER, RELATIONSHIP_TYPE.FOOTER):
+            yield _get_part_element(relationship.target_part)
+
+    for part in document.part.package.iter_parts():
+        if part.content_type == _FOOTNOTES_CONTENT_TYPE:
+            yield _get_part_element(part)
+
+
+def has_jinja_tags(template: DocxTemplate) -> bool:
+    """
+    Search for Jinja tags left in the rendered document, stopping at the first one found.
+
+    :param template: DocxTemplate
+        Rendered template
+
+    :return: bool
+    """
+    for part_element in _iter_rendered_parts(template):
+        for paragraph in _PARAGRAPHS_WITH_JINJA_OPENING(part_element):
+            if _JINJA_TAG.search(paragraph.xpath('string(.)')) is not None:
+                return True
+
+    return False
+
+
+def get_rendered_xml_hash(template: DocxTemplate) -> str:
+    """
+    Hash the xml of the rendered parts, to find out whether a render level changed the document.
+
+    :param template: DocxTemplate
+        Rendered template
+
+    :return: str
+    """
+    xml_hash = hashlib.blake2b(digest_size=16)
+    for part_element in _iter_rendered_parts(template):
+        xml_hash.update(etree.tostring(part_element))
+
+    return xml_hash.hexdigest()
+
+
+def get_uncompressed_size(blob: bytes) -> int:
+    """
+    Sum the uncompressed size of the files of a docx package, an estimate of the memory its parsed document takes.
+
+    :param blob: bytes
+        Content of the docx file
+
+    :return: int
+    """
+    with zipfile.ZipFile(io.BytesIO(blob)) as package:
+        return sum(item.file_size for item in package.infolist())
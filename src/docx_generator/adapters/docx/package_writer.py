@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import os
+import struct
+import threading
+import time
+import weakref
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, Iterable, Iterator, List, Tuple, Union
+
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from docx.opc.pkgwriter import _ContentTypesItem
+from docxtpl import DocxTemplate
+
+# Media and embedded packages which are compressed already, deflating them again costs time and saves nothing
+STORED_EXTENSIONS = frozenset(('jpeg', 'jpg', 'jpe', 'png', 'gif', 'wdp', 'docx', 'docm', 'xlsx', 'xlsm', 'pptx', 'pptm', 'zip'))
+
+_LOCAL_FILE_HEADER = struct.Struct('<4s5H3L2H')
+_CENTRAL_DIRECTORY_HEADER = struct.Struct('<4s6H3L5H2L')
+_END_OF_CENTRAL_DIRECTORY = struct.Struct('<4s4H2LH')
+
+_ZIP_VERSION = 20
+_ZIP_STORED = 0
+_ZIP_DEFLATED = 8
+# Read and write permissions of the owner, as zipfile.ZipFile.writestr sets them
+_EXTERNAL_ATTRIBUTES = 0o600 << 16
+# Sizes and offsets above it need the zip64 extensions
+_ZIP_LIMIT = 0xFFFFFFFF
+
+# Thread pools of a writer are not usable in a forked child process
+_writers = weakref.WeakSet()
+
+
+class _Entry(object):
+    __slots__ = ('name', 'method', 'crc', 'size', 'data')
+
+    def __init__(self, name: bytes, method: int, crc: int, size: int, data: bytes):
+        self.name = name
+        self.method = method
+        self.crc = crc
+        self.size = size
+        self.data = data
+
+
+def _compress(name: bytes, blob: bytes, compression_level: int) -> _Entry:
+    # zlib releases the GIL on buffers of this size, so that parts are compressed at the same time
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    data = compressor.compress(blob) + compressor.flush()
+    return _Entry(name, _ZIP_DEFLATED, zlib.crc32(blob), len(blob), data)
+
+
+def _get_dos_time() -> Tuple[int, int]:
+    year, month, day, hour, minute, second = time.localtime()[:6]
+    return hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day
+
+
+def _iter_package_items(template: DocxTemplate) -> Iterator[Tuple[str, bytes]]:
+    """
+    Generate the name and content of each item of the package, in the order python-docx writes them
+    """
+    package = template.docx.part.package
+    parts = list(package.parts)
+    for part in parts:
+        part.before_marshal()
+
+    yield CONTENT_TYPES_URI.membername, _ContentTypesItem.from_parts(parts).blob
+    yield PACKAGE_URI.rels_uri.membername, package.rels.xml
+    for part in parts:
+        yield part.partname.membername, part.blob
+        if len(part.rels):
+            yield part.partname.rels_uri.membername, part.rels.xml
+
+
+class DocxPackageWriter(object):
+    """
+    Writes the package of a rendered template, in place of DocxTemplate.save.
+
+    Media and embedded packages already compressed are stored as they are, other parts are deflated at the configured level.
+    Parts larger than parallel_threshold are compressed over a pool of threads, zlib releasing the GIL while compressing.
+    Templates relying on the media or zip member replacement of docxtpl are saved by docxtpl.
+    """
+
+    def __init__(self, compression_level: int = 6, max_workers: int = None, parallel_threshold: int = 256 * 1024,
+                 stored_extensions: Iterable[str] = STORED_EXTENSIONS):
+        """
+        :param compression_level: int
+            Deflate level of the parts which are not stored, from 1 (fastest) to 9 (smallest)
+        :param max_workers: int
+            Number of parts compressed at the same time (Default value is the number of CPUs)
+        :param parallel_threshold: int
+            Size from which a part is compressed in the pool of threads, in bytes
+        :param stored_extensions: iterable of str
+            Extensions of the parts stored without compression (Default value is STORED_EXTENSIONS)
+        """
+        self._compression_level = compression_level
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._parallel_threshold = parallel_threshold
+        self._stored_extensions = frozenset(extension.lower() for extension in stored_extensions)
+
+        self._reset()
+        _writers.add(self)
+
+    def __getstate__(self):
+        # Sent to the worker processes of a batch generation
+        state = self.__dict__.copy()
+        del state['_executor']
+        del state['_executor_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+        _writers.add(self)
+
+    def _reset(self) -> None:
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='docx-generator-writer')
+
+        return self._executor
+
+    def _make_entry(self, name: str, blob: Union[bytes, str]) -> Union[_Entry, Future]:
+        if isinstance(blob, str):
+            # docxtpl stores rendered footnotes as a raw xml string
+            blob = blob.encode('utf-8')
+        encoded_name = name.encode('utf-8')
+
+        if name.rpartition('.')[2].lower() in self._stored_extensions:
+            return _Entry(encoded_name, _ZIP_STORED, zlib.crc32(blob), len(blob), blob)
+        if self._max_workers > 1 and len(blob) >= self._parallel_threshold:
+            return self._get_executor().submit(_compress, encoded_name, blob, self._compression_level)
+
+        return _compress(encoded_name, blob, self._compression_level)
+
+    @staticmethod
+    def _write_entries(f: IO[bytes], entries: List[_Entry]) -> None:
+        modification_time, modification_date = _get_dos_time()
+        central_directory = []
+        offset = 0
+        for entry in entries:
+            flags = 0x800 if not entry.name.isascii() else 0
+            central_directory.append(_CENTRAL_DIRECTORY_HEADER.pack(
+                b'PK\x01\x02', _ZIP_VERSION, _ZIP_VERSION, flags, entry.method, modification_time, modification_date,
+                entry.crc, len(entry.data), entry.size, len(entry.name), 0, 0, 0, 0, _EXTERNAL_ATTRIBUTES, offset
+            ) + entry.name)
+
+            f.write(_LOCAL_FILE_HEADER.pack(
+                b'PK\x03\x04', _ZIP_VERSION, flags, entry.method, modification_time, modification_date,
+                entry.crc, len(entry.data), entry.size, len(entry.name), 0
+            ))
+            f.write(entry.name)
+            f.write(entry.data)
+            offset += _LOCAL_FILE_HEADER.size + len(entry.name) + len(entry.data)
+
+        central_directory = b''.join(central_directory)
+        f.write(central_directory)
+        f.write(_END_OF_CENTRAL_DIRECTORY.pack(b'PK\x05\x06', 0, 0, len(entries), len(entries), len(central_directory), offset, 0))
+
+    def save(self, template: DocxTemplate, output: Union[str, IO[bytes]]) -> None:
+        """
+        Writes the rendered template to a .docx file
+
+        :param template: DocxTemplate
+            Rendered template
+        :param output: str or file-like object
+            Path of the file, or writable binary stream the document is written to
+
+        :return: None
+        """
+        if template.pics_to_replace or template.crc_to_new_media or template.crc_to_new_embedded or template.zipname_to_replace:
+            template.save(output)
+            return
+
+        entries = [self._make_entry(name, blob) for name, blob in _iter_package_items(template)]
+        entries = [entry.result() if isinstance(entry, Future) else entry for entry in entries]
+
+        archive_size = sum(_LOCAL_FILE_HEADER.size + len(entry.name) + len(entry.data) for entry in entries)
+        if archive_size > _ZIP_LIMIT or len(entries) > 0xFFFF:
+            # Zip64 archives are left to python-docx
+            template.save(output)
+            return
+
+        if hasattr(output, 'write'):
+            self._write_entries(output, entries)
+        else:
+            with open(output, 'wb') as f:
+                self._write_entries(f, entries)
+
+        template.is_saved = True
+
+
+def _reset_writers_after_fork() -> None:
+    for writer in list(_writers):
+        writer._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_writers_after_fork)
+
+
+# Shared by every DocxGenerator of the process unless a dedicated writer is given
+default_package_writer = DocxPackageWriter()
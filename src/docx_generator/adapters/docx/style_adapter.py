@@ -3,15 +3,17 @@ Taken and adapted from Sarna Tool
 https://github.com/rsrdesarrollo/sarna
 """
 
+import hashlib
 import re
-from typing import AnyStr, Set, Dict
+from typing import AnyStr, Dict, FrozenSet, Optional, Set, Tuple
 
-from docx import Document
 from docx.document import Document as DocType
 from docx.table import Table
 from docx.text.paragraph import Paragraph
 from jinja2.exceptions import TemplateSyntaxError
 
+from docx_generator.adapters.docx.docx_adapter import list_level_style
+
 _BEGIN_STYLE = re.compile(r'##\s*begin\s*style\s*(\w+)\s*##', re.IGNORECASE)
 _END_STYLE = re.compile(r'##\s*end\s*style\s*##', re.IGNORECASE)
 _TAG_STYLE = re.compile(r'##\s*(\w+)\s*##', re.IGNORECASE)
@@ -20,6 +22,76 @@ PARAGRAPH_STYLE_TAGS = {'ul', 'ol', 'paragraph', 'code', 'quote', 'image_caption
 RAW_STYLE_TAGS = {'hyperlink', 'strong', 'italic', 'strike', 'inline_code'}
 TABLE_STYLE_TAGS = {'table', }
 
+UNDEFINED_DESCRIPTOR_WARNING = 'Try to use {} on style {} but is not defined'
+
+# Levels of a Word numbering definition
+LIST_LEVELS = 9
+
+
+def _get_list_levels(pPr: Optional[str]) -> Optional[Tuple[str, ...]]:
+    if pPr is None:
+        return None
+
+    # A nested item closes the paragraph of its parent item, which is left open to hold it
+    return tuple(
+        ('<w:p>' if level == 0 else '</w:p><w:p>') + list_level_style(pPr, level)
+        for level in range(LIST_LEVELS)
+    )
+
+
+class CompiledStyle(object):
+    """
+    Immutable form of a style, holding the XML fragments written by the renderer as they are,
+    so that rendering does no string processing on the style.
+
+    Paragraph descriptors hold their pPr, run descriptors the opening of their run, rPr included,
+    and lists the opening of their item paragraph for each list level.
+    Undefined descriptors are listed in undefined, and rendered as they were before being compiled.
+    """
+    __slots__ = ('name', 'paragraph', 'code', 'quote', 'image_caption', 'headers', 'table', 'hyperlink',
+                 'strong_run', 'italic_run', 'strike_run', 'inline_code_run', 'ul', 'ol', 'ul_levels', 'ol_levels',
+                 'undefined', 'warnings')
+
+    def __init__(self, name: str, descriptors: Dict[str, Optional[str]], warnings: FrozenSet[str] = frozenset()):
+        """
+        :param name: str
+        :param descriptors: dict
+            XML of each descriptor of the style, None when undefined
+        :param warnings: frozenset of str
+            Warnings raised while defining the style
+        """
+        values = dict(
+            name=name,
+            paragraph=descriptors['paragraph'],
+            code=descriptors['code'],
+            quote=descriptors['quote'],
+            image_caption=descriptors['image_caption'],
+            headers=tuple(descriptors['header{}'.format(level)] for level in range(1, 6)),
+            table=descriptors['table'],
+            hyperlink=descriptors['hyperlink'],
+            strong_run='<w:r>{}'.format(descriptors['strong']),
+            italic_run='<w:r>{}'.format(descriptors['italic']),
+            strike_run='<w:r>{}'.format(descriptors['strike']),
+            inline_code_run='<w:r>{}'.format(descriptors['inline_code']),
+            ul=descriptors['ul'],
+            ol=descriptors['ol'],
+            ul_levels=_get_list_levels(descriptors['ul']),
+            ol_levels=_get_list_levels(descriptors['ol']),
+            undefined=frozenset(descriptor for descriptor, value in descriptors.items() if value is None),
+            warnings=frozenset(warnings)
+        )
+        for attribute, value in values.items():
+            object.__setattr__(self, attribute, value)
+
+    def __setattr__(self, attribute, value):
+        raise AttributeError('CompiledStyle is immutable')
+
+    def __delattr__(self, attribute):
+        raise AttributeError('CompiledStyle is immutable')
+
+    def get_undefined_warning(self, descriptor: str) -> str:
+        return UNDEFINED_DESCRIPTOR_WARNING.format(descriptor, self.name)
+
 
 class DocxStyleAdapter:
     name: AnyStr
@@ -72,6 +144,10 @@ class DocxStyleAdapter:
 
         self.name = kwargs.pop('name')
         self._warnings = set()
+        # Each style has its own descriptors, undefined descriptors stay None
+        self._data = dict.fromkeys(self._data)
+        # Identifies the content of the style, whichever template it is defined in
+        self.content_hash = hashlib.sha256(repr(sorted(kwargs.items())).encode('utf-8')).hexdigest()
 
         for k, v in kwargs.items():
             if k in self._data and not k.startswith('_'):
@@ -81,12 +157,21 @@ class DocxStyleAdapter:
                     'Invalid style descriptor {} on style name {}'.format(k, self.name)
                 )
 
+        # Used by the renderer instead of the descriptors
+        self.compiled = CompiledStyle(self.name, self._data, frozenset(self._warnings))
+
+    def get_descriptors(self) -> Dict[str, str]:
+        """
+        Returns the XML of each defined descriptor of the style, from which the style can be defined again
+
+        :return: dict
+        """
+        return {descriptor: value for descriptor, value in self._data.items() if value is not None}
+
     def __getattr__(self, item):
         attr = self._data.get(item, None)
         if attr is None:
-            self._warnings.add(
-                "Try to use {} on style {} but is not defined".format(item, self.name)
-            )
+            self._warnings.add(UNDEFINED_DESCRIPTOR_WARNING.format(item, self.name))
         return attr
 
 
@@ -136,13 +221,23 @@ def _iter_block_items(parent):
             yield Table(child, parent)
 
 
-def get_document_render_styles(doc_path) -> RenderStylesCollection:
-    styles = RenderStylesCollection()
+def get_document_render_styles(doc: DocType, remove_definitions: bool = False) -> RenderStylesCollection:
+    """
+    Extract the render styles declared in an already loaded document, in a single pass over its body.
+
+    :param doc: docx.document.Document
+        Document containing the style definition blocks
+    :param remove_definitions: bool
+        Remove the style definition blocks from the document once extracted
+        (Default value is False)
 
-    doc: DocType = Document(doc_path)
+    :return: RenderStylesCollection
+    """
+    styles = RenderStylesCollection()
 
     style_name = None
     attrs = dict()
+    definition_elements = []
 
     for element in _iter_block_items(doc):
         if not style_name and not isinstance(element, Paragraph):
@@ -152,8 +247,11 @@ def get_document_render_styles(doc_path) -> RenderStylesCollection:
             match = _BEGIN_STYLE.match(element.text)
             if match:
                 style_name = match.group(1)
+                definition_elements.append(element._element)
 
         else:
+            definition_elements.append(element._element)
+
             if isinstance(element, Table):
                 attrs['table'] = element._tblPr.xml
             else:
@@ -186,4 +284,10 @@ def get_document_render_styles(doc_path) -> RenderStylesCollection:
             None
         )
 
+    if remove_definitions:
+        for definition_element in definition_elements:
+            # A paragraph holding a section break is kept so that the document layout is not changed
+            if not definition_element.xpath('./w:pPr/w:sectPr'):
+                definition_element.getparent().remove(definition_element)
+
     return styles
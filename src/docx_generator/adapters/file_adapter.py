@@ -20,19 +20,22 @@
 
 import os
 from logging import Logger
+from typing import Dict
 
 from docx_generator.adapters.uuid_adapter import is_a_valid_uuid
 from docx_generator.exceptions.rendering_error import RenderingError
 
 
-def recover_file_path_from_uuid(logger: Logger, label: str, base_path: str, file_uuid: str) -> str:
+def _check_uuid(logger: Logger, label: str, file_uuid: str) -> None:
     if not is_a_valid_uuid(file_uuid):
         raise RenderingError(logger, '{}. File uuid is not a valid uuid: {}'.format(label, file_uuid))
 
-    file_folder_path = os.path.join(base_path, file_uuid)
-    if not os.path.isdir(file_folder_path):
-        raise RenderingError(logger, '{}. Generator can not find file folder.'.format(label), '{}. Processed folder does not exist: {}'.format(label, file_folder_path))
 
+def _raise_missing_folder(logger: Logger, label: str, file_folder_path: str) -> None:
+    raise RenderingError(logger, '{}. Generator can not find file folder.'.format(label), '{}. Processed folder does not exist: {}'.format(label, file_folder_path))
+
+
+def _get_single_file_path(logger: Logger, label: str, file_folder_path: str, file_uuid: str) -> str:
     available_files = os.listdir(file_folder_path)
 
     if len(available_files) > 1:
@@ -41,3 +44,73 @@ def recover_file_path_from_uuid(logger: Logger, label: str, base_path: str, file
     file_name = available_files[0]
 
     return os.path.abspath(os.path.join(file_folder_path, file_name))
+
+
+def recover_file_path_from_uuid(logger: Logger, label: str, base_path: str, file_uuid: str, uuid_folder_index: 'UuidFolderIndex' = None) -> str:
+    if uuid_folder_index is not None:
+        return uuid_folder_index.recover_file_path(logger, label, file_uuid)
+
+    _check_uuid(logger, label, file_uuid)
+
+    file_folder_path = os.path.join(base_path, file_uuid)
+    if not os.path.isdir(file_folder_path):
+        _raise_missing_folder(logger, label, file_folder_path)
+
+    return _get_single_file_path(logger, label, file_folder_path, file_uuid)
+
+
+class UuidFolderIndex(object):
+    """
+    Folders of a base path, listed with a single scandir pass on the first lookup.
+
+    Files stored in uuid folders are then found without checking the folder exists, and each folder is only listed once.
+    The index is meant to live for one generation. A uuid missing from the listing, written with another case on a
+    case insensitive filesystem or created meanwhile, is looked up on the filesystem as without the index.
+    """
+
+    def __init__(self, base_path: str):
+        self._base_path = base_path
+        self._folder_paths: Dict[str, str] = None
+        self._file_paths: Dict[str, str] = dict()
+
+    def _get_folder_paths(self) -> Dict[str, str]:
+        if self._folder_paths is None:
+            folder_paths = dict()
+            try:
+                with os.scandir(self._base_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            folder_paths[entry.name] = entry.path
+            except OSError:
+                pass
+            self._folder_paths = folder_paths
+
+        return self._folder_paths
+
+    def recover_file_path(self, logger: Logger, label: str, file_uuid: str) -> str:
+        """
+        Returns the absolute path of the single file stored in the folder named after the uuid
+
+        :param logger: Logger
+        :param label: str
+            Kind of file looked for, used in error messages
+        :param file_uuid: str
+
+        :return: str
+        """
+        file_path = self._file_paths.get(file_uuid)
+        if file_path is not None:
+            return file_path
+
+        _check_uuid(logger, label, file_uuid)
+
+        file_folder_path = self._get_folder_paths().get(file_uuid)
+        if file_folder_path is None:
+            file_folder_path = os.path.join(self._base_path, file_uuid)
+            if not os.path.isdir(file_folder_path):
+                _raise_missing_folder(logger, label, file_folder_path)
+
+        file_path = _get_single_file_path(logger, label, file_folder_path, file_uuid)
+        self._file_paths[file_uuid] = file_path
+
+        return file_path
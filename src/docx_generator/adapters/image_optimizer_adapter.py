@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import hashlib
+import logging
+import math
+import os
+import tempfile
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+_EMU_PER_INCH = 914400
+
+_READ_CHUNK_SIZE = 64 * 1024
+
+# Thread pools of an optimizer are not usable in a forked child process
+_optimizers = weakref.WeakSet()
+
+
+def _hash_file(path: str) -> str:
+    content_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK_SIZE), b''):
+            content_hash.update(chunk)
+
+    return content_hash.hexdigest()
+
+
+def _chain_future(source: Future, destination: Future, transform=None) -> None:
+    def copy_result(future: Future):
+        if future.cancelled():
+            destination.cancel()
+        elif future.exception() is not None:
+            destination.set_exception(future.exception())
+        elif transform is None:
+            destination.set_result(future.result())
+        else:
+            try:
+                _chain_future(transform(future.result()), destination)
+            except Exception as e:
+                destination.set_exception(e)
+
+    source.add_done_callback(copy_result)
+
+
+class ImageOptimizer(object):
+    """
+    Resamples images to the width they are displayed at and re-encodes them, before they are embedded in a document.
+
+    Images wider than the page at the configured resolution are downsampled. JPEG images are re-encoded without
+    their EXIF metadata once rotated as their EXIF orientation says, which also avoids the EXIF headers python-docx
+    can not read. Images in other formats than JPEG, PNG and GIF are converted to PNG.
+    An image gaining nothing from it is embedded as is.
+
+    Results are stored in cache_directory under the hash of the original content and of the settings,
+    so that an image is only processed once. Images are processed over a pool of threads, Pillow releasing the GIL
+    while decoding, resampling and encoding.
+    Requires Pillow, installed with the `images` extra of the package.
+    """
+
+    def __init__(self, cache_directory: str, dpi: int = 150, jpeg_quality: int = 85, max_workers: int = None):
+        """
+        :param cache_directory: str
+            Directory where processed images are stored, created if needed
+        :param dpi: int
+            Resolution of the images once displayed at page width
+        :param jpeg_quality: int
+            Quality of the re-encoded JPEG images, from 1 to 95
+        :param max_workers: int
+            Number of images processed at the same time (Default value is the number of CPUs)
+        """
+        if Image is None:
+            raise ImportError('Pillow is required to optimize images, install it with the "images" extra of docx-generator')
+
+        self._cache_directory = cache_directory
+        Path(cache_directory).mkdir(parents=True, exist_ok=True)
+
+        self._dpi = dpi
+        self._jpeg_quality = jpeg_quality
+        self._max_workers = max_workers or os.cpu_count() or 1
+
+        self._reset()
+        _optimizers.add(self)
+
+        self._logger = logging.getLogger(__name__)
+
+    def __getstate__(self):
+        # Sent to the worker processes of a batch generation
+        state = self.__dict__.copy()
+        del state['_executor']
+        del state['_executor_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+        _optimizers.add(self)
+
+    def _reset(self) -> None:
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_target_width(self, max_width: int) -> int:
+        return max(1, math.ceil(max_width / _EMU_PER_INCH * self._dpi))
+
+    def _get_cache_path(self, content_hash: str, target_width: int, extension: str) -> str:
+        return os.path.join(self._cache_directory, '{}-{}-{}-{}{}'.format(content_hash, target_width, self._dpi, self._jpeg_quality, extension))
+
+    def _encode(self, image_path: str, target_width: int):
+        """
+        Returns the processed image with its save options and file extension, or None when the original image should be kept
+        """
+        with Image.open(image_path) as image:
+            image_format = image.format
+            is_jpeg = image_format == 'JPEG'
+            has_exif = is_jpeg and 'exif' in image.info
+
+            if image_format == 'GIF' and getattr(image, 'is_animated', False):
+                return None
+
+            processed_image = ImageOps.exif_transpose(image) if has_exif else image
+            is_resized = processed_image.width > target_width
+            if is_resized:
+                target_height = max(1, round(processed_image.height * target_width / processed_image.width))
+                processed_image = processed_image.resize((target_width, target_height), Image.LANCZOS)
+
+            if not is_resized and not has_exif and image_format in ('JPEG', 'PNG', 'GIF'):
+                return None
+
+            if processed_image is image:
+                # The opened image is closed when leaving this block
+                processed_image = image.copy()
+
+            options = dict()
+            if is_resized:
+                # Displayed at page width by default
+                options['dpi'] = (self._dpi, self._dpi)
+            elif 'dpi' in image.info:
+                options['dpi'] = image.info['dpi']
+
+            if is_jpeg:
+                if processed_image.mode not in ('RGB', 'L'):
+                    processed_image = processed_image.convert('RGB')
+                options.update(format='JPEG', quality=self._jpeg_quality, optimize=True)
+                return processed_image, options, '.jpg'
+
+            if processed_image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                processed_image = processed_image.convert('RGBA')
+            options.update(format='PNG', optimize=True)
+            return processed_image, options, '.png'
+
+    def optimize(self, image_path: str, max_width: int) -> str:
+        """
+        Returns the path of the processed image, or image_path when the image is kept as is
+
+        :param image_path: str
+        :param max_width: int
+            Width the image is displayed at, in EMU
+
+        :return: str
+        """
+        target_width = self._get_target_width(max_width)
+        content_hash = _hash_file(image_path)
+        for extension in ('.jpg', '.png', ''):
+            cache_path = self._get_cache_path(content_hash, target_width, extension)
+            if os.path.isfile(cache_path):
+                return image_path if extension == '' else cache_path
+
+        try:
+            encoded_image = self._encode(image_path, target_width)
+        except Exception as e:
+            self._logger.debug('Image could not be optimized, embedding it as is {}: {}'.format(image_path, e.__str__()))
+            return image_path
+
+        if encoded_image is None:
+            # Empty marker, the original image is kept without opening it again
+            Path(self._get_cache_path(content_hash, target_width, '')).touch()
+            return image_path
+
+        processed_image, options, extension = encoded_image
+        cache_path = self._get_cache_path(content_hash, target_width, extension)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self._cache_directory, prefix='.tmp-')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as f:
+                processed_image.save(f, **options)
+            os.replace(temporary_path, cache_path)
+        except Exception as e:
+            os.remove(temporary_path)
+            self._logger.debug('Image could not be optimized, embedding it as is {}: {}'.format(image_path, e.__str__()))
+            return image_path
+
+        self._logger.debug('Image optimized: {} to {}'.format(image_path, cache_path))
+        return cache_path
+
+    def submit(self, image_path: Future, max_width: int) -> Future:
+        """
+        Optimizes the image in the background, once its path is known
+
+        :param image_path: concurrent.futures.Future
+            Future of the path of the image, an image being downloaded for instance
+        :param max_width: int
+            Width the image is displayed at, in EMU
+
+        :return: concurrent.futures.Future
+            Future of the path of the processed image
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='docx-generator-optimizer')
+
+        optimized_image_path = Future()
+        _chain_future(image_path, optimized_image_path, lambda path: self._executor.submit(self.optimize, path, max_width))
+
+        return optimized_image_path
+
+
+def _reset_optimizers_after_fork() -> None:
+    for optimizer in list(_optimizers):
+        optimizer._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_optimizers_after_fork)
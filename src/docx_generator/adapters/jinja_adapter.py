@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import hashlib
+from typing import Any, MutableMapping, Optional, Type, Union
+
+from jinja2 import Environment, Template
+from jinja2.bccache import Bucket
+
+
+class BytecodeCachingEnvironment(Environment):
+    """
+    Environment looking up the compiled code of templates given as strings in its bytecode cache.
+
+    Jinja2 only uses the bytecode cache for templates found by a loader, while docxtpl compiles each part
+    of a document from a string. Compiled code is keyed by the hash of the source and of the autoescape setting,
+    so a bytecode cache must only be shared by environments configured alike.
+    """
+
+    def from_string(self, source: Union[str, Any], globals: Optional[MutableMapping[str, Any]] = None,
+                    template_class: Optional[Type[Template]] = None) -> Template:
+        if self.bytecode_cache is None or not isinstance(source, str):
+            return super().from_string(source, globals, template_class)
+
+        source_hash = hashlib.sha256(repr(self.autoescape).encode('utf-8'))
+        source_hash.update(source.encode('utf-8'))
+        key = source_hash.hexdigest()
+
+        bucket = Bucket(self, key, key)
+        self.bytecode_cache.load_bytecode(bucket)
+        if bucket.code is None:
+            bucket.code = self.compile(source)
+            self.bytecode_cache.dump_bytecode(bucket)
+
+        cls = template_class or self.template_class
+        return cls.from_code(self, bucket.code, self.make_globals(globals), None)
+
+    def bind(self) -> 'BytecodeCachingEnvironment':
+        """
+        Returns an overlay of the environment sharing its configuration and bytecode cache,
+        with its own filters and globals so that those of a render are not seen by other renders
+
+        :return: BytecodeCachingEnvironment
+        """
+        environment = self.overlay()
+        environment.filters = dict(self.filters)
+        environment.globals = dict(self.globals)
+
+        return environment
@@ -19,38 +19,138 @@
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import functools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List
 
+_MAX_DUMP_TEXT_LENGTH = 80
 
-def to_dict(obj, classkey=None):
-    # https://stackoverflow.com/questions/1036409/recursively-convert-python-object-graph-to-dictionary
-    if isinstance(obj, dict):
-        data = {}
-        for (k, v) in obj.items():
-            data[k] = to_dict(v, classkey)
-        return data
-    elif hasattr(obj, "_ast"):
-        return to_dict(obj._ast())
-    elif hasattr(obj, "__iter__") and not isinstance(obj, str):
-        return [to_dict(v, classkey) for v in obj]
-    elif hasattr(obj, "__dict__"):
-        data = dict([(key, to_dict(value, classkey)) for key, value in obj.__dict__.items() if not callable(value) and not key.startswith('_')])
-        if classkey is not None and hasattr(obj, "__class__"):
-            data[classkey] = obj.__class__.__name__
-        return data
-    else:
-        return obj
-
-
-def debug_token_rendering(label):
-    def decorator(function):
-        @functools.wraps(function)
-        def wrapper(*args, **kwargs):
+
+def dump_token(token: Any, max_depth: int = 3, max_children: int = 10) -> Any:
+    """
+    Returns a bounded dict view of a mistletoe token: nested children are cut at max_depth,
+    only the first max_children children of a token are kept and long texts are truncated.
+
+    :param token: mistletoe token
+    :param max_depth: int
+    :param max_children: int
+
+    :return: dict
+    """
+    dump = {'type': token.__class__.__name__}
+    for key, value in vars(token).items():
+        if key.startswith('_') or key == 'children' or callable(value):
+            continue
+        if isinstance(value, str) and len(value) > _MAX_DUMP_TEXT_LENGTH:
+            value = value[:_MAX_DUMP_TEXT_LENGTH] + '...'
+        elif not isinstance(value, (str, int, float, bool, type(None))):
+            value = repr(value)[:_MAX_DUMP_TEXT_LENGTH]
+        dump[key] = value
+
+    children = getattr(token, 'children', None)
+    if children:
+        children = list(children)
+        if max_depth <= 0:
+            dump['children'] = '{} children'.format(len(children))
+        else:
+            dump['children'] = [dump_token(child, max_depth - 1, max_children) for child in children[:max_children]]
+            if len(children) > max_children:
+                dump['children'].append('{} more children'.format(len(children) - max_children))
+
+    return dump
+
+
+class TokenTracer(object):
+    """
+    Traces the tokens rendered by a mistletoe renderer: number of calls and cumulative time per token type,
+    and optionally bounded dumps of the first rendered tokens.
+
+    Tracing is set up by wrapping the render functions of the renderer render map,
+    a renderer without tracer runs its plain render functions.
+    Cumulative time of a token type includes the time spent rendering the tokens it contains.
+    The worker processes of a batch generation trace tokens in their own copy of the tracer, their counts are not sent back.
+    """
+
+    def __init__(self, max_dumps: int = 0, max_dump_depth: int = 3, log_tokens: bool = False):
+        """
+        :param max_dumps: int
+            Number of rendered tokens to keep a dump of
+        :param max_dump_depth: int
+            Depth of the children kept in each dump
+        :param log_tokens: bool
+            Log each rendered token in debug, with a bounded dump of it
+        """
+        self._max_dumps = max_dumps
+        self._max_dump_depth = max_dump_depth
+        self._log_tokens = log_tokens
+
+        self._counts: Dict[str, int] = dict()
+        self._times: Dict[str, float] = dict()
+        self._dumps: List[Dict] = []
+        self._lock = threading.Lock()
+
+        self._logger = logging.getLogger(__name__)
+
+    def __getstate__(self):
+        # Sent to the worker processes of a batch generation
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _trace(self, token_type: str, render_function: Callable) -> Callable:
+        @functools.wraps(render_function)
+        def traced_render_function(token, *args, **kwargs):
+            if self._log_tokens:
+                self._logger.debug('Rendering {} {}'.format(token_type, dump_token(token, self._max_dump_depth)))
+            if len(self._dumps) < self._max_dumps:
+                with self._lock:
+                    if len(self._dumps) < self._max_dumps:
+                        self._dumps.append(dump_token(token, self._max_dump_depth))
+
+            start = time.perf_counter()
             try:
-                args[0]._logger.debug('{} {}'.format(label, to_dict(args[1])))
-            except Exception:
-                pass
-            return function(*args, **kwargs)
+                return render_function(token, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self._counts[token_type] = self._counts.get(token_type, 0) + 1
+                    self._times[token_type] = self._times.get(token_type, 0.0) + elapsed
+
+        return traced_render_function
+
+    def instrument(self, render_map: Dict[str, Callable]) -> None:
+        """
+        Wraps every render function of a renderer render map
+
+        :param render_map: dict
+            render_map of a mistletoe renderer, modified in place
+
+        :return: None
+        """
+        for token_type, render_function in render_map.items():
+            render_map[token_type] = self._trace(token_type, render_function)
+
+    def get_statistics(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the number of calls and the cumulative time in seconds of each rendered token type
+
+        :return: dict
+            {token type: {'count': int, 'time': float}}
+        """
+        with self._lock:
+            return {token_type: {'count': count, 'time': self._times[token_type]} for token_type, count in self._counts.items()}
 
-        return wrapper
+    def get_dumps(self) -> List[Dict]:
+        with self._lock:
+            return list(self._dumps)
 
-    return decorator
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._times.clear()
+            self._dumps.clear()
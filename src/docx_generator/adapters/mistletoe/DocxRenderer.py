@@ -4,16 +4,39 @@ https://github.com/rsrdesarrollo/sarna
 """
 import logging
 import re
+from typing import Optional
 
 from docxtpl import DocxTemplate
+import mistletoe
 from mistletoe.base_renderer import BaseRenderer
 
 from docx_generator.adapters.docx.docx_adapter import make_run, escape_url, make_paragraph, list_level_style, \
-    make_table, make_table_row, make_table_cell, make_hyperlink_run
-from docx_generator.adapters.docx.style_adapter import DocxStyleAdapter
-from docx_generator.adapters.logging_adapter import debug_token_rendering
+    make_table, make_table_row, make_table_cell, make_hyperlink_run, make_run_from_prefix
+from docx_generator.adapters.docx.style_adapter import CompiledStyle, DocxStyleAdapter
+from docx_generator.adapters.logging_adapter import TokenTracer
+from docx_generator.cache.markdown_cache import LINK_PLACEHOLDER
 from docx_generator.globals.picture_globals import PictureGlobals
 
+# Anything mistletoe could parse as something else than paragraphs of raw text: inline syntax, HTML, line separators
+# other than \n, indented code, hard line breaks, stripped whitespace, list items, setext headings and thematic breaks
+_MARKDOWN_SYNTAX = re.compile(
+    r'[\\`*_\[\]<>#~|\x00-\x08\x0b-\x1f\x7f\x85\u2028\u2029]'
+    r'|^[ \t]|[ \t]$'
+    r'|^(?:[-+=]|\d{0,9}[.)])',
+    re.MULTILINE
+)
+
+
+def is_plain_text(text: str) -> bool:
+    """
+    Tells whether the text holds no markdown syntax, mistletoe parsing it as paragraphs of raw text
+
+    :param text: str
+
+    :return: bool
+    """
+    return _MARKDOWN_SYNTAX.search(text) is None
+
 
 class DocxRenderer(BaseRenderer):
     """
@@ -23,11 +46,17 @@ class DocxRenderer(BaseRenderer):
 
     def __call__(self, *args, **kwargs):
         self.warnings = set()
+        self.link_urls = []
+        self.has_images = False
         return self
 
-    def __init__(self, docx: DocxTemplate, image_handler: PictureGlobals = None):
+    def __init__(self, docx: DocxTemplate, image_handler: PictureGlobals = None, token_tracer: TokenTracer = None):
         self.warnings = set()
+        # Hyperlinks are rendered with placeholders, replaced by relationship ids once the rendered XML is added to the document
+        self.link_urls = []
+        self.has_images = False
         self.style = None
+        self._style: CompiledStyle = None
         self._template = docx
         self._image_handler = image_handler
         self._suppress_ptag_stack = [False]
@@ -40,41 +69,95 @@ class DocxRenderer(BaseRenderer):
 
         super().__init__()
 
+        if token_tracer is None and self._logger.isEnabledFor(logging.DEBUG):
+            token_tracer = TokenTracer(log_tokens=True)
+        # Render functions are only wrapped when tracing, untraced rendering has no overhead
+        if token_tracer is not None:
+            token_tracer.instrument(self.render_map)
+
     def set_style(self, style: DocxStyleAdapter):
         self.style = style
+        self._style = style.compiled
+
+    def build_url_id(self, url: str) -> str:
+        return self._template.build_url_id(url)
+
+    def render_plain_text(self, text: str) -> Optional[str]:
+        """
+        Renders text holding no markdown syntax as mistletoe would, without tokenizing it.
+        Warnings are reset as for a full render.
+
+        :param text: str
+            Markdown text, without the line ending added by the filter
+
+        :return: str
+            XML of the paragraphs of the text, None when the text may hold markdown syntax
+        """
+        if not is_plain_text(text):
+            return None
 
-    def _render_standard_run(self, token, style_name: str):
+        self()
+        paragraphs = []
+        for block in text.split('\n\n'):
+            block = block.strip('\n')
+            if not block:
+                continue
+
+            # '<' and '>' are markdown syntax, only '&' is left to escape
+            if '&' in block:
+                block = block.replace('&', '&amp;')
+            runs = '</w:t></w:r><w:br/><w:r><w:t xml:space="preserve">'.join(block.split('\n'))
+            paragraphs.append('<w:p>{}<w:r><w:t xml:space="preserve">{}</w:t></w:r></w:p>'.format(self._style.paragraph, runs))
+
+        if paragraphs:
+            self._check_defined('paragraph')
+        self.warnings = self.warnings | self._style.warnings
+
+        return ''.join(paragraphs)
+
+    def render_markdown(self, text: str) -> str:
+        """
+        Renders a markdown text with the current style
+
+        :param text: str
+
+        :return: str
+            XML of the text
+        """
+        return mistletoe.markdown(text, self)
+
+    def _check_defined(self, descriptor: str) -> None:
+        if descriptor in self._style.undefined:
+            self.warnings.add(self._style.get_undefined_warning(descriptor))
+
+    def _render_standard_run(self, token, run_prefix: str, style_name: str):
+        self._check_defined(style_name)
         self._suppress_rtag_stack.append(True)
-        render = make_run(getattr(self.style, style_name), self.render_inner(token))
+        render = make_run_from_prefix(run_prefix, self.render_inner(token))
         self._suppress_rtag_stack.pop()
         return str(render)
 
     # TODO: Factorize code
-    @debug_token_rendering('Rendering Strong.')
     def render_strong(self, token):
-        return self._render_standard_run(token, 'strong')
+        return self._render_standard_run(token, self._style.strong_run, 'strong')
 
-    @debug_token_rendering('Rendering Emphasis.')
     def render_emphasis(self, token):
-        return self._render_standard_run(token, 'italic')
+        return self._render_standard_run(token, self._style.italic_run, 'italic')
 
-    @debug_token_rendering('Rendering Inline Code.')
     def render_inline_code(self, token):
-        return self._render_standard_run(token, 'inline_code')
+        return self._render_standard_run(token, self._style.inline_code_run, 'inline_code')
 
-    @debug_token_rendering('Rendering Strikethrough.')
     def render_strikethrough(self, token):
-        return self._render_standard_run(token, 'strike')
+        return self._render_standard_run(token, self._style.strike_run, 'strike')
 
-    @debug_token_rendering('Rendering Image.')
     def render_image(self, token):
+        self.has_images = True
         if self._image_handler is not None:
             self._image_handler.set_template(self._template)
             image = self._image_handler.add_picture(token.src)
             return str(image)
         return ''
 
-    @debug_token_rendering('Rendering Link.')
     def render_link(self, token):
         target = escape_url(token.target)
 
@@ -83,12 +166,13 @@ class DocxRenderer(BaseRenderer):
 
         self._suppress_rtag_stack.append(True)
         inner = self.render_inner(token)
-        xml = make_hyperlink_run(self.style.hyperlink, inner, self._template.build_url_id(target))
+        self._check_defined('hyperlink')
+        xml = make_hyperlink_run(self._style.hyperlink, inner, LINK_PLACEHOLDER.format(len(self.link_urls)))
+        self.link_urls.append(target)
         self._suppress_rtag_stack.pop()
 
         return str(xml)
 
-    @debug_token_rendering('Rendering Raw Text.')
     def render_raw_text(self, token):
         text = token.content.rstrip('\n').rstrip('\a')
         if self._suppress_rtag_stack[-1]:
@@ -96,36 +180,41 @@ class DocxRenderer(BaseRenderer):
         else:
             return make_run('', text)
 
-    @debug_token_rendering('Rendering Heading.')
     def render_heading(self, token):
-        style = getattr(self.style, 'header' + str(token.level))
+        if token.level <= len(self._style.headers):
+            self._check_defined('header' + str(token.level))
+            style = self._style.headers[token.level - 1]
+        else:
+            self.warnings.add(self._style.get_undefined_warning('header' + str(token.level)))
+            style = None
         return make_paragraph(style, self.render_inner(token))
 
-    @debug_token_rendering('Rendering Paragraph.')
     def render_paragraph(self, token):
         inner = self.render_inner(token)
 
         try:
             style = self._mod_pstyle_stack.pop()
         except IndexError:
-            style = self.style.paragraph
+            self._check_defined('paragraph')
+            style = self._style.paragraph
 
         if self._suppress_ptag_stack[-1]:
             return inner
 
         return make_paragraph(style, inner)
 
-    @debug_token_rendering('Rendering Block Code.')
     def render_block_code(self, token):
-        style = self.style.code
+        self._check_defined('code')
+        style = self._style.code
         return make_paragraph(style, self.render_inner(token))
 
-    @debug_token_rendering('Rendering List.')
     def render_list(self, token):
         if token.start:
-            self._list_style_stack.append(self.style.ol)
+            self._check_defined('ol')
+            self._list_style_stack.append((self._style.ol, self._style.ol_levels))
         else:
-            self._list_style_stack.append(self.style.ul)
+            self._check_defined('ul')
+            self._list_style_stack.append((self._style.ul, self._style.ul_levels))
         self._list_level += 1
 
         inner = self.render_inner(token)
@@ -134,61 +223,60 @@ class DocxRenderer(BaseRenderer):
         self._list_style_stack.pop()
         return inner
 
-    @debug_token_rendering('Rendering List Item.')
     def render_list_item(self, token):
-        style = self._list_style_stack[-1]
+        style, levels = self._list_style_stack[-1]
         self._suppress_ptag_stack.append(True)
         inner = self.render_inner(token)
         self._suppress_ptag_stack.pop()
-        return make_paragraph(list_level_style(style, self._list_level), inner, self._list_level > 0)
 
-    @debug_token_rendering('Rendering Escape Sequence.')
+        if levels is None or self._list_level >= len(levels):
+            return make_paragraph(list_level_style(style, self._list_level), inner, self._list_level > 0)
+
+        # Opening of the item paragraph, compiled with the style
+        if self._list_level > 0:
+            return levels[self._list_level] + inner
+        return levels[0] + inner + '</w:p>'
+
     def render_escape_sequence(self, token):
         return self.render_inner(token)
 
-    @debug_token_rendering('Rendering Line Break.')
     def render_line_break(self, token):
         return '<w:br/>'
 
-    @debug_token_rendering('Rendering Thematic Break. NOT IMPLEMENTED.')
     def render_thematic_break(self, token):
         self.warnings.add('Markdown ThematicBreak is not implemented. It will be ignored')
         return ''
 
-    @debug_token_rendering('Rendering Quote.')
     def render_quote(self, token):
-        style = self.style.quote
+        self._check_defined('quote')
+        style = self._style.quote
         return make_paragraph(style, self.render_inner(token.children[0]))
 
-    @debug_token_rendering('Rendering Auto Link. NOT IMPLEMENTED.')
     def render_auto_link(self, token):
         self.warnings.add('Markdown AutoLink is not implemented. It will be ignored')
         return ''
 
-    @debug_token_rendering('Rendering Table.')
     def render_table(self, token):
         header = self.render(token.header)
         content = self.render_inner(token)
-        return make_table(self.style.table, header, content)
+        self._check_defined('table')
+        return make_table(self._style.table, header, content)
 
-    @debug_token_rendering('Rendering Table Row.')
     def render_table_row(self, token, is_header=False):
         content = self.render_inner(token)
         return make_table_row(content)
 
-    @debug_token_rendering('Rendering Table Cell.')
     def render_table_cell(self, token, in_header=False):
         content = self.render_inner(token)
-        return make_table_cell(self.style.paragraph, content)
+        self._check_defined('paragraph')
+        return make_table_cell(self._style.paragraph, content)
 
-    @debug_token_rendering('Rendering Separator.')
     def render_separator(self, token):
         return '<w:p></w:p>'
 
-    @debug_token_rendering('Rendering Document.')
     def render_document(self, token):
         self.footnotes.update(token.footnotes)
         return_value = self.render_inner(token)
-        self.warnings = self.warnings | self.style._warnings
+        self.warnings = self.warnings | self._style.warnings
 
         return return_value
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Mapping, Optional
+
+from docx_generator.cache.image_cache import ImageDownloadCache
+from docx_generator.exceptions.rendering_error import RenderingError
+
+# Threads and connections of a fetcher are not usable in a forked child process
+_fetchers = weakref.WeakSet()
+
+
+def _parse_http_date(value: str) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_freshness(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Returns the number of seconds a response can be used without asking the server again,
+    from its Cache-Control max-age directive or its Expires header, or None when it must be revalidated
+
+    :param headers: dict
+        Case insensitive headers of the response
+
+    :return: float
+    """
+    directives = dict()
+    for directive in headers.get('Cache-Control', '').split(','):
+        name, _, value = directive.strip().partition('=')
+        directives[name.lower()] = value.strip('"')
+
+    if 'no-store' in directives or 'no-cache' in directives:
+        return None
+    if 'max-age' in directives:
+        try:
+            return max(0, int(directives['max-age']))
+        except ValueError:
+            return None
+
+    expires = _parse_http_date(headers.get('Expires', ''))
+    if expires is None:
+        return None
+    date = _parse_http_date(headers.get('Date', ''))
+    return max(0.0, expires - (date if date is not None else time.time()))
+
+
+class RemoteImageFetcher(object):
+    """
+    Downloads remote images over a pooled keep-alive session, with a bounded number of concurrent downloads.
+    With an image cache, already downloaded images are used as long as their Cache-Control or Expires headers allow,
+    then revalidated with the server instead of being downloaded again. Images sent without validator are downloaded again.
+    requests is only imported, and the session created, when the first image is downloaded.
+    """
+
+    def __init__(self, max_concurrency: int = 8, timeout: float = 2, image_cache: ImageDownloadCache = None):
+        """
+        :param max_concurrency: int
+            Maximum number of simultaneous downloads, and of kept alive connections per host
+        :param timeout: float
+            Connection and read timeout of each download, in seconds
+        :param image_cache: ImageDownloadCache, optional
+            Persistent cache of the downloaded images
+        """
+        self._timeout = timeout
+        self._max_concurrency = max_concurrency
+        self._image_cache = image_cache
+
+        self._reset()
+        _fetchers.add(self)
+
+        self._logger = logging.getLogger(__name__)
+
+    def _reset(self) -> None:
+        self._session = None
+        self._session_lock = threading.Lock()
+
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_session(self):
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self._max_concurrency, pool_maxsize=self._max_concurrency)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+
+        return self._session
+
+    def download(self, url: str, output_path: str) -> str:
+        """
+        Downloads the image into output_path and returns the full path to the image file
+
+        :param url: str
+        :param output_path: str
+            Directory where the image is written, when there is no image cache
+
+        :return: str
+        """
+        cached_image = self._image_cache.lookup(url) if self._image_cache is not None else None
+        if cached_image is not None and cached_image.is_fresh():
+            self._image_cache.touch(url, cached_image)
+            self._logger.debug('Image reused from cache: {}'.format(url))
+            return cached_image.path
+
+        # Without validator, the cached image can only be replaced by a new download
+        headers = cached_image.get_validation_headers() if cached_image is not None else dict()
+
+        try:
+            with self._get_session().get(url, headers=headers, stream=True, timeout=self._timeout) as res:
+                if res.status_code == 304 and headers:
+                    self._image_cache.revalidate(url, cached_image, _get_freshness(res.headers))
+                    self._logger.debug('Image revalidated from cache: {}'.format(url))
+                    return cached_image.path
+
+                if res.status_code != 200:
+                    raise RenderingError(self._logger, 'Image could not be downloaded, status {}: {}'.format(res.status_code, url))
+
+                if self._image_cache is not None:
+                    file_name = self._image_cache.store(url, res.raw, res.headers.get('ETag'), res.headers.get('Last-Modified'),
+                                                        _get_freshness(res.headers))
+                else:
+                    Path(output_path).mkdir(parents=True, exist_ok=True)
+                    file_name = os.path.join(output_path, str(uuid.uuid4())) + os.path.splitext(url)[1]
+                    with open(file_name, 'wb') as f:
+                        shutil.copyfileobj(res.raw, f)
+        except RenderingError:
+            raise
+        except Exception as e:
+            raise RenderingError(self._logger, e.__str__())
+
+        self._logger.debug('Image downloaded: {} to {}'.format(url, file_name))
+        return file_name
+
+    def submit_download(self, url: str, output_path: str) -> Future:
+        """
+        Starts downloading the image in the background
+
+        :return: concurrent.futures.Future
+            Future of the full path to the image file
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_concurrency, thread_name_prefix='docx-generator-image')
+
+        return self._executor.submit(self.download, url, output_path)
+
+
+def _reset_fetchers_after_fork() -> None:
+    for fetcher in list(_fetchers):
+        fetcher._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_fetchers_after_fork)
+
+# Used by the picture globals which are not given a fetcher
+default_remote_image_fetcher = RemoteImageFetcher()
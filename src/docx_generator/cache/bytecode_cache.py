@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import marshal
+from typing import Dict
+
+from jinja2.bccache import Bucket, BytecodeCache
+
+from docx_generator.cache.lru_cache import LruCache
+
+
+class MemoryBytecodeCache(BytecodeCache):
+    """
+    Bounded in-memory Jinja2 bytecode cache, holding the compiled code of the templates rendered in the process.
+
+    jinja2.FileSystemBytecodeCache can be used instead to keep the compiled code between processes.
+    """
+
+    def __init__(self, max_entries: int = 64, max_size: int = 128 * 1024 * 1024):
+        """
+        :param max_entries: int
+            Maximum number of compiled templates kept in the cache
+        :param max_size: int
+            Maximum total size in bytes of the marshalled compiled code
+        """
+        self._cache = LruCache(max_entries, max_size)
+
+    def load_bytecode(self, bucket: Bucket) -> None:
+        code = self._cache.get(bucket.key)
+        if code is not None:
+            bucket.code = code
+
+    def dump_bytecode(self, bucket: Bucket) -> None:
+        self._cache.put(bucket.key, bucket.code, len(marshal.dumps(bucket.code)))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def get_statistics(self) -> Dict[str, int]:
+        """
+        Returns the hit, miss and eviction counters of the cache
+
+        :return: dict
+        """
+        return self._cache.get_statistics()
+
+
+# Shared by every DocxGenerator of the process unless a dedicated cache is given
+default_bytecode_cache = MemoryBytecodeCache()
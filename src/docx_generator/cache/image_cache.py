@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+from urllib.parse import urlsplit
+
+_EXTENSION = re.compile(r'^\.[A-Za-z0-9]{1,5}$')
+
+# Entries used this recently are never evicted, another process may be about to read them
+_EVICTION_GRACE_PERIOD = 60
+
+_COPY_CHUNK_SIZE = 64 * 1024
+
+
+def _get_url_key(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _get_extension(url: str) -> str:
+    extension = os.path.splitext(urlsplit(url).path)[1]
+    return extension.lower() if _EXTENSION.match(extension) else ''
+
+
+def _touch(path: str) -> None:
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class CachedImage(object):
+    __slots__ = ('path', 'etag', 'last_modified', 'expires_at')
+
+    def __init__(self, path: str, etag: str = None, last_modified: str = None, expires_at: float = None):
+        self.path = path
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    def is_fresh(self) -> bool:
+        """
+        Tells whether the image can be used without asking the server, as its Cache-Control or Expires headers allowed
+        """
+        return self.expires_at is not None and time.time() < self.expires_at
+
+    def get_validation_headers(self) -> Dict[str, str]:
+        """
+        Conditional request headers, empty when the server gave no validator for the image
+        """
+        headers = dict()
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+
+        return headers
+
+
+class ImageDownloadCache(object):
+    """
+    On-disk cache of downloaded images, shared by every process using the same directory.
+
+    Image contents are stored once under the sha256 of their content, in `objects`.
+    Each url has a small metadata file in `urls`, naming the content, the ETag / Last-Modified validators sent by the server
+    and the time until which the image is fresh, as its Cache-Control or Expires headers allowed, within max_freshness.
+    Files are written to a temporary name then renamed, so concurrent processes never read a partial file.
+
+    The modification time of each file is its last use. Entries unused for max_age seconds are removed,
+    then least recently used contents are removed until the cache fits in max_size bytes.
+    """
+
+    def __init__(self, directory: str, max_size: int = 512 * 1024 * 1024, max_age: float = 30 * 24 * 3600,
+                 eviction_interval: float = 60, max_freshness: float = 3600):
+        """
+        :param directory: str
+            Cache directory, created if needed
+        :param max_size: int
+            Maximum total size of the cached images, in bytes
+        :param max_age: float
+            Entries not used for this number of seconds are removed
+        :param eviction_interval: float
+            Minimum number of seconds between two evictions run by this instance
+        :param max_freshness: float
+            Maximum number of seconds an image is used without asking the server, whatever its headers allowed
+        """
+        self._objects_path = os.path.join(directory, 'objects')
+        self._urls_path = os.path.join(directory, 'urls')
+        Path(self._objects_path).mkdir(parents=True, exist_ok=True)
+        Path(self._urls_path).mkdir(parents=True, exist_ok=True)
+
+        self._max_size = max_size
+        self._max_age = max_age
+        self._eviction_interval = eviction_interval
+        self._max_freshness = max_freshness
+
+        self._last_eviction = 0
+        self._lock = threading.Lock()
+
+        self._logger = logging.getLogger(__name__)
+
+    def __getstate__(self):
+        # Sent to the worker processes of a batch generation
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _get_metadata_path(self, url: str) -> str:
+        return os.path.join(self._urls_path, _get_url_key(url) + '.json')
+
+    def _write_atomically(self, directory: str, path: str, content: bytes) -> None:
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as f:
+                f.write(content)
+            os.replace(temporary_path, path)
+        except BaseException:
+            _remove(temporary_path)
+            raise
+
+    def lookup(self, url: str) -> Optional[CachedImage]:
+        """
+        Returns the cached image of the url, or None if the url is not cached
+
+        :param url: str
+
+        :return: CachedImage
+        """
+        metadata_path = self._get_metadata_path(url)
+        try:
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(metadata, dict) or not isinstance(metadata.get('content'), str):
+            # Written by another version, read as a corrupt file
+            return None
+
+        image_path = os.path.join(self._objects_path, metadata['content'])
+        if metadata.get('url') != url or not os.path.isfile(image_path):
+            # Content evicted, or sha256 collision of two urls
+            return None
+
+        expires_at = metadata.get('expires_at')
+        if not isinstance(expires_at, (int, float)):
+            expires_at = None
+
+        return CachedImage(image_path, metadata.get('etag'), metadata.get('last_modified'), expires_at)
+
+    def _get_expiry(self, freshness: Optional[float]) -> Optional[float]:
+        if freshness is None:
+            return None
+        return time.time() + min(freshness, self._max_freshness)
+
+    def _write_metadata(self, url: str, content_name: str, etag: Optional[str], last_modified: Optional[str],
+                        expires_at: Optional[float]) -> None:
+        metadata = {
+            'url': url,
+            'content': content_name,
+            'etag': etag,
+            'last_modified': last_modified,
+            'expires_at': expires_at,
+            'fetched_at': time.time()
+        }
+        self._write_atomically(self._urls_path, self._get_metadata_path(url), json.dumps(metadata).encode('utf-8'))
+
+    def touch(self, url: str, cached_image: CachedImage) -> None:
+        """
+        Marks a cached image as used
+
+        :param url: str
+        :param cached_image: CachedImage
+
+        :return: None
+        """
+        _touch(cached_image.path)
+        _touch(self._get_metadata_path(url))
+
+    def revalidate(self, url: str, cached_image: CachedImage, freshness: float = None) -> None:
+        """
+        Marks a cached image as used after the server confirmed it is still valid, and records its new freshness
+
+        :param url: str
+        :param cached_image: CachedImage
+        :param freshness: float, optional
+            Number of seconds the server allows the image to be used without asking it again
+
+        :return: None
+        """
+        _touch(cached_image.path)
+        self._write_metadata(url, os.path.basename(cached_image.path), cached_image.etag, cached_image.last_modified,
+                             self._get_expiry(freshness))
+
+    def store(self, url: str, content: BinaryIO, etag: str = None, last_modified: str = None, freshness: float = None) -> str:
+        """
+        Stores the image downloaded from url, and returns the full path to the cached image file
+
+        :param url: str
+        :param content: file-like object
+            Downloaded image content, read until its end
+        :param etag: str
+            ETag header of the response
+        :param last_modified: str
+            Last-Modified header of the response
+        :param freshness: float, optional
+            Number of seconds the server allows the image to be used without asking it again
+
+        :return: str
+        """
+        content_hash = hashlib.sha256()
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self._objects_path, prefix='.tmp-')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as f:
+                for chunk in iter(lambda: content.read(_COPY_CHUNK_SIZE), b''):
+                    content_hash.update(chunk)
+                    f.write(chunk)
+
+            content_name = content_hash.hexdigest() + _get_extension(url)
+            image_path = os.path.join(self._objects_path, content_name)
+            # Same content under the same name whichever process wins
+            os.replace(temporary_path, image_path)
+        except BaseException:
+            _remove(temporary_path)
+            raise
+
+        self._write_metadata(url, content_name, etag, last_modified, self._get_expiry(freshness))
+
+        self._evict_if_due()
+
+        return image_path
+
+    def _evict_if_due(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_eviction < self._eviction_interval:
+                return
+            self._last_eviction = now
+
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes the entries unused for max_age seconds, then the least recently used images over max_size
+
+        :return: None
+        """
+        now = time.time()
+        evictable_before = now - _EVICTION_GRACE_PERIOD
+
+        objects = []
+        total_size = 0
+        with os.scandir(self._objects_path) as entries:
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.startswith('.tmp-'):
+                    # Left by a crashed process
+                    if stat.st_mtime < now - self._max_age:
+                        _remove(entry.path)
+                    continue
+                objects.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        objects.sort()
+        evicted_count = 0
+        for last_use, size, path in objects:
+            if last_use >= evictable_before:
+                break
+            if last_use >= now - self._max_age and total_size <= self._max_size:
+                break
+            _remove(path)
+            total_size -= size
+            evicted_count += 1
+
+        with os.scandir(self._urls_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < now - self._max_age:
+                        _remove(entry.path)
+                except OSError:
+                    continue
+
+        if evicted_count:
+            self._logger.debug('Evicted {} cached image(s), {} bytes left'.format(evicted_count, total_size))
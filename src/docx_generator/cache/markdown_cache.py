@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import hashlib
+import re
+from typing import Callable, Dict, FrozenSet, Tuple
+
+from docx_generator.cache.lru_cache import LruCache
+
+# NUL can not be part of a document, so rendered text never looks like a link placeholder
+LINK_PLACEHOLDER = '\x00{}\x00'
+
+_LINK_PLACEHOLDER_PATTERN = re.compile('\x00(\\d+)\x00')
+
+
+class RenderedMarkdown(object):
+    """
+    Docx XML rendered from a markdown text, independent of the document it is added to.
+    Hyperlinks hold placeholders instead of relationship ids, replaced when the XML is added to a document.
+    """
+    __slots__ = ('xml', 'link_urls', 'warnings')
+
+    def __init__(self, xml: str, link_urls: Tuple[str, ...] = (), warnings: FrozenSet[str] = frozenset()):
+        self.xml = xml
+        self.link_urls = link_urls
+        self.warnings = warnings
+
+    def resolve(self, build_url_id: Callable[[str], str]) -> str:
+        """
+        Returns the XML with the relationship id of each hyperlink
+
+        :param build_url_id: callable
+            Returns the id of the relationship from the document to the url, DocxTemplate.build_url_id for instance
+
+        :return: str
+        """
+        if not self.link_urls:
+            return self.xml
+
+        url_ids = [build_url_id(url) for url in self.link_urls]
+        return _LINK_PLACEHOLDER_PATTERN.sub(lambda match: url_ids[int(match.group(1))], self.xml)
+
+
+class MarkdownCache(object):
+    """
+    Bounded cache of the XML rendered by the markdown filter.
+
+    Entries are keyed by the hash of the markdown text, the name of the style and the hash of the style content,
+    so that the same text rendered with the same style in any template and any render is only converted once.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_size: int = 64 * 1024 * 1024):
+        """
+        :param max_entries: int
+            Maximum number of rendered texts kept in the cache
+        :param max_size: int
+            Maximum total length of the cached XML, in characters
+        """
+        self._cache = LruCache(max_entries, max_size)
+
+    @staticmethod
+    def get_key(markdown: str, style_name: str, style_hash: str) -> Tuple[str, str, str]:
+        return hashlib.sha256(markdown.encode('utf-8')).hexdigest(), style_name, style_hash
+
+    def get(self, key: Tuple[str, str, str]) -> RenderedMarkdown:
+        return self._cache.get(key)
+
+    def put(self, key: Tuple[str, str, str], rendered_markdown: RenderedMarkdown) -> None:
+        self._cache.put(key, rendered_markdown, len(rendered_markdown.xml))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __contains__(self, key: Tuple[str, str, str]) -> bool:
+        # Not counted in the statistics, which only account the lookups of the filter
+        return key in self._cache
+
+    def get_statistics(self) -> Dict[str, float]:
+        """
+        Returns the hit, miss and eviction counters of the cache, and its hit rate
+
+        :return: dict
+        """
+        statistics = self._cache.get_statistics()
+        lookups = statistics['hits'] + statistics['misses']
+        statistics['hit_rate'] = statistics['hits'] / lookups if lookups else 0.0
+
+        return statistics
+
+
+# Shared by every DocxGenerator of the process unless a dedicated cache is given
+default_markdown_cache = MarkdownCache()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import copy
+import hashlib
+import io
+import logging
+import os
+import threading
+from typing import Dict, Tuple
+
+from docx import Document
+from docx.document import Document as DocType
+
+from docx_generator.adapters.docx.package_adapter import get_uncompressed_size
+from docx_generator.cache.lru_cache import LruCache
+
+
+class _CachedSubDocument(object):
+    __slots__ = ('content_hash', 'document', 'size')
+
+    def __init__(self, content_hash: str, document: DocType, size: int):
+        self.content_hash = content_hash
+        self.document = document
+        self.size = size
+
+
+class SubDocumentCache(object):
+    """
+    Keeps pristine parsed sub documents, and hands out a clone each time one is included.
+
+    Entries are keyed by the absolute path of the sub document, its modification time and its size.
+    When the modification time changes but the content hash does not, the parsed sub document is reused.
+    Clones are needed as docxcompose modifies the document it appends.
+    """
+
+    def __init__(self, max_entries: int = 64, max_memory: int = 128 * 1024 * 1024):
+        """
+        :param max_entries: int
+            Maximum number of sub documents kept in the cache
+        :param max_memory: int
+            Maximum uncompressed size in bytes of the cached sub documents
+        """
+        self._cache = LruCache(max_entries, max_memory)
+        self._current_keys: Dict[str, Tuple] = dict()
+        # Keeps the current key of a path in step with its entry in the cache
+        self._lock = threading.Lock()
+
+        self._logger = logging.getLogger(__name__)
+
+    def __getstate__(self):
+        # Sent to the worker processes of a batch generation, which start with an empty cache
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_current_keys'] = dict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def load(self, sub_document_path: str) -> Tuple[DocType, bool]:
+        """
+        Returns a copy of the parsed sub document, and whether it was found in the cache
+
+        :param sub_document_path: str
+            Path to the .docx sub document
+
+        :return: (docx.document.Document, bool)
+        """
+        sub_document_path = os.path.abspath(sub_document_path)
+        stat = os.stat(sub_document_path)
+        key = (sub_document_path, stat.st_mtime_ns, stat.st_size)
+
+        entry = self._cache.get(key)
+        is_cached = entry is not None
+        if entry is None:
+            with open(sub_document_path, 'rb') as sub_document_file:
+                blob = sub_document_file.read()
+
+            content_hash = hashlib.sha256(blob).hexdigest()
+            with self._lock:
+                previous_entry = self._cache.pop(self._current_keys.get(sub_document_path))
+            if previous_entry is not None and previous_entry.content_hash == content_hash:
+                self._logger.debug('Sub document touched but unchanged, reusing parsed sub document: {}'.format(sub_document_path))
+                entry = previous_entry
+                is_cached = True
+            else:
+                self._logger.debug('Parsing sub document: {}'.format(sub_document_path))
+                entry = _CachedSubDocument(content_hash, Document(io.BytesIO(blob)), get_uncompressed_size(blob))
+
+            with self._lock:
+                self._cache.put(key, entry, entry.size)
+                self._current_keys[sub_document_path] = key
+
+        return copy.deepcopy(entry.document), is_cached
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._current_keys.clear()
+
+    def get_statistics(self) -> Dict[str, int]:
+        """
+        Returns the hit, miss and eviction counters of the cache
+
+        :return: dict
+        """
+        return self._cache.get_statistics()
+
+
+# Shared by every DocxGenerator of the process unless a dedicated cache is given
+default_sub_document_cache = SubDocumentCache()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import copy
+import hashlib
+import io
+import logging
+import os
+import threading
+from typing import Dict, Tuple
+
+from docx import Document
+from docx.document import Document as DocType
+from docxtpl import DocxTemplate
+
+from docx_generator.adapters.docx.image_part_adapter import index_image_parts
+from docx_generator.adapters.docx.package_adapter import get_uncompressed_size
+from docx_generator.adapters.docx.style_adapter import RenderStylesCollection, get_document_render_styles
+from docx_generator.cache.lru_cache import LruCache
+from docx_generator.profiling.render_report import RenderReport, report_phase
+
+
+class _CachedTemplate(object):
+    __slots__ = ('blob', 'content_hash', 'document', 'styles', 'size')
+
+    def __init__(self, blob: bytes, content_hash: str, document: DocType, styles: RenderStylesCollection, size: int):
+        self.blob = blob
+        self.content_hash = content_hash
+        self.document = document
+        self.styles = styles
+        self.size = size
+
+
+class TemplateCache(object):
+    """
+    Keeps pristine parsed templates with their render styles, and hands out a clone for each render.
+
+    Entries are keyed by the absolute path of the template, its modification time and its size.
+    When the modification time changes but the content hash does not, the parsed template is reused.
+    """
+
+    def __init__(self, max_entries: int = 32, max_memory: int = 256 * 1024 * 1024):
+        """
+        :param max_entries: int
+            Maximum number of templates kept in the cache
+        :param max_memory: int
+            Maximum uncompressed size in bytes of the cached templates
+        """
+        self._cache = LruCache(max_entries, max_memory)
+        self._current_keys: Dict[str, Tuple] = dict()
+        # Keeps the current key of a path in step with its entry in the cache
+        self._lock = threading.Lock()
+
+        self._logger = logging.getLogger(__name__)
+
+    def __getstate__(self):
+        # Sent to the worker processes of a batch generation, which start with an empty cache
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_current_keys'] = dict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _build_entry(self, blob: bytes, content_hash: str, render_report: RenderReport = None) -> _CachedTemplate:
+        document = Document(io.BytesIO(blob))
+        # Indexed once here, clones get a copy of the index
+        index_image_parts(document)
+        with report_phase(render_report, 'style_extraction'):
+            styles = get_document_render_styles(document, remove_definitions=True)
+
+        return _CachedTemplate(blob, content_hash, document, styles, get_uncompressed_size(blob))
+
+    def load(self, template_path: str, render_report: RenderReport = None) -> Tuple[DocxTemplate, RenderStylesCollection]:
+        """
+        Returns a copy of the template ready to be rendered, and its render styles
+
+        :param template_path: str
+            Path to the .docx template
+        :param render_report: RenderReport, optional
+            Report recording the style extraction when the template is parsed
+
+        :return: (DocxTemplate, RenderStylesCollection)
+        """
+        template_path = os.path.abspath(template_path)
+        stat = os.stat(template_path)
+        key = (template_path, stat.st_mtime_ns, stat.st_size)
+
+        entry = self._cache.get(key)
+        if entry is None:
+            with open(template_path, 'rb') as template_file:
+                blob = template_file.read()
+
+            content_hash = hashlib.sha256(blob).hexdigest()
+            with self._lock:
+                previous_entry = self._cache.pop(self._current_keys.get(template_path))
+            if previous_entry is not None and previous_entry.content_hash == content_hash:
+                self._logger.debug('Template touched but unchanged, reusing parsed template: {}'.format(template_path))
+                entry = previous_entry
+            else:
+                self._logger.debug('Parsing template: {}'.format(template_path))
+                entry = self._build_entry(blob, content_hash, render_report)
+
+            with self._lock:
+                self._cache.put(key, entry, entry.size)
+                self._current_keys[template_path] = key
+
+        return self._clone(entry)
+
+    def load_blob(self, blob: bytes, render_report: RenderReport = None) -> Tuple[DocxTemplate, RenderStylesCollection]:
+        """
+        Returns a copy of the template given as the content of a .docx file, and its render styles.
+        Templates given this way are keyed by the hash of their content.
+
+        :param blob: bytes
+            Content of the .docx template
+        :param render_report: RenderReport, optional
+            Report recording the style extraction when the template is parsed
+
+        :return: (DocxTemplate, RenderStylesCollection)
+        """
+        content_hash = hashlib.sha256(blob).hexdigest()
+        key = ('content', content_hash)
+
+        entry = self._cache.get(key)
+        if entry is None:
+            self._logger.debug('Parsing template from content: {}'.format(content_hash))
+            entry = self._build_entry(blob, content_hash, render_report)
+            self._cache.put(key, entry, entry.size)
+
+        return self._clone(entry)
+
+    @staticmethod
+    def _clone(entry: _CachedTemplate) -> Tuple[DocxTemplate, RenderStylesCollection]:
+        template = DocxTemplate(io.BytesIO(entry.blob))
+        template.docx = copy.deepcopy(entry.document)
+        # Identifies the template content for the caches of the generation, without serializing the document again
+        template.content_hash = entry.content_hash
+
+        return template, entry.styles
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._current_keys.clear()
+
+    def get_statistics(self) -> Dict[str, int]:
+        """
+        Returns the hit, miss and eviction counters of the cache
+
+        :return: dict
+        """
+        return self._cache.get_statistics()
+
+
+# Shared by every DocxGenerator of the process unless a dedicated cache is given
+default_template_cache = TemplateCache()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import argparse
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+from typing import Any, Callable, Dict, List
+
+from docx_generator.workers.server import STATUS_FAILED, ReportServer
+
+
+def _format_line(result: Dict[str, Any]) -> str:
+    return json.dumps(result) + '\n'
+
+
+def _submit_line(server: ReportServer, line: str, reply: Callable[[Dict], None]) -> None:
+    if not line.strip():
+        return
+
+    try:
+        job = json.loads(line)
+        if not isinstance(job, dict):
+            raise ValueError('a job must be a JSON object')
+    except ValueError as e:
+        reply({'id': None, 'status': STATUS_FAILED, 'error': 'Invalid job: {}'.format(e), 'duration': 0.0})
+        return
+
+    server.submit(job, reply)
+
+
+class _JobRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Reads JSON-lines jobs from a connection and writes their results back, then waits for them before closing it
+    """
+
+    def handle(self) -> None:
+        lock = threading.Lock()
+        finished = threading.Condition()
+        outstanding = [0]
+
+        def reply(result: Dict[str, Any]) -> None:
+            try:
+                with lock:
+                    self.wfile.write(_format_line(result).encode('utf-8'))
+            except OSError:
+                pass
+            with finished:
+                outstanding[0] -= 1
+                finished.notify_all()
+
+        for line in self.rfile:
+            with finished:
+                outstanding[0] += 1
+            _submit_line(self.server.report_server, line.decode('utf-8'), reply)
+
+        with finished:
+            finished.wait_for(lambda: outstanding[0] <= 0)
+
+
+def _serve_stdin(server: ReportServer) -> None:
+    lock = threading.Lock()
+    output = sys.stdout
+
+    def reply(result: Dict[str, Any]) -> None:
+        with lock:
+            output.write(_format_line(result))
+            output.flush()
+
+    for line in sys.stdin:
+        _submit_line(server, line, reply)
+
+
+def _serve_socket(server: ReportServer, socket_path: str) -> None:
+    if not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+        raise SystemExit('Unix sockets are not available on this platform, jobs can be given on stdin instead')
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    with socketserver.ThreadingUnixStreamServer(socket_path, _JobRequestHandler) as socket_server:
+        socket_server.daemon_threads = True
+        socket_server.report_server = server
+        try:
+            socket_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+
+def _serve(arguments: argparse.Namespace) -> int:
+    server = ReportServer(
+        generator_options={'logger_mode': arguments.log_level},
+        templates=arguments.preload or (),
+        max_workers=arguments.workers,
+        max_pending=arguments.max_pending,
+        job_timeout=arguments.timeout or None,
+        max_jobs_per_worker=arguments.max_jobs_per_worker or None
+    )
+    server.start()
+    try:
+        if arguments.socket is None:
+            _serve_stdin(server)
+        else:
+            _serve_socket(server, arguments.socket)
+    finally:
+        server.close()
+
+    return 0
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='docx-generator')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser(
+        'serve',
+        help='Generate documents over a pool of long-lived workers',
+        description='Reads one JSON job per line, with base_path, template_path, data, output_path and an optional id, '
+                    'and writes one JSON result per line with the id, status, error and duration of the job. '
+                    'Jobs are read from stdin, or from the connections to a Unix socket.'
+    )
+    serve_parser.add_argument('--socket', help='Path of the Unix socket to listen on instead of reading stdin')
+    serve_parser.add_argument('--workers', type=int, help='Number of worker processes (default: number of CPUs)')
+    serve_parser.add_argument('--max-pending', type=int, default=64, help='Jobs waiting for a worker before new jobs are rejected')
+    serve_parser.add_argument('--timeout', type=float, default=300, help='Seconds after which a job is stopped, 0 for no timeout')
+    serve_parser.add_argument('--max-jobs-per-worker', type=int, default=100, help='Jobs after which a worker is replaced, 0 for never')
+    serve_parser.add_argument('--preload', nargs=2, action='append', metavar=('BASE_PATH', 'TEMPLATE_PATH'),
+                              help='Template loaded before workers start, may be repeated')
+    serve_parser.add_argument('--log-level', default='WARNING', help='Logging level, logs are written to stderr')
+
+    arguments = parser.parse_args(argv)
+    logging.basicConfig(format='%(asctime)s :: %(levelname)s :: %(name)s :: %(message)s',
+                        level=getattr(logging, arguments.log_level, logging.WARNING), stream=sys.stderr)
+
+    return _serve(arguments)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
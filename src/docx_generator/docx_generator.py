@@ -18,20 +18,46 @@
 #  along with this program; if not, write to the Free Software Foundation,
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+import copy
+import functools
+import io
 import logging
 import os
-import re
-from typing import Dict
+import threading
+import zipfile
+from concurrent.futures import Executor
+from typing import IO, TYPE_CHECKING, Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
 
 from docxtpl import DocxTemplate
 from jinja2 import Environment
-
-from docx_generator.adapters.docx.style_adapter import RenderStylesCollection, get_document_render_styles
-from docx_generator.adapters.mistletoe.DocxRenderer import DocxRenderer
+from jinja2.bccache import BytecodeCache
+
+from docx_generator.adapters.docx.package_adapter import get_rendered_xml_hash, has_jinja_tags
+from docx_generator.adapters.docx.package_writer import DocxPackageWriter, default_package_writer
+from docx_generator.adapters.docx.style_adapter import RenderStylesCollection
+from docx_generator.adapters.file_adapter import UuidFolderIndex
+from docx_generator.adapters.jinja_adapter import BytecodeCachingEnvironment
+from docx_generator.adapters.logging_adapter import TokenTracer
+from docx_generator.adapters.remote_image_adapter import RemoteImageFetcher
+from docx_generator.cache.bytecode_cache import default_bytecode_cache
+from docx_generator.cache.image_cache import ImageDownloadCache
+from docx_generator.cache.markdown_cache import MarkdownCache, default_markdown_cache
+from docx_generator.cache.sub_document_cache import SubDocumentCache, default_sub_document_cache
+from docx_generator.cache.template_cache import TemplateCache, default_template_cache
+from docx_generator.exceptions.rendering_cancelled_error import RenderingCancelledError
 from docx_generator.exceptions.rendering_error import RenderingError
 from docx_generator.filters.filters import Filters
 from docx_generator.globals.globals import Globals
+from docx_generator.globals.image_resolver import ImageResolver
 from docx_generator.globals.picture_globals import PictureGlobals
+from docx_generator.profiling.render_report import RenderReport, report_phase
+from docx_generator.workers.batch import BatchGenerator, GenerationResult
+
+if TYPE_CHECKING:
+    # Markdown conversion and image optimization are only imported when used
+    from docx_generator.adapters.image_optimizer_adapter import ImageOptimizer
+    from docx_generator.adapters.mistletoe.DocxRenderer import DocxRenderer
+    from docx_generator.workers.markdown_prerender import MarkdownPrerenderer
 
 
 def _sanitize_path(path: str) -> str:
@@ -42,7 +68,12 @@ def _sanitize_path(path: str) -> str:
 class DocxGenerator(object):
 
     def __init__(self, logger_mode: str = 'INFO', max_recursive_render_depth: int = 5,
-                 image_handler: PictureGlobals = None, app_logger: logging = None):
+                 image_handler: PictureGlobals = None, app_logger: logging = None,
+                 template_cache: TemplateCache = None, image_download_concurrency: int = 8,
+                 image_cache: ImageDownloadCache = None, image_optimizer: 'ImageOptimizer' = None,
+                 markdown_cache: MarkdownCache = None, token_tracer: TokenTracer = None,
+                 markdown_prerenderer: 'MarkdownPrerenderer' = None, sub_document_cache: SubDocumentCache = None,
+                 bytecode_cache: BytecodeCache = None, package_writer: DocxPackageWriter = None):
 
         if app_logger is None:
             logging.basicConfig(
@@ -54,8 +85,22 @@ class DocxGenerator(object):
         else:
             self._logger = app_logger
 
+        self._logger_mode = logger_mode
         self._max_recursive_render_depth = max_recursive_render_depth
         self._image_handler = image_handler
+        self._template_cache = template_cache if template_cache is not None else default_template_cache
+        self._image_download_concurrency = image_download_concurrency
+        self._image_cache = image_cache
+        self._image_fetcher = RemoteImageFetcher(image_download_concurrency, image_cache=image_cache)
+        self._image_optimizer = image_optimizer
+        self._markdown_cache = markdown_cache if markdown_cache is not None else default_markdown_cache
+        self._token_tracer = token_tracer
+        self._markdown_prerenderer = markdown_prerenderer
+        self._sub_document_cache = sub_document_cache if sub_document_cache is not None else default_sub_document_cache
+        self._bytecode_cache = bytecode_cache if bytecode_cache is not None else default_bytecode_cache
+        # Configured once, each render level binds its filters and globals to an overlay of it
+        self._jinja2_environment = BytecodeCachingEnvironment(bytecode_cache=self._bytecode_cache)
+        self._package_writer = package_writer if package_writer is not None else default_package_writer
 
     def _process_template_path(self, base_path: str, template_path: str) -> str:
         template_path = _sanitize_path(template_path)
@@ -77,74 +122,276 @@ class DocxGenerator(object):
             self._logger.info('Output directory located: {}'.format(full_output_path))
         return full_output_path
 
-    def _set_jinja2_custom_environment(self, base_path: str, template: DocxTemplate, jinja2_environment: Environment, renderer: DocxRenderer, template_styles: RenderStylesCollection) -> None:
-        jinja2_custom_filters = Filters(renderer, template_styles, jinja2_environment)
-        jinja2_custom_globals = Globals(base_path, template, jinja2_environment)
+    def _check_cancellation(self, cancel_event: threading.Event) -> None:
+        if cancel_event is not None and cancel_event.is_set():
+            raise RenderingCancelledError(self._logger, 'Generation cancelled')
+
+    def _create_markdown_renderer(self, template: DocxTemplate, image_handler: PictureGlobals = None) -> 'DocxRenderer':
+        from docx_generator.adapters.mistletoe.DocxRenderer import DocxRenderer
+
+        return DocxRenderer(template, image_handler, self._token_tracer)
+
+    def _set_jinja2_custom_environment(self, base_path: str, template: DocxTemplate, jinja2_environment: Environment,
+                                       create_renderer: Callable[[], 'DocxRenderer'],
+                                       template_styles: RenderStylesCollection, cancel_event: threading.Event = None,
+                                       image_resolver: ImageResolver = None, render_report: RenderReport = None,
+                                       prerendered_markdown: Dict = None, uuid_folder_index: UuidFolderIndex = None) -> Globals:
+        jinja2_custom_filters = Filters(create_renderer, template_styles, jinja2_environment, self._markdown_cache, render_report,
+                                        prerendered_markdown)
+        jinja2_custom_globals = Globals(base_path, template, jinja2_environment, cancel_event, image_resolver, render_report,
+                                        self._sub_document_cache, uuid_folder_index, template_styles)
 
         jinja2_custom_filters.set_available_filters()
         jinja2_custom_globals.set_available_globals()
 
-    def _recursive_rendering(self, base_path: str, template_path: str, data: Dict, output_path: str, render_level: int):
+        return jinja2_custom_globals
+
+    def _recursive_rendering(self, base_path: str, loaded_template: DocxTemplate, template_styles: RenderStylesCollection,
+                             template_name: str, data: Dict, render_level: int, image_handler: PictureGlobals = None,
+                             cancel_event: threading.Event = None, image_resolver: ImageResolver = None,
+                             render_report: RenderReport = None, prerendered_markdown: Dict = None,
+                             uuid_folder_index: UuidFolderIndex = None, previous_xml_hash: str = None):
+        self._check_cancellation(cancel_event)
+
         render_level += 1
         self._logger.info('Start rendering for level {}'.format(render_level))
 
-        loaded_template = DocxTemplate(template_path)
-        template_styles = get_document_render_styles(template_path)
+        with report_phase(render_report, 'render_level', level=render_level):
+            # docxtpl reloads the template file when an already rendered document is rendered again.
+            # Following levels must render the document produced by the previous level, which is kept in memory.
+            loaded_template.is_rendered = False
 
-        docx_renderer = DocxRenderer(loaded_template, self._image_handler)
+            create_renderer = functools.partial(self._create_markdown_renderer, loaded_template, image_handler)
 
-        jinja_custom_environment = Environment()
+            jinja_custom_environment = self._jinja2_environment.bind()
 
-        self._set_jinja2_custom_environment(base_path, loaded_template, jinja_custom_environment, docx_renderer, template_styles)
+            jinja2_custom_globals = self._set_jinja2_custom_environment(base_path, loaded_template, jinja_custom_environment,
+                                                                        create_renderer, template_styles, cancel_event, image_resolver,
+                                                                        render_report, prerendered_markdown, uuid_folder_index)
 
-        try:
-            loaded_template.render(data, jinja_env=jinja_custom_environment, autoescape=True)
-        except RenderingError as e:
-            raise e
-        except Exception as e:
-            error_message = '{} ({})'.format(str(e), os.path.basename(template_path))
-            raise RenderingError(self._logger, error_message)
-
-        is_variable_found = False
-        variable_regex = "{{.+}}|{%.+%}"
-
-        for paragraph in loaded_template.paragraphs:
-            if re.search(variable_regex, paragraph.text) is not None:
-                is_variable_found = True
-                break
-
-        for table in loaded_template.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        if re.search(variable_regex, paragraph.text) is not None:
-                            is_variable_found = True
-                            break
-
-        loaded_template.save(output_path)
-        self._logger.info('Document generated for level {}'.format(render_level))
-
-        if is_variable_found and render_level <= self._max_recursive_render_depth:
-            self._logger.info('Variable found in generated document. Restarting rendering process ...')
-            self._recursive_rendering('', output_path, data, output_path, render_level)
+            try:
+                with report_phase(render_report, 'jinja_render', level=render_level):
+                    loaded_template.render(data, jinja_env=jinja_custom_environment, autoescape=True)
+                # Rows of the tables are read from the data while building them
+                jinja2_custom_globals.resolve_tables(loaded_template)
+            except RenderingError as e:
+                raise e
+            except Exception as e:
+                error_message = '{} ({})'.format(str(e), template_name)
+                raise RenderingError(self._logger, error_message)
+
+            # Pictures of this level must be in the document before looking for tags left in it
+            if image_resolver is not None:
+                image_resolver.resolve_pictures(loaded_template)
+
+        self._logger.info('Document rendered for level {}'.format(render_level))
 
         if render_level > self._max_recursive_render_depth:
             self._logger.info('Rendering depth level exceeded, leaving render loop')
+        elif has_jinja_tags(loaded_template):
+            xml_hash = get_rendered_xml_hash(loaded_template)
+            if xml_hash == previous_xml_hash:
+                self._logger.info('Rendering level {} did not change the document, leaving render loop'.format(render_level))
+            else:
+                self._logger.info('Variable found in generated document. Restarting rendering process ...')
+                self._recursive_rendering(base_path, loaded_template, template_styles, template_name, data, render_level,
+                                          image_handler, cancel_event, image_resolver, render_report, prerendered_markdown,
+                                          uuid_folder_index, xml_hash)
 
         self._logger.info('Rendering process completed !')
 
-    """
+    def _render_template(self, base_path: str, loaded_template: DocxTemplate, template_styles: RenderStylesCollection,
+                         template_name: str, data: Dict, images_output_path: str, cancel_event: threading.Event = None,
+                         render_report: RenderReport = None) -> None:
+        # Remote images of the generation are downloaded, and images optimized, concurrently while rendering
+        image_resolver = ImageResolver(self._image_fetcher, os.path.join(base_path, 'tmp', 'images'), cancel_event,
+                                       self._image_optimizer, render_report)
+        # Uuid folders of the base path are listed once per generation
+        uuid_folder_index = UuidFolderIndex(base_path)
+
+        # Each generation works on its own copy of the image handler, so that concurrent generations do not share paths
+        image_handler = copy.copy(self._image_handler)
+        if image_handler is not None:
+            image_handler.set_base_path(base_path)
+            image_handler.set_output_path(images_output_path)
+            image_handler.set_cancel_event(cancel_event)
+            image_handler.set_image_resolver(image_resolver)
+            image_handler.set_render_report(render_report)
+            image_handler.set_uuid_folder_index(uuid_folder_index)
+
+        prerendered_markdown = None
+        if self._markdown_prerenderer is not None:
+            with report_phase(render_report, 'markdown_prerender') as details:
+                prerendered_markdown = self._markdown_prerenderer.prerender(loaded_template, template_styles, data, self._markdown_cache)
+                details['texts'] = len(prerendered_markdown)
+            self._check_cancellation(cancel_event)
+
+        self._recursive_rendering(base_path, loaded_template, template_styles, template_name, data, 0,
+                                  image_handler, cancel_event, image_resolver, render_report, prerendered_markdown,
+                                  uuid_folder_index)
+
+        self._check_cancellation(cancel_event)
+
+    def generate_docx(self, base_path: str, template_path: str, data: Dict, output_path: str, cancel_event: threading.Event = None,
+                      render_report: RenderReport = None):
+        """
         template_path and absolute_path must be relative to base_path
-    """
-    def generate_docx(self, base_path: str, template_path: str, data: Dict, output_path: str):
+        """
         processed_base_path = os.path.abspath(base_path)
         full_template_path = self._process_template_path(processed_base_path, template_path)
         full_output_path = self._process_output_path(processed_base_path, output_path)
 
-        if self._image_handler is not None:
-            self._image_handler.set_base_path(processed_base_path)
-            self._image_handler.set_output_path(os.path.join(os.path.dirname(full_output_path), "images"))
-
         self._logger.info(f'Starting new report generation. Base path: {processed_base_path}. '
                           f'Template path: {full_template_path}. Output path {full_output_path}')
-        self._recursive_rendering(processed_base_path, full_template_path, data, full_output_path, 0)
+
+        if render_report is not None:
+            render_report.start()
+        try:
+            with report_phase(render_report, 'template_load'):
+                loaded_template, template_styles = self._template_cache.load(full_template_path, render_report)
+            self._render_template(processed_base_path, loaded_template, template_styles, os.path.basename(full_template_path), data,
+                                  os.path.join(os.path.dirname(full_output_path), "images"), cancel_event, render_report)
+
+            with report_phase(render_report, 'save'):
+                self._package_writer.save(loaded_template, full_output_path)
+        finally:
+            if render_report is not None:
+                render_report.stop()
+
+        self._logger.info('Document generated: {}'.format(full_output_path))
+
+    def generate_docx_stream(self, base_path: str, template: Union[bytes, IO[bytes]], data: Dict, output: IO[bytes] = None,
+                             cancel_event: threading.Event = None, render_report: RenderReport = None) -> Optional[bytes]:
+        """
+        Generates a document from a template held in memory, without reading or writing any file on the base path.
+        The base path is still used to find the images and sub documents referenced by relative paths.
+
+        :param base_path: str
+        :param template: bytes or file-like object
+            Content of the .docx template, or binary file-like object to read it from
+        :param data: dict
+        :param output: file-like object, optional
+            Writable binary stream the document is written to
+        :param cancel_event: threading.Event, optional
+            Event set when the generation is cancelled
+        :param render_report: RenderReport, optional
+            Report filled with the timing and memory of each phase of the generation
+
+        :return: bytes
+            Content of the generated document when no output stream is given, None otherwise
+        """
+        processed_base_path = os.path.abspath(base_path)
+        template_blob = template.read() if hasattr(template, 'read') else bytes(template)
+
+        self._logger.info(f'Starting new report generation. Base path: {processed_base_path}. Template from stream')
+
+        if render_report is not None:
+            render_report.start()
+        try:
+            try:
+                with report_phase(render_report, 'template_load'):
+                    loaded_template, template_styles = self._template_cache.load_blob(template_blob, render_report)
+            except (zipfile.BadZipFile, KeyError, ValueError) as e:
+                raise RenderingError(self._logger, 'Generator can not read template.', 'Generator can not read template from stream: {}'.format(e))
+
+            self._render_template(processed_base_path, loaded_template, template_styles, '<stream>', data,
+                                  os.path.join(processed_base_path, 'tmp', 'images'), cancel_event, render_report)
+
+            output_buffer = output if output is not None else io.BytesIO()
+            with report_phase(render_report, 'save'):
+                self._package_writer.save(loaded_template, output_buffer)
+        finally:
+            if render_report is not None:
+                render_report.stop()
+
+        if output is not None:
+            self._logger.info('Document generated to stream')
+            return None
+
+        self._logger.info('Document generated to bytes')
+        return output_buffer.getvalue()
+
+    async def generate_docx_async(self, base_path: str, template_path: str, data: Dict, output_path: str, executor: Executor = None,
+                                  render_report: RenderReport = None) -> None:
+        """
+        Asynchronous version of generate_docx. Rendering, including remote image downloads, runs in a thread of the executor
+        so that the event loop is never blocked.
+        When the coroutine is cancelled, the generation stops at the next render level or image download
+        and the output file is not written.
+
+        :param base_path: str
+        :param template_path: str
+            Template path, relative to base_path
+        :param data: dict
+        :param output_path: str
+            Output path, relative to base_path
+        :param executor: concurrent.futures.Executor, optional
+            Thread pool running the generation (Default value is the default executor of the event loop)
+        :param render_report: RenderReport, optional
+            Report filled with the timing and memory of each phase of the generation
+
+        :return: None
+        """
+        # Only imported by asynchronous callers, which already loaded it
+        import asyncio
+
+        cancel_event = threading.Event()
+        loop = asyncio.get_running_loop()
+
+        try:
+            await loop.run_in_executor(executor, functools.partial(self.generate_docx, base_path, template_path, data, output_path, cancel_event,
+                                                                     render_report))
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+
+    def preload_template(self, base_path: str, template_path: str) -> None:
+        """
+        Loads a template into the template cache, so that the first generation using it does not parse it
+
+        :param base_path: str
+        :param template_path: str
+            Template path, relative to base_path
+
+        :return: None
+        """
+        full_template_path = self._process_template_path(os.path.abspath(base_path), template_path)
+        self._template_cache.load(full_template_path)
+
+    def _get_worker_options(self) -> Dict:
+        return {
+            'logger_mode': self._logger_mode,
+            'max_recursive_render_depth': self._max_recursive_render_depth,
+            'image_download_concurrency': self._image_download_concurrency,
+            'image_cache': self._image_cache,
+            'image_optimizer': self._image_optimizer,
+            'markdown_cache': self._markdown_cache,
+            'token_tracer': self._token_tracer,
+            'sub_document_cache': self._sub_document_cache,
+            'bytecode_cache': self._bytecode_cache,
+            'package_writer': self._package_writer,
+            'image_handler': self._image_handler
+        }
+
+    def generate_many(self, base_path: str, template_path: str, jobs: Iterable[Tuple[Dict, str]],
+                      max_workers: int = None) -> Iterator[GenerationResult]:
+        """
+        Generates one document per job from the same template, over a pool of worker processes.
+        Each worker loads the template once. A job crashing its worker is reported as failed without stopping the batch.
+
+        :param base_path: str
+        :param template_path: str
+            Template path, relative to base_path
+        :param jobs: iterable of (dict, str)
+            Data and output path (relative to base_path) of each document to generate
+        :param max_workers: int, optional
+            Number of worker processes (Default value is the number of CPUs)
+
+        :return: iterator of GenerationResult
+            Results are yielded as soon as jobs finish, not in the order of the jobs
+        """
+        # Fails early on an invalid template, and warms the cache inherited by forked workers
+        self.preload_template(base_path, template_path)
+
+        batch_generator = BatchGenerator(self._get_worker_options(), base_path, template_path, max_workers)
+        return batch_generator.run(jobs)
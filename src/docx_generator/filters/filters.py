@@ -20,18 +20,31 @@
 
 import logging
 from datetime import datetime
-import mistletoe
+from typing import TYPE_CHECKING, Callable, Dict, Tuple
+
 from jinja2 import Environment
 from markupsafe import Markup
 
 from docx_generator.adapters.docx.style_adapter import RenderStylesCollection
-from docx_generator.adapters.mistletoe.DocxRenderer import DocxRenderer
+from docx_generator.cache.markdown_cache import MarkdownCache, RenderedMarkdown
+from docx_generator.profiling.render_report import RenderReport, report_phase
+
+if TYPE_CHECKING:
+    from docx_generator.adapters.mistletoe.DocxRenderer import DocxRenderer
 
 
 class Filters(object):
-    def __init__(self, renderer: DocxRenderer, styles: RenderStylesCollection, jinja2_environment: Environment):
-        self._renderer = renderer
+    def __init__(self, create_renderer: Callable[[], 'DocxRenderer'], styles: RenderStylesCollection, jinja2_environment: Environment,
+                 markdown_cache: MarkdownCache = None, render_report: RenderReport = None,
+                 prerendered_markdown: Dict[Tuple[str, str, str], RenderedMarkdown] = None):
+        # mistletoe and the renderer are only loaded once a markdown text is rendered
+        self._create_renderer = create_renderer
+        self._renderer = None
         self._styles = styles
+        self._markdown_cache = markdown_cache
+        self._render_report = render_report
+        # Texts converted before rendering, by markdown cache key
+        self._prerendered_markdown = prerendered_markdown
 
         self._jinja2_environment = jinja2_environment
 
@@ -61,6 +74,12 @@ class Filters(object):
         self._logger.info('Adding timestamp: {}'.format(return_value))
         return return_value
 
+    def _get_renderer(self) -> 'DocxRenderer':
+        if self._renderer is None:
+            self._renderer = self._create_renderer()
+
+        return self._renderer
+
     def _markdown_to_docx(self, markdown: str, style_name: str = 'default') -> Markup:
         """
         Convert Markdown string into Docx XML
@@ -74,10 +93,43 @@ class Filters(object):
         :return:
             XML to be added to the .docx file
         """
-        self._renderer.set_style(self._styles.get_style(style_name))
-        return_value = mistletoe.markdown(markdown + "\r\n", self._renderer)
-        for warn in self._renderer.warnings:
-            self._logger.info(warn)
+        with report_phase(self._render_report, 'markdown', style=style_name, characters=len(markdown)) as details:
+            style = self._styles.get_style(style_name)
+            renderer = self._get_renderer()
+
+            # Text without any markdown syntax is rendered directly, without being tokenized nor hashed for the cache
+            renderer.set_style(style)
+            plain_text_xml = renderer.render_plain_text(markdown)
+            details['plain_text'] = plain_text_xml is not None
+            markdown = markdown + "\r\n"
+
+            rendered_markdown = None
+            if plain_text_xml is not None:
+                rendered_markdown = RenderedMarkdown(plain_text_xml, (), frozenset(renderer.warnings))
+            elif self._markdown_cache is not None or self._prerendered_markdown:
+                cache_key = MarkdownCache.get_key(markdown, style_name, style.content_hash)
+                if self._prerendered_markdown:
+                    rendered_markdown = self._prerendered_markdown.get(cache_key)
+                if rendered_markdown is None and self._markdown_cache is not None:
+                    rendered_markdown = self._markdown_cache.get(cache_key)
+            details['cached'] = plain_text_xml is None and rendered_markdown is not None
+
+            if rendered_markdown is None:
+                xml = renderer.render_markdown(markdown)
+                rendered_markdown = RenderedMarkdown(xml, tuple(renderer.link_urls), frozenset(renderer.warnings))
+                # Images are added to the document while rendering, the XML can not be reused without them
+                if self._markdown_cache is not None and not renderer.has_images:
+                    self._markdown_cache.put(cache_key, rendered_markdown)
+
+            for warn in rendered_markdown.warnings:
+                self._logger.info(warn)
+
+            return_value = rendered_markdown.resolve(renderer.build_url_id)
+
+        if self._render_report is not None:
+            self._render_report.count('markdown_calls')
+            self._render_report.count('markdown_characters', details['characters'])
+            self._render_report.count('links', len(rendered_markdown.link_urls))
 
         self._logger.info('Adding Markdown after processing ... {} characters.'.format(len(return_value)))
         return Markup(return_value)
@@ -26,24 +26,37 @@ from docx import Document
 from docxcompose.composer import Composer
 from docxtpl import DocxTemplate, Subdoc
 
-from docx_generator.adapters.file_adapter import recover_file_path_from_uuid
+from docx_generator.adapters.file_adapter import UuidFolderIndex, recover_file_path_from_uuid
+from docx_generator.cache.sub_document_cache import SubDocumentCache
 from docx_generator.exceptions.rendering_error import RenderingError
+from docx_generator.profiling.render_report import RenderReport, report_phase
 
 
 class DocumentGlobals(object):
-    def __init__(self, template: DocxTemplate, base_path: str):
+    def __init__(self, template: DocxTemplate, base_path: str, render_report: RenderReport = None,
+                 sub_document_cache: SubDocumentCache = None, uuid_folder_index: UuidFolderIndex = None):
         self._template = template
         self._base_path = base_path
+        self._render_report = render_report
+        self._sub_document_cache = sub_document_cache
+        self._uuid_folder_index = uuid_folder_index
 
         self._logger = logging.getLogger(__name__)
 
     def _process_sub_document(self, sub_document_path) -> Subdoc:
-        subdoc = self._template.new_subdoc()
-        composer = Composer(subdoc)
+        with report_phase(self._render_report, 'sub_document', path=sub_document_path) as details:
+            subdoc = self._template.new_subdoc()
+            composer = Composer(subdoc)
 
-        document_to_merge = Document(sub_document_path)
+            if self._sub_document_cache is None:
+                document_to_merge = Document(sub_document_path)
+            else:
+                document_to_merge, details['cached'] = self._sub_document_cache.load(sub_document_path)
 
-        composer.append(document_to_merge)
+            composer.append(document_to_merge)
+
+        if self._render_report is not None:
+            self._render_report.count('sub_documents')
 
         return subdoc
 
@@ -81,6 +94,7 @@ class DocumentGlobals(object):
 
         :return: docxtpl.Subdoc
         """
-        sub_document_file_path = recover_file_path_from_uuid(self._logger, 'Sub Document', self._base_path, uuid)
+        sub_document_file_path = recover_file_path_from_uuid(self._logger, 'Sub Document', self._base_path, uuid,
+                                                             self._uuid_folder_index)
 
         return self.add_sub_document(sub_document_file_path)
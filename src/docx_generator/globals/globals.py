@@ -19,20 +19,36 @@
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import logging
+import threading
 
 from docxtpl import DocxTemplate
 from docxtpl import RichText
 from jinja2 import Environment
 
+from docx_generator.adapters.docx.style_adapter import RenderStylesCollection
+from docx_generator.adapters.file_adapter import UuidFolderIndex
+from docx_generator.cache.sub_document_cache import SubDocumentCache
 from docx_generator.globals.document_globals import DocumentGlobals
+from docx_generator.globals.image_resolver import ImageResolver
 from docx_generator.globals.picture_globals import PictureGlobals
+from docx_generator.globals.table_globals import TableGlobals
+from docx_generator.profiling.render_report import RenderReport
 
 
 class Globals(object):
-    def __init__(self, base_path: str, template: DocxTemplate, jinja2_environment: Environment):
+    def __init__(self, base_path: str, template: DocxTemplate, jinja2_environment: Environment, cancel_event: threading.Event = None,
+                 image_resolver: ImageResolver = None, render_report: RenderReport = None,
+                 sub_document_cache: SubDocumentCache = None, uuid_folder_index: UuidFolderIndex = None,
+                 styles: RenderStylesCollection = None):
         self._base_path = base_path
         self._template = template
         self._jinja2_environment = jinja2_environment
+        self._cancel_event = cancel_event
+        self._image_resolver = image_resolver
+        self._render_report = render_report
+        self._sub_document_cache = sub_document_cache
+        self._uuid_folder_index = uuid_folder_index
+        self._table_globals = TableGlobals(template, styles, cancel_event, render_report)
 
         self._logger = logging.getLogger(__name__)
 
@@ -50,6 +66,8 @@ class Globals(object):
         rt.add(caption, url_id=self._template.build_url_id(url), style=style_name)
 
         self._logger.debug('Adding hyperlink: {} - {}'.format(caption, url))
+        if self._render_report is not None:
+            self._render_report.count('links')
 
         return rt
 
@@ -60,10 +78,26 @@ class Globals(object):
         :return: None
         """
         picture_filters = PictureGlobals(self._template, self._base_path)
-        document_filters = DocumentGlobals(self._template, self._base_path)
+        picture_filters.set_cancel_event(self._cancel_event)
+        picture_filters.set_image_resolver(self._image_resolver)
+        picture_filters.set_render_report(self._render_report)
+        picture_filters.set_uuid_folder_index(self._uuid_folder_index)
+        document_filters = DocumentGlobals(self._template, self._base_path, self._render_report, self._sub_document_cache,
+                                           self._uuid_folder_index)
 
         self._jinja2_environment.globals['addPicture'] = picture_filters.add_picture
         self._jinja2_environment.globals['addPictureFromUuid'] = picture_filters.add_picture_from_uuid
         self._jinja2_environment.globals['addSubDocument'] = document_filters.add_sub_document
         self._jinja2_environment.globals['addSubDocumentFromUuid'] = document_filters.add_sub_document_from_uuid
         self._jinja2_environment.globals['addHyperlink'] = self._hyperlink
+        self._jinja2_environment.globals['addTable'] = self._table_globals.add_table
+
+    def resolve_tables(self, template: DocxTemplate) -> None:
+        """
+        Adds the tables of the render to the rendered document
+
+        :param template: DocxTemplate
+
+        :return: None
+        """
+        self._table_globals.resolve_tables(template)
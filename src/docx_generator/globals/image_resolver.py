@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import functools
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING, Callable, Dict, Tuple
+
+from docx.opc.constants import RELATIONSHIP_TYPE
+from docx.oxml import CT_SectPr, OxmlElement
+from docx.oxml.ns import nsmap, qn
+from docxtpl import DocxTemplate, Subdoc
+from lxml import etree
+
+from docx_generator.adapters.remote_image_adapter import RemoteImageFetcher
+from docx_generator.exceptions.rendering_cancelled_error import RenderingCancelledError
+from docx_generator.profiling.render_report import RenderPhase, RenderReport
+
+if TYPE_CHECKING:
+    # Pillow is only imported by users of the optimizer
+    from docx_generator.adapters.image_optimizer_adapter import ImageOptimizer
+
+_PLACEHOLDER_PREFIX = 'docx-generator-picture-'
+
+_PLACEHOLDER_PARAGRAPHS = etree.XPath(
+    "//w:p[w:r/w:t[starts-with(., '{}')]]".format(_PLACEHOLDER_PREFIX),
+    namespaces=nsmap
+)
+
+_PICTURE_BLIPS = etree.XPath('.//a:blip[@r:embed]', namespaces=nsmap)
+
+
+class _PicturePlaceholder(object):
+    """
+    Paragraph standing for a picture while its image is downloaded
+    """
+
+    def __init__(self, token: str):
+        self._xml = '<w:p><w:r><w:t>{}</w:t></w:r></w:p>'.format(token)
+
+    def __str__(self):
+        return self._xml
+
+    def __html__(self):
+        return self._xml
+
+
+class ImageResolver(object):
+    """
+    Resolves the deferred pictures of a generation.
+
+    Pictures referencing a remote image are rendered as a placeholder paragraph and their download starts at once,
+    so that all the images of a render level are downloaded concurrently while Jinja keeps rendering.
+    With an image optimizer, local images are deferred as well and every image is optimized in the background.
+    Once the level is rendered, each placeholder is replaced by the picture built from the resulting file.
+    """
+
+    def __init__(self, image_fetcher: RemoteImageFetcher, output_path: str, cancel_event: threading.Event = None,
+                 image_optimizer: 'ImageOptimizer' = None, render_report: RenderReport = None):
+        """
+        :param image_fetcher: RemoteImageFetcher
+        :param output_path: str
+            Directory where the images are downloaded
+        :param cancel_event: threading.Event, optional
+            Event set when the generation is cancelled
+        :param image_optimizer: ImageOptimizer, optional
+            Optimizes the images before they are embedded
+        :param render_report: RenderReport, optional
+            Report recording the download of each image, from its submission to its completion
+        """
+        self._image_fetcher = image_fetcher
+        self._output_path = output_path
+        self._cancel_event = cancel_event
+        self._image_optimizer = image_optimizer
+        self._render_report = render_report
+
+        self._images: Dict[Tuple[str, int], Future] = dict()
+        self._pending_pictures: Dict[str, Tuple[Tuple[str, int], Callable[[str], Subdoc]]] = dict()
+
+        self._logger = logging.getLogger(__name__)
+
+    def defers(self, image_path: str) -> bool:
+        """
+        Tells whether the picture of the image should be deferred
+
+        :param image_path: str
+            Url or local path of the image
+
+        :return: bool
+        """
+        return image_path[:4] == 'http' or self._image_optimizer is not None
+
+    def defer_picture(self, image_path: str, build_picture: Callable[[str], Subdoc], max_width: int = None) -> _PicturePlaceholder:
+        """
+        Starts downloading and optimizing the image and returns the placeholder to render instead of the picture
+
+        :param image_path: str
+            Url or full local path of the image
+        :param build_picture: callable
+            Builds the picture sub document from the path of the resulting image
+        :param max_width: int
+            Width the picture is displayed at, in EMU
+
+        :return: placeholder paragraph
+        """
+        image_key = (image_path, max_width)
+        if image_key not in self._images:
+            if image_path[:4] == 'http':
+                image = self._image_fetcher.submit_download(image_path, self._output_path)
+                if self._render_report is not None:
+                    image.add_done_callback(functools.partial(self._record_fetch, image_path, time.perf_counter()))
+            else:
+                image = Future()
+                image.set_result(image_path)
+
+            if self._image_optimizer is not None and max_width is not None:
+                image = self._image_optimizer.submit(image, max_width)
+
+            self._images[image_key] = image
+
+        token = _PLACEHOLDER_PREFIX + uuid.uuid4().hex
+        self._pending_pictures[token] = (image_key, build_picture)
+
+        return _PicturePlaceholder(token)
+
+    def _record_fetch(self, url: str, start: float, image: Future) -> None:
+        # Runs in the download thread, memory is only traced for phases of the rendering thread
+        self._render_report.add_phase(RenderPhase('image_fetch', time.perf_counter() - start, details={'url': url}))
+
+    def _get_image_path(self, image_key: Tuple[str, int]) -> str:
+        image = self._images[image_key]
+        while True:
+            if self._cancel_event is not None and self._cancel_event.is_set():
+                raise RenderingCancelledError(self._logger, 'Generation cancelled while preparing {}'.format(image_key[0]))
+            try:
+                return image.result(timeout=0.1)
+            except FutureTimeoutError:
+                continue
+
+    def resolve_pictures(self, template: DocxTemplate) -> None:
+        """
+        Replaces the placeholders of the rendered document body, headers and footers by their picture.
+        A picture whose image could not be downloaded is skipped.
+
+        :param template: DocxTemplate
+            Rendered template
+
+        :return: None
+        """
+        if not self._pending_pictures:
+            return
+
+        # docxtpl reloads the template file when a sub document is created for an already rendered document
+        is_rendered = template.is_rendered
+        template.is_rendered = False
+        try:
+            self._replace_placeholders(template)
+        finally:
+            template.is_rendered = is_rendered
+            # Placeholders which did not end up in the document (footnotes, discarded by the template) have nothing to replace
+            self._pending_pictures.clear()
+
+    @staticmethod
+    def _iter_parts(template: DocxTemplate):
+        document = template.docx
+        yield document.part, document.element.body
+
+        # Building pictures relates images to the document part
+        for relationship in list(document.part.rels.values()):
+            if not relationship.is_external and relationship.reltype in (RELATIONSHIP_TYPE.HEADER, RELATIONSHIP_TYPE.FOOTER):
+                yield relationship.target_part, relationship.target_part.element
+
+    @staticmethod
+    def _relate_images(document_part, part, elements) -> None:
+        # Pictures are built for the document body, images of a header or footer must be related to its own part
+        for element in elements:
+            for blip in _PICTURE_BLIPS(element):
+                image_part = document_part.related_parts[blip.get(qn('r:embed'))]
+                blip.set(qn('r:embed'), part.relate_to(image_part, RELATIONSHIP_TYPE.IMAGE))
+
+    @staticmethod
+    def _remove_placeholder(paragraph) -> None:
+        parent = paragraph.getparent()
+        if parent.tag == qn('w:tc'):
+            # A table cell must end with a paragraph
+            parent.replace(paragraph, OxmlElement('w:p'))
+        else:
+            parent.remove(paragraph)
+
+    def _replace_placeholders(self, template: DocxTemplate) -> None:
+        document_part = template.docx.part
+        for part, part_element in self._iter_parts(template):
+            for paragraph in _PLACEHOLDER_PARAGRAPHS(part_element):
+                pending_picture = self._pending_pictures.pop(paragraph.xpath('string(w:r/w:t)'), None)
+                if pending_picture is None:
+                    continue
+                image_key, build_picture = pending_picture
+
+                try:
+                    image_path = self._get_image_path(image_key)
+                except RenderingCancelledError:
+                    raise
+                except Exception:
+                    self._logger.error(f'Skipping {image_key[0]} due to error')
+                    self._remove_placeholder(paragraph)
+                    continue
+
+                elements = [element for element in build_picture(image_path).element.body if not isinstance(element, CT_SectPr)]
+                if part is not document_part:
+                    self._relate_images(document_part, part, elements)
+                for element in elements:
+                    paragraph.addprevious(element)
+                paragraph.getparent().remove(paragraph)
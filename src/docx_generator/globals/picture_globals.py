@@ -18,19 +18,22 @@
 #  along with this program; if not, write to the Free Software Foundation,
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+import functools
 import logging
 import os
 import re
-import requests
-import shutil
-import uuid
+import threading
 from pathlib import Path
 
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docxtpl import DocxTemplate, Subdoc
 
-from docx_generator.adapters.file_adapter import recover_file_path_from_uuid
+from docx_generator.adapters.file_adapter import UuidFolderIndex, recover_file_path_from_uuid
+from docx_generator.adapters.remote_image_adapter import default_remote_image_fetcher
+from docx_generator.exceptions.rendering_cancelled_error import RenderingCancelledError
 from docx_generator.exceptions.rendering_error import RenderingError
+from docx_generator.globals.image_resolver import ImageResolver
+from docx_generator.profiling.render_report import RenderReport, report_phase
 
 
 class PictureGlobals(object):
@@ -38,6 +41,10 @@ class PictureGlobals(object):
         self._template = template
         self._base_path = base_path
         self._output_path = os.path.join(base_path, 'tmp', 'images')
+        self._cancel_event = None
+        self._image_resolver = None
+        self._render_report = None
+        self._uuid_folder_index = None
 
         self._available_alignment_values = []
         for member in WD_PARAGRAPH_ALIGNMENT:
@@ -45,6 +52,13 @@ class PictureGlobals(object):
 
         self._logger = logging.getLogger(__name__)
 
+    def __getstate__(self):
+        # Sent to the worker processes of a batch generation, which set up the state of each generation themselves
+        state = self.__dict__.copy()
+        state.update(_template=None, _cancel_event=None, _image_resolver=None, _render_report=None,
+                     _uuid_folder_index=None)
+        return state
+
     def set_template(self, template: DocxTemplate):
         self._template = template
 
@@ -54,6 +68,18 @@ class PictureGlobals(object):
     def set_output_path(self, output_path: str):
         self._output_path = output_path
 
+    def set_cancel_event(self, cancel_event: threading.Event):
+        self._cancel_event = cancel_event
+
+    def set_image_resolver(self, image_resolver: ImageResolver):
+        self._image_resolver = image_resolver
+
+    def set_render_report(self, render_report: RenderReport):
+        self._render_report = render_report
+
+    def set_uuid_folder_index(self, uuid_folder_index: UuidFolderIndex):
+        self._uuid_folder_index = uuid_folder_index
+
     def _scale_picture(self, picture, new_width):
         aspect_ratio = float(picture.height) / float(picture.width)
 
@@ -63,6 +89,15 @@ class PictureGlobals(object):
         self._logger.debug('... Picture rescaling ...')
 
     def _process_image(self, position, image_filename: str) -> Subdoc:
+        with report_phase(self._render_report, 'image_embed', path=image_filename):
+            sub_document = self._embed_image(position, image_filename)
+
+        if self._render_report is not None:
+            self._render_report.count('images')
+
+        return sub_document
+
+    def _embed_image(self, position, image_filename: str) -> Subdoc:
         sub_document = self._template.new_subdoc()
 
         last_section = sub_document.sections[-1]
@@ -106,8 +141,18 @@ class PictureGlobals(object):
         #      Use tempfile instead?
         Path(self._output_path).mkdir(parents=True, exist_ok=True)
 
+        if self._image_resolver is not None and self._image_resolver.defers(image_path):
+            # The image is downloaded and optimized concurrently with the rest of the rendering,
+            # the picture is added once rendering is done
+            if image_path[:4] != 'http':
+                image_path = self._process_remote(image_path)
+                self._check_local_path(image_path)
+            return self._defer_picture(image_path, position)
+
         try:
             image_path = self._process_remote(image_path)
+        except RenderingCancelledError:
+            raise
         except Exception:
             self._logger.error(f'Skipping {image_path} due to error')
             return self._template.new_subdoc()
@@ -122,26 +167,13 @@ class PictureGlobals(object):
         if image_path[:4] != 'http':
             return os.path.abspath(os.path.join(self._base_path, image_path))
 
-        file_name = os.path.join(self._output_path, str(uuid.uuid4())) + os.path.splitext(image_path)[1]
-        try:
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise RenderingCancelledError(self._logger, 'Generation cancelled before downloading {}'.format(image_path))
 
-            res = requests.get(image_path, stream=True, timeout=2)
-            if res.status_code == 200:
-                with open(file_name, 'wb') as f:
-                    shutil.copyfileobj(res.raw, f)
-                self._logger.debug('Image downloaded: {} to {}'.format(image_path, file_name))
-            else:
-                raise RenderingError(self._logger, 'Image could not be downloaded, status {}: {}'.format(res.status_code, image_path))
-
-        except Exception as e:
-            raise RenderingError(self._logger, e.__str__())
+        with report_phase(self._render_report, 'image_fetch', url=image_path):
+            return default_remote_image_fetcher.download(image_path, self._output_path)
 
-        return file_name
-
-    def _process_local(self, image_path: str, position: str = 'CENTER') -> Subdoc:
-        """
-        Process the image as a locally stored file.
-        """
+    def _check_local_path(self, image_path: str) -> None:
         incorrect_path_pattern = r'\.\.'
         if len(re.findall(incorrect_path_pattern, image_path)) > 0:
             raise RenderingError(self._logger, 'Invalid filename provided')
@@ -149,6 +181,21 @@ class PictureGlobals(object):
         if not os.path.isfile(image_path):
             raise RenderingError(self._logger, 'The path provided is not a correct file', 'The path provided is not a correct file: {}'.format(image_path))
 
+    def _get_page_width(self) -> int:
+        last_section = self._template.docx.sections[-1]
+        if None in (last_section.page_width, last_section.left_margin, last_section.right_margin):
+            return None
+        return last_section.page_width - last_section.left_margin - last_section.right_margin
+
+    def _defer_picture(self, image_path: str, position: str):
+        return self._image_resolver.defer_picture(image_path, functools.partial(self._process_local, position=position), self._get_page_width())
+
+    def _process_local(self, image_path: str, position: str = 'CENTER') -> Subdoc:
+        """
+        Process the image as a locally stored file.
+        """
+        self._check_local_path(image_path)
+
         try:
             return_value = self._process_image(position, image_path)
             return return_value
@@ -171,6 +218,9 @@ class PictureGlobals(object):
         :return: docxtpl.Subdoc
 
         """
-        picture_file_path = recover_file_path_from_uuid(self._logger, 'Picture', self._base_path, uuid)
+        picture_file_path = recover_file_path_from_uuid(self._logger, 'Picture', self._base_path, uuid, self._uuid_folder_index)
+
+        if self._image_resolver is not None and self._image_resolver.defers(picture_file_path):
+            return self._defer_picture(picture_file_path, position)
 
         return self._process_image(position, picture_file_path)
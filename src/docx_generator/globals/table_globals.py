@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import logging
+import re
+import threading
+import uuid
+from collections.abc import Mapping
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from docx.opc.constants import RELATIONSHIP_TYPE
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, nsmap, qn
+from docxtpl import DocxTemplate
+from lxml import etree
+
+from docx_generator.adapters.docx.style_adapter import RenderStylesCollection
+from docx_generator.exceptions.rendering_cancelled_error import RenderingCancelledError
+from docx_generator.exceptions.rendering_error import RenderingError
+from docx_generator.profiling.render_report import RenderReport, report_phase
+
+_PLACEHOLDER_PREFIX = 'docx-generator-table-'
+
+_PLACEHOLDER_PARAGRAPHS = etree.XPath(
+    "//w:p[w:r/w:t[starts-with(., '{}')]]".format(_PLACEHOLDER_PREFIX),
+    namespaces=nsmap
+)
+
+# Characters XML does not allow, and carriage returns, dropped from cell values
+_INVALID_XML_CHARACTERS = re.compile('[\\x00-\\x08\\x0b-\\x1f\\ufffe\\uffff]')
+
+_LINE_BREAK = '</w:t></w:r><w:r><w:br/><w:t xml:space="preserve">'
+
+# Rows are turned into XML and parsed by chunks, so that the XML of the whole table is never held in memory
+_CHUNK_ROWS = 256
+
+_TABLE_WIDTH = 9016
+
+
+class _TablePlaceholder(object):
+    """
+    Paragraph standing for a table until its rows are added to the rendered document
+    """
+
+    def __init__(self, token: str):
+        self._xml = '<w:p><w:r><w:t>{}</w:t></w:r></w:p>'.format(token)
+
+    def __str__(self):
+        return self._xml
+
+    def __html__(self):
+        return self._xml
+
+
+def _get_cell_text(value: Any) -> str:
+    text = '' if value is None else str(value)
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    if not text.isprintable():
+        text = _INVALID_XML_CHARACTERS.sub('', text).replace('\n', _LINE_BREAK)
+
+    return text
+
+
+class _PendingTable(object):
+    __slots__ = ('rows', 'columns', 'header', 'table_properties', 'cell_prefix')
+
+    def __init__(self, rows: Iterator[Sequence], columns: int, header: Sequence[str], table_properties: str, cell_prefix: str):
+        self.rows = rows
+        self.columns = columns
+        self.header = header
+        self.table_properties = table_properties
+        self.cell_prefix = cell_prefix
+
+
+class TableGlobals(object):
+    """
+    Tables built from data of any size.
+
+    The global renders a placeholder paragraph, replaced once the render level is done by a table whose rows are
+    added by chunks. Rows are only read then, so a generator producing them is consumed while the table is built,
+    and neither Jinja nor docxtpl process the XML of the rows.
+    """
+
+    def __init__(self, template: DocxTemplate, styles: RenderStylesCollection, cancel_event: threading.Event = None,
+                 render_report: RenderReport = None):
+        self._template = template
+        self._styles = styles
+        self._cancel_event = cancel_event
+        self._render_report = render_report
+        self._pending_tables: Dict[str, _PendingTable] = dict()
+
+        self._logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _get_rows(rows: Any, columns: List[str] = None) -> Tuple[Iterator[Sequence], List[str]]:
+        if isinstance(rows, Mapping):
+            # Columnar data, a list of values for each column
+            columns = list(rows) if columns is None else columns
+            return zip(*(rows[column] for column in columns)), columns
+
+        rows = iter(rows)
+        first_row = next(rows, None)
+        if first_row is None:
+            return iter(()), columns
+        rows = chain((first_row,), rows)
+
+        if isinstance(first_row, Mapping):
+            columns = list(first_row) if columns is None else columns
+            return ([row.get(column) for column in columns] for row in rows), columns
+
+        return rows, columns
+
+    def add_table(self, rows: Iterable, columns: List[str] = None, style_name: str = 'default') -> _TablePlaceholder:
+        """
+        Adds a table to the document, with the table and paragraph descriptors of the style
+
+        :param rows: iterable or dict
+            Rows of the table, each a dict or a list of values. A dict of lists is read as the values of each column
+        :param columns: list of str, optional
+            Columns shown in the header row, and keys of the values when rows are dicts
+            (Default value is the keys of the first row, no header for rows given as lists)
+        :param style_name: str, optional
+            Name of the style described in the template
+            (Default value is 'default')
+
+        :return: placeholder paragraph
+        """
+        style = self._styles.get_style(style_name).compiled
+        for descriptor in ('table', 'paragraph'):
+            if descriptor in style.undefined:
+                self._logger.info(style.get_undefined_warning(descriptor))
+
+        rows, columns = self._get_rows(rows, columns)
+        if columns is None:
+            # Column count of rows given as lists is only known from their first row
+            first_row = next(rows, None)
+            column_count = len(first_row) if first_row is not None else 0
+            rows = chain((first_row,), rows) if first_row is not None else rows
+        else:
+            column_count = len(columns)
+
+        token = _PLACEHOLDER_PREFIX + uuid.uuid4().hex
+        self._pending_tables[token] = _PendingTable(
+            rows, column_count, columns, style.table or '',
+            '<w:tc><w:p>{}<w:r><w:t xml:space="preserve">'.format(style.paragraph or '')
+        )
+
+        return _TablePlaceholder(token)
+
+    def resolve_tables(self, template: DocxTemplate) -> None:
+        """
+        Replaces the placeholders of the rendered document body, headers and footers by their table
+
+        :param template: DocxTemplate
+            Rendered template
+
+        :return: None
+        """
+        if not self._pending_tables:
+            return
+
+        try:
+            for part_element in self._iter_part_elements(template):
+                for paragraph in _PLACEHOLDER_PARAGRAPHS(part_element):
+                    pending_table = self._pending_tables.pop(paragraph.xpath('string(w:r/w:t)'), None)
+                    if pending_table is not None:
+                        self._replace_placeholder(paragraph, pending_table)
+
+            if self._pending_tables:
+                raise RenderingError(self._logger, 'addTable can only be used in the body, headers and footers of a template')
+        finally:
+            self._pending_tables.clear()
+
+    @staticmethod
+    def _iter_part_elements(template: DocxTemplate) -> Iterator:
+        document = template.docx
+        yield document.element.body
+
+        for relationship in document.part.rels.values():
+            if not relationship.is_external and relationship.reltype in (RELATIONSHIP_TYPE.HEADER, RELATIONSHIP_TYPE.FOOTER):
+                yield relationship.target_part.element
+
+    def _replace_placeholder(self, paragraph, pending_table: _PendingTable) -> None:
+        with report_phase(self._render_report, 'table', columns=pending_table.columns) as details:
+            table, row_count = self._build_table(pending_table)
+            details['rows'] = row_count
+
+        parent = paragraph.getparent()
+        if table[-1].tag == qn('w:tr'):
+            paragraph.addprevious(table)
+            self._logger.info('Adding table: {} rows'.format(row_count))
+        else:
+            # A table without any row is unreadable
+            self._logger.info('Skipping table without any row')
+        if parent.tag == qn('w:tc'):
+            # A table cell must end with a paragraph
+            parent.replace(paragraph, OxmlElement('w:p'))
+        else:
+            parent.remove(paragraph)
+
+        if self._render_report is not None:
+            self._render_report.count('table_rows', row_count)
+
+    @staticmethod
+    def _make_row(cell_prefix: str, values: Sequence) -> str:
+        cell_separator = '</w:t></w:r></w:p></w:tc>' + cell_prefix
+        return '<w:tr>{}{}</w:t></w:r></w:p></w:tc></w:tr>'.format(cell_prefix, cell_separator.join(map(_get_cell_text, values)))
+
+    def _build_table(self, pending_table: _PendingTable):
+        column_count = max(pending_table.columns, 1)
+        grid = '<w:gridCol w:w="{}"/>'.format(_TABLE_WIDTH // column_count) * column_count
+        header = ''
+        if pending_table.header:
+            # Repeated at the top of each page the table spans
+            header = self._make_row(pending_table.cell_prefix, pending_table.header).replace('<w:tr>', '<w:tr><w:trPr><w:tblHeader/></w:trPr>', 1)
+        table = parse_xml('<w:tbl {}>{}<w:tblGrid>{}</w:tblGrid>{}</w:tbl>'.format(nsdecls('w'), pending_table.table_properties, grid, header))
+
+        row_count = 0
+        rows = []
+        for values in pending_table.rows:
+            rows.append(self._make_row(pending_table.cell_prefix, values))
+            if len(rows) == _CHUNK_ROWS:
+                row_count += self._append_rows(table, rows)
+        row_count += self._append_rows(table, rows)
+
+        return table, row_count
+
+    def _append_rows(self, table, rows: List[str]) -> int:
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise RenderingCancelledError(self._logger, 'Generation cancelled while building a table')
+
+        row_count = len(rows)
+        if row_count:
+            table.extend(list(parse_xml('<w:tbl {}>{}</w:tbl>'.format(nsdecls('w'), ''.join(rows)))))
+            rows.clear()
+
+        return row_count
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import contextlib
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class RenderPhase(object):
+    """
+    Wall time and peak memory of one phase of a generation
+    """
+    __slots__ = ('name', 'wall_time', 'peak_memory', 'details')
+
+    def __init__(self, name: str, wall_time: float, peak_memory: int = None, details: Dict[str, Any] = None):
+        """
+        :param name: str
+        :param wall_time: float
+            Duration of the phase, in seconds
+        :param peak_memory: int
+            Highest memory allocated during the phase on top of the memory allocated when it started, in bytes.
+            None when memory is not traced or the phase ran in a background thread
+        :param details: dict
+            What the phase worked on: render level, image url, markdown style...
+        """
+        self.name = name
+        self.wall_time = wall_time
+        self.peak_memory = peak_memory
+        self.details = details or dict()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'wall_time': self.wall_time, 'peak_memory': self.peak_memory, 'details': self.details}
+
+
+class _OpenPhase(object):
+    __slots__ = ('start_memory', 'peak_memory')
+
+    def __init__(self, start_memory: int):
+        self.start_memory = start_memory
+        self.peak_memory = start_memory
+
+
+class RenderReport(object):
+    """
+    Timing and resource report of a generation.
+
+    Phases are recorded in the order they end, so nested phases come before the phase containing them:
+    markdown calls before the Jinja render of their level, the Jinja render before its render level.
+    Memory is traced with tracemalloc, which slows the generation down and covers every thread of the process:
+    generations running concurrently with a traced one are accounted in its peaks.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        """
+        :param trace_memory: bool
+            Trace the peak memory of each phase
+        """
+        self.phases: List[RenderPhase] = []
+        self.counters: Dict[str, int] = {'images': 0, 'links': 0, 'markdown_calls': 0, 'markdown_characters': 0, 'sub_documents': 0, 'table_rows': 0}
+        self.wall_time = None
+        self.peak_memory = None
+
+        self._trace_memory = trace_memory
+        self._is_tracing_owner = False
+        self._open_phases: List[_OpenPhase] = []
+        self._thread_id = None
+        self._start = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        # Memory is traced for the phases of the thread running the generation
+        self._thread_id = threading.get_ident()
+        self._start = time.perf_counter()
+        if self._trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._is_tracing_owner = True
+            tracemalloc.reset_peak()
+            self._open_phases.append(_OpenPhase(tracemalloc.get_traced_memory()[0]))
+
+    def stop(self) -> None:
+        self.wall_time = time.perf_counter() - self._start
+        if self._open_phases and tracemalloc.is_tracing():
+            generation_phase = self._close_memory_phase()
+            self.peak_memory = generation_phase.peak_memory - generation_phase.start_memory
+        self._open_phases.clear()
+        if self._is_tracing_owner:
+            tracemalloc.stop()
+            self._is_tracing_owner = False
+
+    def _update_peaks(self) -> None:
+        # Peak since the last reset, which happened when the innermost open phase started or a nested phase ended
+        _, peak_memory = tracemalloc.get_traced_memory()
+        for open_phase in self._open_phases:
+            open_phase.peak_memory = max(open_phase.peak_memory, peak_memory)
+        tracemalloc.reset_peak()
+
+    def _close_memory_phase(self) -> _OpenPhase:
+        self._update_peaks()
+        return self._open_phases.pop()
+
+    def _is_tracing_memory(self) -> bool:
+        return bool(self._open_phases) and tracemalloc.is_tracing() and threading.get_ident() == self._thread_id
+
+    @contextlib.contextmanager
+    def phase(self, name: str, **details) -> Iterator[Dict[str, Any]]:
+        """
+        Records the wall time and peak memory of the code run in the context.
+        Details added to the yielded dict are kept with the phase.
+
+        :param name: str
+        :param details:
+            What the phase works on
+        """
+        is_tracing_memory = self._is_tracing_memory()
+        if is_tracing_memory:
+            self._update_peaks()
+            self._open_phases.append(_OpenPhase(tracemalloc.get_traced_memory()[0]))
+
+        start = time.perf_counter()
+        try:
+            yield details
+        finally:
+            wall_time = time.perf_counter() - start
+            peak_memory = None
+            if is_tracing_memory:
+                open_phase = self._close_memory_phase()
+                peak_memory = open_phase.peak_memory - open_phase.start_memory
+            self.add_phase(RenderPhase(name, wall_time, peak_memory, details))
+
+    def add_phase(self, phase: RenderPhase) -> None:
+        with self._lock:
+            self.phases.append(phase)
+
+    def count(self, counter: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def get_phases(self, name: str) -> List[RenderPhase]:
+        with self._lock:
+            return [phase for phase in self.phases if phase.name == name]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the report as plain data, ready to be serialized
+
+        :return: dict
+        """
+        with self._lock:
+            return {
+                'wall_time': self.wall_time,
+                'peak_memory': self.peak_memory,
+                'counters': dict(self.counters),
+                'phases': [phase.to_dict() for phase in self.phases]
+            }
+
+
+def report_phase(render_report: Optional[RenderReport], name: str, **details):
+    """
+    Returns the context recording the phase in the report, or a context doing nothing when there is no report
+
+    :param render_report: RenderReport, optional
+    :param name: str
+    :param details:
+        What the phase works on
+
+    :return: context manager
+    """
+    if render_report is None:
+        return contextlib.nullcontext(details)
+    return render_report.phase(name, **details)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, Tuple
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+# Generator of the worker process, created by the pool initializer
+_worker_generator = None
+
+
+class GenerationResult(object):
+    """
+    Outcome of one job of a batch generation
+    """
+
+    def __init__(self, index: int, output_path: str, error: str = None):
+        """
+        :param index: int
+            Position of the job in the jobs given to the batch
+        :param output_path: str
+            Output path of the job, as given to the batch
+        :param error: str
+            Error message if the generation failed, None otherwise
+        """
+        self.index = index
+        self.output_path = output_path
+        self.error = error
+
+    @property
+    def is_success(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        return 'GenerationResult(index={}, output_path={}, error={})'.format(self.index, self.output_path, self.error)
+
+
+def _initialize_worker(generator_options: Dict[str, Any], base_path: str, template_path: str) -> None:
+    global _worker_generator
+
+    from docx_generator.docx_generator import DocxGenerator
+
+    _worker_generator = DocxGenerator(**generator_options)
+    try:
+        _worker_generator.preload_template(base_path, template_path)
+    except Exception as e:
+        # Jobs will report the error themselves, a failing initializer would break the whole pool
+        logging.getLogger(__name__).warning('Template could not be preloaded in worker: {}'.format(e))
+
+
+def _generate_in_worker(base_path: str, template_path: str, data: Dict, output_path: str) -> str:
+    # RenderingError can not be unpickled in the parent process, only the error message is sent back
+    try:
+        _worker_generator.generate_docx(base_path, template_path, data, output_path)
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+
+    return None
+
+
+class BatchGenerator(object):
+    """
+    Generates many documents from the same template over a pool of processes.
+
+    At most one job per worker is submitted at a time. When a worker dies, the jobs which were running are
+    run again one at a time, so that only the job actually crashing the worker is reported as failed.
+    """
+
+    def __init__(self, generator_options: Dict[str, Any], base_path: str, template_path: str, max_workers: int = None,
+                 mp_context=None):
+        """
+        :param generator_options: dict
+            Keyword arguments used to create the DocxGenerator of each worker
+        :param base_path: str
+        :param template_path: str
+            Template path, relative to base_path
+        :param max_workers: int
+            Number of worker processes (Default value is the number of CPUs)
+        :param mp_context:
+            multiprocessing context used to start the workers (Default value is the platform default)
+        """
+        self._generator_options = generator_options
+        self._base_path = base_path
+        self._template_path = template_path
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._mp_context = mp_context
+
+        self._logger = logging.getLogger(__name__)
+
+    def _start_executor(self) -> 'ProcessPoolExecutor':
+        # Imported when a batch starts, the process pool machinery is not needed to generate single documents
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(
+            max_workers=self._max_workers,
+            mp_context=self._mp_context,
+            initializer=_initialize_worker,
+            initargs=(self._generator_options, self._base_path, self._template_path)
+        )
+
+    def _submit(self, executor: 'ProcessPoolExecutor', job: Tuple[int, Dict, str]):
+        _, data, output_path = job
+        return executor.submit(_generate_in_worker, self._base_path, self._template_path, data, output_path)
+
+    def run(self, jobs: Iterable[Tuple[Dict, str]]) -> Iterator[GenerationResult]:
+        """
+        Generates a document for each job, yielding results as soon as jobs finish
+
+        :param jobs: iterable of (dict, str)
+            Data and output path (relative to base_path) of each document to generate
+
+        :return: iterator of GenerationResult
+        """
+        from concurrent.futures.process import BrokenProcessPool
+
+        pending_jobs = ((index, data, output_path) for index, (data, output_path) in enumerate(jobs))
+        suspect_jobs = deque()
+        running_jobs = dict()
+        isolated_job = None
+
+        executor = self._start_executor()
+        try:
+            while True:
+                if suspect_jobs:
+                    if not running_jobs:
+                        isolated_job = suspect_jobs.popleft()
+                        running_jobs[self._submit(executor, isolated_job)] = isolated_job
+                else:
+                    isolated_job = None
+                    while len(running_jobs) < self._max_workers:
+                        job = next(pending_jobs, None)
+                        if job is None:
+                            break
+                        running_jobs[self._submit(executor, job)] = job
+
+                if not running_jobs:
+                    break
+
+                done, _ = wait(running_jobs, return_when=FIRST_COMPLETED)
+                if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                    # Every running job fails once the pool is broken
+                    done, _ = wait(running_jobs)
+
+                is_pool_broken = False
+                for future in done:
+                    job = running_jobs.pop(future)
+                    index, _, output_path = job
+
+                    if isinstance(future.exception(), BrokenProcessPool):
+                        is_pool_broken = True
+                        if job is isolated_job:
+                            self._logger.error('Worker crashed while generating {}'.format(output_path))
+                            yield GenerationResult(index, output_path, 'Worker process crashed during generation')
+                        else:
+                            suspect_jobs.append(job)
+                        continue
+
+                    if future.exception() is not None:
+                        yield GenerationResult(index, output_path, str(future.exception()))
+                    else:
+                        yield GenerationResult(index, output_path, future.result())
+
+                if is_pool_broken:
+                    self._logger.warning('Worker pool broken, restarting it. {} job(s) will be run again one at a time'.format(len(suspect_jobs)))
+                    executor.shutdown(wait=True)
+                    executor = self._start_executor()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import logging
+import os
+import re
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from docxtpl import DocxTemplate
+from jinja2 import Environment, nodes
+from jinja2.exceptions import TemplateSyntaxError
+
+from docx_generator.adapters.docx.style_adapter import DocxStyleAdapter, RenderStylesCollection
+from docx_generator.adapters.mistletoe.DocxRenderer import DocxRenderer, is_plain_text
+from docx_generator.cache.lru_cache import LruCache
+from docx_generator.cache.markdown_cache import MarkdownCache, RenderedMarkdown
+
+# Stands for every item of a list in a data path
+ITEMS = '[]'
+
+_DATA_PATH_KEYS = re.compile(r'\[\]|[^.\[\]]+')
+
+# Process pools of a prerenderer are not usable in a forked child process
+_prerenderers = weakref.WeakSet()
+
+# Styles of the worker process, by content hash
+_worker_styles: Dict[str, DocxStyleAdapter] = dict()
+
+
+def parse_data_path(path: str) -> Tuple[str, ...]:
+    """
+    Splits a data path such as 'notes[].text' into its keys: ('notes', '[]', 'text')
+
+    :param path: str
+
+    :return: tuple of str
+    """
+    return tuple(_DATA_PATH_KEYS.findall(path))
+
+
+def _get_expression_path(expression: nodes.Node, scope: Dict[str, Tuple[str, ...]]) -> Optional[Tuple[str, ...]]:
+    if isinstance(expression, nodes.Name):
+        return scope.get(expression.name, (expression.name,))
+    if isinstance(expression, nodes.Getattr):
+        parent_path = _get_expression_path(expression.node, scope)
+        return parent_path + (expression.attr,) if parent_path is not None else None
+    if isinstance(expression, nodes.Getitem) and isinstance(expression.arg, nodes.Const) and isinstance(expression.arg.value, str):
+        parent_path = _get_expression_path(expression.node, scope)
+        return parent_path + (expression.arg.value,) if parent_path is not None else None
+
+    # Anything computed by the template can not be found in the data
+    return None
+
+
+def _get_filter_style_name(markdown_filter: nodes.Filter) -> Optional[str]:
+    style_arguments = list(markdown_filter.args) + [keyword.value for keyword in markdown_filter.kwargs if keyword.key == 'style_name']
+    if not style_arguments:
+        return 'default'
+    if isinstance(style_arguments[0], nodes.Const) and isinstance(style_arguments[0].value, str):
+        return style_arguments[0].value
+
+    return None
+
+
+def _find_markdown_fields(node: nodes.Node, scope: Dict[str, Tuple[str, ...]], fields: Dict[Tuple[str, ...], str]) -> None:
+    if isinstance(node, nodes.For):
+        _find_markdown_fields(node.iter, scope, fields)
+        loop_scope = dict(scope)
+        iterable_path = _get_expression_path(node.iter, scope)
+        if isinstance(node.target, nodes.Name):
+            if iterable_path is not None:
+                loop_scope[node.target.name] = iterable_path + (ITEMS,)
+            else:
+                # Shadows a data key of the same name
+                loop_scope[node.target.name] = None
+        for child in node.body + node.else_:
+            _find_markdown_fields(child, loop_scope, fields)
+        return
+
+    if isinstance(node, nodes.Assign) and isinstance(node.target, nodes.Name):
+        _find_markdown_fields(node.node, scope, fields)
+        scope[node.target.name] = _get_expression_path(node.node, scope)
+        return
+
+    if isinstance(node, nodes.Filter) and node.name == 'markdown' and node.node is not None:
+        path = _get_expression_path(node.node, scope)
+        style_name = _get_filter_style_name(node)
+        if path is not None and style_name is not None:
+            fields[path] = style_name
+
+    for child in node.iter_child_nodes():
+        _find_markdown_fields(child, scope, fields)
+
+
+def find_markdown_fields(template: DocxTemplate) -> Dict[Tuple[str, ...], str]:
+    """
+    Finds the data rendered with the markdown filter in the body of the template, and the style they are rendered with.
+    Only data referenced directly, through attributes, constant keys or loops, is found.
+
+    :param template: DocxTemplate
+
+    :return: dict
+        Style name by data path, each path being a tuple of keys where ITEMS stands for every item of a list
+    """
+    source = template.patch_xml(template.get_xml())
+    try:
+        tree = Environment().parse(source)
+    except TemplateSyntaxError:
+        # Reported by the render itself
+        return dict()
+
+    fields = dict()
+    _find_markdown_fields(tree, dict(), fields)
+    return fields
+
+
+def _get_field_value(value: Any, key: str) -> Any:
+    # Same lookup order as Jinja for attributes, items being looked up first for mappings
+    if isinstance(value, dict):
+        return value.get(key)
+    return getattr(value, key, None)
+
+
+def iter_field_texts(data: Any, path: Tuple[str, ...]) -> Iterator[str]:
+    """
+    Yields the texts found in the data at the path
+
+    :param data: dict
+    :param path: tuple of str
+
+    :return: iterator of str
+    """
+    if not path:
+        if isinstance(data, str):
+            yield data
+        return
+
+    key, remaining_path = path[0], path[1:]
+    if key == ITEMS:
+        items = data.values() if isinstance(data, dict) else data if isinstance(data, (list, tuple)) else ()
+        for item in items:
+            yield from iter_field_texts(item, remaining_path)
+    elif data is not None:
+        yield from iter_field_texts(_get_field_value(data, key), remaining_path)
+
+
+def _get_worker_style(style_name: str, descriptors: Dict[str, str]) -> DocxStyleAdapter:
+    style = DocxStyleAdapter(name=style_name, **descriptors)
+    return _worker_styles.setdefault(style.content_hash, style)
+
+
+def _render_in_worker(style_name: str, descriptors: Dict[str, str], texts: List[str]) -> List[Optional[RenderedMarkdown]]:
+    style = _get_worker_style(style_name, descriptors)
+    renderer = DocxRenderer(None)
+
+    rendered_texts = []
+    for text in texts:
+        renderer.set_style(style)
+        xml = renderer.render_markdown(text)
+        # Images are added to the document while rendering, texts holding some are rendered by the filter
+        rendered_texts.append(None if renderer.has_images else RenderedMarkdown(xml, tuple(renderer.link_urls), frozenset(renderer.warnings)))
+
+    return rendered_texts
+
+
+class MarkdownPrerenderer(object):
+    """
+    Converts the markdown texts of the data over a pool of processes before the template is rendered,
+    the markdown filter then returning the converted texts.
+
+    Texts are found at the data paths given to the prerenderer, or at the paths of the data the template renders
+    with the markdown filter. Texts without markdown syntax, already in the markdown cache or holding images are left
+    to the filter. Hyperlinks are converted with placeholders, replaced by the relationship ids of the document
+    when the filter adds them.
+    """
+
+    def __init__(self, max_workers: int = None, fields: Dict[str, str] = None, min_characters: int = 32 * 1024,
+                 batch_size: int = 16):
+        """
+        :param max_workers: int
+            Number of worker processes (Default value is the number of CPUs)
+        :param fields: dict, optional
+            Style name by data path of the markdown texts, such as {'notes[].text': 'default'}.
+            (Default value is the markdown fields found in the template)
+        :param min_characters: int
+            Minimum number of characters to convert for the texts of a generation to be converted by the workers,
+            smaller generations gaining nothing from it
+        :param batch_size: int
+            Number of texts sent to a worker at once
+        """
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._fields = {parse_data_path(path): style_name for path, style_name in fields.items()} if fields is not None else None
+        self._min_characters = min_characters
+        self._batch_size = batch_size
+        # Fields found in the templates, by hash of the template content
+        self._template_fields = LruCache(32)
+
+        self._reset()
+        _prerenderers.add(self)
+
+        self._logger = logging.getLogger(__name__)
+
+    def _reset(self) -> None:
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+            return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        with self._executor_lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_fields(self, template: DocxTemplate) -> Dict[Tuple[str, ...], str]:
+        if self._fields is not None:
+            return self._fields
+
+        # Set on the templates handed out by TemplateCache, fields of other templates are found on each generation
+        content_hash = getattr(template, 'content_hash', None)
+        fields = self._template_fields.get(content_hash) if content_hash is not None else None
+        if fields is None:
+            fields = find_markdown_fields(template)
+            if content_hash is not None:
+                self._template_fields.put(content_hash, fields)
+
+        return fields
+
+    def prerender(self, template: DocxTemplate, styles: RenderStylesCollection, data: Dict,
+                  markdown_cache: MarkdownCache = None) -> Dict[Tuple[str, str, str], RenderedMarkdown]:
+        """
+        Converts the markdown texts of the data
+
+        :param template: DocxTemplate
+            Template about to be rendered
+        :param styles: RenderStylesCollection
+            Render styles of the template
+        :param data: dict
+        :param markdown_cache: MarkdownCache, optional
+            Texts found in the cache are not converted again, converted texts are added to it
+
+        :return: dict
+            Converted texts by markdown cache key, to be given to the markdown filter
+        """
+        texts_by_style: Dict[str, Dict[Tuple[str, str, str], str]] = dict()
+        characters = 0
+        for path, style_name in self._get_fields(template).items():
+            try:
+                style = styles.get_style(style_name)
+            except ValueError:
+                continue
+
+            style_texts = texts_by_style.setdefault(style_name, dict())
+            for text in iter_field_texts(data, path):
+                if is_plain_text(text):
+                    continue
+                # Same text and key as the filter
+                text = text + '\r\n'
+                key = MarkdownCache.get_key(text, style_name, style.content_hash)
+                if key in style_texts or (markdown_cache is not None and key in markdown_cache):
+                    continue
+                style_texts[key] = text
+                characters += len(text)
+
+        if characters < self._min_characters:
+            return dict()
+
+        executor = self._get_executor()
+        rendered_texts = dict()
+        try:
+            batches = []
+            for style_name, style_texts in texts_by_style.items():
+                style = styles.get_style(style_name)
+                descriptors = style.get_descriptors()
+                keys = list(style_texts)
+                for start in range(0, len(keys), self._batch_size):
+                    batch_keys = keys[start:start + self._batch_size]
+                    future = executor.submit(_render_in_worker, style_name, descriptors, [style_texts[key] for key in batch_keys])
+                    batches.append((style, batch_keys, future))
+
+            for style, batch_keys, future in batches:
+                for key, rendered_markdown in zip(batch_keys, future.result()):
+                    if rendered_markdown is None:
+                        continue
+                    # Warnings raised while defining the style are only known to the style of the template
+                    rendered_markdown.warnings = rendered_markdown.warnings | style.compiled.warnings
+                    rendered_texts[key] = rendered_markdown
+                    if markdown_cache is not None:
+                        markdown_cache.put(key, rendered_markdown)
+        except Exception as e:
+            # A dead worker breaks the whole pool, the next generation starts a new one.
+            # Texts are converted by the filter meanwhile, as without prerenderer
+            self._discard_executor(executor)
+            self._logger.error('Markdown texts could not be converted before rendering: {}'.format(e.__str__()))
+            return dict()
+
+        self._logger.debug('{} markdown texts converted before rendering, {} characters'.format(len(rendered_texts), characters))
+        return rendered_texts
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+def _reset_prerenderers_after_fork() -> None:
+    for prerenderer in list(_prerenderers):
+        prerenderer._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_prerenderers_after_fork)
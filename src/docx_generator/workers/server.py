@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+JOB_FIELDS = ('base_path', 'template_path', 'data', 'output_path')
+
+STATUS_SUCCESS = 'success'
+STATUS_FAILED = 'failed'
+STATUS_REJECTED = 'rejected'
+STATUS_TIMEOUT = 'timeout'
+
+
+def _run_worker(connection, generator, generator_options: Dict[str, Any], templates: List[Tuple[str, str]], max_jobs: int) -> None:
+    # Interruptions are handled by the server, which stops its workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if generator is None:
+        # Started without fork, the templates are loaded again by this process
+        from docx_generator.docx_generator import DocxGenerator
+
+        generator = DocxGenerator(**generator_options)
+        for base_path, template_path in templates:
+            generator.preload_template(base_path, template_path)
+
+    job_count = 0
+    while max_jobs is None or job_count < max_jobs:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        # RenderingError can not be unpickled in the server process, only the error message is sent back
+        try:
+            generator.generate_docx(*job)
+            error = None
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+
+        connection.send(error)
+        job_count += 1
+
+
+class _Job(object):
+    __slots__ = ('job_id', 'arguments', 'reply', 'submitted')
+
+    def __init__(self, job_id: Any, arguments: Tuple, reply: Callable[[Dict], None]):
+        self.job_id = job_id
+        self.arguments = arguments
+        self.reply = reply
+        self.submitted = time.monotonic()
+
+
+class _Worker(object):
+    __slots__ = ('process', 'connection', 'job_count', 'job', 'deadline')
+
+    def __init__(self, process, connection):
+        self.process = process
+        self.connection = connection
+        self.job_count = 0
+        self.job = None
+        self.deadline = None
+
+
+class ReportServer(object):
+    """
+    Long-lived pool of worker processes generating documents as jobs are submitted.
+
+    Templates are preloaded by the server process before workers are forked from it, so that workers start
+    with the modules imported and the templates, styles and caches warm. Jobs are queued up to max_pending,
+    further jobs are rejected until workers catch up. A worker running a job for longer than job_timeout is killed,
+    and workers are replaced after max_jobs_per_worker jobs to bound the memory they accumulate.
+    """
+
+    def __init__(self, generator_options: Dict[str, Any] = None, templates: Iterable[Tuple[str, str]] = (),
+                 max_workers: int = None, max_pending: int = 64, job_timeout: float = None,
+                 max_jobs_per_worker: int = None, mp_context=None):
+        """
+        :param generator_options: dict
+            Keyword arguments used to create the DocxGenerator of the server
+        :param templates: iterable of (str, str)
+            Base path and template path of the templates to preload
+        :param max_workers: int
+            Number of worker processes (Default value is the number of CPUs)
+        :param max_pending: int
+            Maximum number of jobs waiting for a worker
+        :param job_timeout: float
+            Seconds after which a running job is stopped (Default value is no timeout)
+        :param max_jobs_per_worker: int
+            Number of jobs after which a worker is replaced (Default value is never)
+        :param mp_context:
+            multiprocessing context used to start the workers (Default value is fork where available)
+        """
+        self._generator_options = generator_options or dict()
+        self._templates = list(templates)
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._max_pending = max_pending
+        self._job_timeout = job_timeout
+        self._max_jobs_per_worker = max_jobs_per_worker
+        if mp_context is None and 'fork' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('fork')
+        self._mp_context = mp_context or multiprocessing.get_context()
+
+        self._generator = None
+        self._pending_jobs = deque()
+        self._is_closing = False
+        self._lock = threading.Lock()
+        self._wakeup_reader, self._wakeup_writer = multiprocessing.Pipe(duplex=False)
+        self._dispatcher = None
+
+        self._logger = logging.getLogger(__name__)
+
+    def start(self) -> None:
+        """
+        Preloads the templates and starts the workers
+
+        :return: None
+        """
+        from docx_generator.docx_generator import DocxGenerator
+
+        if self._mp_context.get_start_method() == 'fork':
+            self._generator = DocxGenerator(**self._generator_options)
+            for base_path, template_path in self._templates:
+                self._generator.preload_template(base_path, template_path)
+
+        workers = [self._start_worker() for _ in range(self._max_workers)]
+        self._dispatcher = threading.Thread(target=self._dispatch, args=(workers,), name='docx-generator-server', daemon=True)
+        self._dispatcher.start()
+
+    def _start_worker(self) -> _Worker:
+        connection, worker_connection = multiprocessing.Pipe()
+        process = self._mp_context.Process(
+            target=_run_worker,
+            args=(worker_connection, self._generator, self._generator_options, self._templates, self._max_jobs_per_worker),
+            daemon=True
+        )
+        process.start()
+        # Only the worker holds its end, so that the server sees the pipe closed if the worker dies
+        worker_connection.close()
+
+        return _Worker(process, connection)
+
+    @staticmethod
+    def _stop_worker(worker: _Worker, kill: bool = False) -> None:
+        if kill:
+            worker.process.kill()
+        else:
+            try:
+                worker.connection.send(None)
+            except OSError:
+                pass
+        worker.process.join()
+        worker.connection.close()
+
+    def _wake_up(self) -> None:
+        # Called with the lock held
+        self._wakeup_writer.send_bytes(b'')
+
+    def submit(self, job: Dict[str, Any], reply: Callable[[Dict], None]) -> bool:
+        """
+        Queues a job, or rejects it when max_pending jobs are already waiting
+
+        :param job: dict
+            base_path, template_path, data and output_path of the document to generate, and an optional id
+            sent back with the result
+        :param reply: callable
+            Called from the server thread with the result of the job, a dict holding its id, status, error and duration
+
+        :return: bool
+            True if the job was accepted
+        """
+        missing_fields = [field for field in JOB_FIELDS if field not in job]
+        if missing_fields:
+            reply(self._get_result(job.get('id'), STATUS_FAILED, 'Invalid job, missing fields: {}'.format(', '.join(missing_fields))))
+            return False
+
+        with self._lock:
+            if self._is_closing or len(self._pending_jobs) >= self._max_pending:
+                is_accepted = False
+            else:
+                self._pending_jobs.append(_Job(job.get('id'), tuple(job[field] for field in JOB_FIELDS), reply))
+                self._wake_up()
+                is_accepted = True
+
+        if not is_accepted:
+            reply(self._get_result(job.get('id'), STATUS_REJECTED, 'Server busy, job rejected'))
+
+        return is_accepted
+
+    def close(self) -> None:
+        """
+        Stops accepting jobs, waits for the accepted ones to finish and stops the workers
+
+        :return: None
+        """
+        with self._lock:
+            self._is_closing = True
+            self._wake_up()
+
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+
+    @staticmethod
+    def _get_result(job_id: Any, status: str, error: str = None, duration: float = 0.0) -> Dict[str, Any]:
+        return {'id': job_id, 'status': status, 'error': error, 'duration': duration}
+
+    def _finish_job(self, worker: _Worker, status: str, error: str = None) -> None:
+        job = worker.job
+        worker.job = None
+        worker.deadline = None
+        try:
+            job.reply(self._get_result(job.job_id, status, error, time.monotonic() - job.submitted))
+        except Exception as e:
+            self._logger.error('Result of job {} could not be sent: {}'.format(job.job_id, e))
+
+    def _assign_jobs(self, workers: List[_Worker]) -> None:
+        for index, worker in enumerate(workers):
+            while worker.job is None:
+                with self._lock:
+                    if not self._pending_jobs:
+                        return
+                    job = self._pending_jobs.popleft()
+
+                try:
+                    worker.connection.send(job.arguments)
+                except OSError:
+                    # The idle worker died, the job is given to its replacement
+                    self._logger.warning('Idle worker {} died, replacing it'.format(worker.process.pid))
+                    self._stop_worker(worker, kill=True)
+                    worker = workers[index] = self._start_worker()
+                    with self._lock:
+                        self._pending_jobs.appendleft(job)
+                    continue
+
+                worker.job = job
+                if self._job_timeout is not None:
+                    worker.deadline = time.monotonic() + self._job_timeout
+
+    def _dispatch(self, workers: List[_Worker]) -> None:
+        while True:
+            self._assign_jobs(workers)
+
+            busy_workers = [worker for worker in workers if worker.job is not None]
+            with self._lock:
+                if self._is_closing and not self._pending_jobs and not busy_workers:
+                    break
+
+            deadlines = [worker.deadline for worker in busy_workers if worker.deadline is not None]
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            ready = wait([self._wakeup_reader] + [worker.connection for worker in busy_workers], timeout)
+
+            while self._wakeup_reader.poll():
+                self._wakeup_reader.recv_bytes()
+
+            for worker in busy_workers:
+                index = workers.index(worker)
+                if worker.connection in ready:
+                    try:
+                        error = worker.connection.recv()
+                    except (EOFError, OSError):
+                        self._logger.error('Worker crashed while generating {}'.format(worker.job.arguments[3]))
+                        self._finish_job(worker, STATUS_FAILED, 'Worker process crashed during generation')
+                        self._stop_worker(worker, kill=True)
+                        workers[index] = self._start_worker()
+                        continue
+
+                    self._finish_job(worker, STATUS_SUCCESS if error is None else STATUS_FAILED, error)
+                    worker.job_count += 1
+                    if self._max_jobs_per_worker is not None and worker.job_count >= self._max_jobs_per_worker:
+                        # The worker exits by itself after its last job
+                        self._stop_worker(worker)
+                        workers[index] = self._start_worker()
+                elif worker.deadline is not None and time.monotonic() >= worker.deadline:
+                    self._logger.warning('Job timed out, stopping worker generating {}'.format(worker.job.arguments[3]))
+                    self._finish_job(worker, STATUS_TIMEOUT, 'Generation timed out after {} seconds'.format(self._job_timeout))
+                    self._stop_worker(worker, kill=True)
+                    workers[index] = self._start_worker()
+
+        for worker in workers:
+            self._stop_worker(worker)
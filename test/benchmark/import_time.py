@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+PACKAGE_MODULE = 'docx_generator.docx_generator'
+# Required by the package whatever the template, its import time is not part of the budget
+DEPENDENCY_MODULE = 'docxtpl'
+# Only imported once remote images, optimized images, markdown, batches or asynchronous generation are used
+LAZY_MODULES = ('requests', 'PIL', 'mistletoe', 'asyncio', 'concurrent.futures.process')
+
+_IMPORT_SCRIPT = '''
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+print(json.dumps({{'seconds': duration, 'lazy_modules': [name for name in {lazy_modules!r} if name in sys.modules]}}))
+'''
+
+
+def measure_import(module: str) -> Dict:
+    """
+    Imports the module in a fresh interpreter
+
+    :param module: str
+
+    :return: dict
+        Import time in seconds, and the lazy modules loaded by the import
+    """
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    process = subprocess.run([sys.executable, '-c', _IMPORT_SCRIPT.format(module=module, lazy_modules=LAZY_MODULES)],
+                             capture_output=True, check=True, text=True, env=environment)
+    return json.loads(process.stdout)
+
+
+def run_import_benchmark(iterations: int) -> Dict:
+    """
+    Measures the median import time of the package and of its required dependencies
+
+    :param iterations: int
+
+    :return: dict
+        Import times in seconds, the overhead of the package over its dependencies, and the lazy modules loaded
+    """
+    package_times = []
+    dependency_times = []
+    lazy_modules = set()
+    for _ in range(iterations):
+        package_import = measure_import(PACKAGE_MODULE)
+        package_times.append(package_import['seconds'])
+        lazy_modules.update(package_import['lazy_modules'])
+        dependency_times.append(measure_import(DEPENDENCY_MODULE)['seconds'])
+
+    import_time = statistics.median(package_times)
+    dependencies_import_time = statistics.median(dependency_times)
+    return {
+        'import_time': import_time,
+        'dependencies_import_time': dependencies_import_time,
+        'overhead': import_time - dependencies_import_time,
+        'lazy_modules': sorted(lazy_modules)
+    }
+
+
+def main(arguments: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m test.benchmark.import_time',
+                                     description='Checks the import time of the package against a budget')
+    parser.add_argument('--iterations', type=int, default=10, help='Imports measured, in fresh interpreters (Default: 10)')
+    parser.add_argument('--budget', type=float, default=0.1,
+                        help='Accepted import time in seconds on top of the required dependencies (Default: 0.1)')
+    options = parser.parse_args(arguments)
+
+    result = run_import_benchmark(options.iterations)
+    print('{} imported in {:.3f}s, {:.3f}s over {}'.format(PACKAGE_MODULE, result['import_time'], result['overhead'], DEPENDENCY_MODULE))
+
+    is_failed = False
+    if result['overhead'] > options.budget:
+        print('Import time over budget: {:.3f}s against {:.3f}s'.format(result['overhead'], options.budget))
+        is_failed = True
+    if result['lazy_modules']:
+        print('Modules loaded on import instead of when used: {}'.format(', '.join(result['lazy_modules'])))
+        is_failed = True
+
+    return 1 if is_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
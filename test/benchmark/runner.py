@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import TemporaryDirectory
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from docx_generator.cache.markdown_cache import MarkdownCache
+from docx_generator.docx_generator import DocxGenerator
+from test.benchmark.workloads import WORKLOADS, Workload
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+# Compared to the baseline, lower is better for these metrics and higher for the others
+_LOWER_IS_BETTER = ('latency_p50', 'latency_p90', 'peak_rss')
+_COMPARED_METRICS = ('throughput', 'latency_p50', 'latency_p90', 'peak_rss')
+
+
+def percentile(values: List[float], rank: float) -> float:
+    """
+    Returns the nearest-rank percentile of the values
+
+    :param values: list of float
+    :param rank: float
+        Percentile, between 0 and 100
+
+    :return: float
+    """
+    ordered_values = sorted(values)
+    index = max(0, math.ceil(rank / 100 * len(ordered_values)) - 1)
+    return ordered_values[index]
+
+
+def _get_peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+def run_workload(workload: Workload, iterations: int, scale: float) -> Dict:
+    """
+    Generates the document of the workload the given number of times, after an untimed warm up generation
+
+    :param workload: Workload
+    :param iterations: int
+    :param scale: float
+        Factor applied to the number of items of the workload
+
+    :return: dict
+        Throughput in documents and items per second, latency percentiles in seconds and peak RSS in bytes
+    """
+    # Every markdown text is rendered, the markdown cache would otherwise hide the renderer from the measures
+    generator = DocxGenerator(logger_mode='ERROR', markdown_cache=MarkdownCache(max_entries=0))
+
+    with TemporaryDirectory() as directory:
+        data = workload.build(directory, scale)
+        generator.generate_docx(directory, 'template.docx', data, 'warm_up.docx')
+
+        latencies = []
+        for iteration in range(iterations):
+            output_path = 'result_{}.docx'.format(iteration)
+            start = time.perf_counter()
+            generator.generate_docx(directory, 'template.docx', data, output_path)
+            latencies.append(time.perf_counter() - start)
+            os.remove(os.path.join(directory, output_path))
+
+    total_time = sum(latencies)
+    return {
+        'items': workload.item_count(data),
+        'iterations': iterations,
+        'throughput': iterations / total_time,
+        'items_per_second': iterations * workload.item_count(data) / total_time,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p90': percentile(latencies, 90),
+        'latency_p99': percentile(latencies, 99),
+        'latency_max': max(latencies),
+        'peak_rss': _get_peak_rss()
+    }
+
+
+def _run_workload_by_name(name: str, iterations: int, scale: float) -> Dict:
+    # Logs of the generation are not part of the measures
+    logging.getLogger().setLevel(logging.ERROR)
+    workload = next(workload for workload in WORKLOADS if workload.name == name)
+    return run_workload(workload, iterations, scale)
+
+
+def run_workloads(names: List[str], iterations: int, scale: float) -> Dict[str, Dict]:
+    """
+    Runs each workload in a fresh process, so that its peak RSS is not inflated by the previous ones
+
+    :return: dict
+        Results by workload name
+    """
+    results = dict()
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            results[name] = executor.submit(_run_workload_by_name, name, iterations, scale).result()
+
+    return results
+
+
+def compare(results: Dict[str, Dict], baselines: Dict[str, Dict], tolerance: float) -> List[str]:
+    """
+    Returns the regressions of the results over the baselines, beyond the tolerance
+
+    :param results: dict
+    :param baselines: dict
+    :param tolerance: float
+        Accepted relative degradation, 0.2 for 20%
+
+    :return: list of str
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+
+        for metric in _COMPARED_METRICS:
+            if result.get(metric) is None or not baseline.get(metric):
+                continue
+
+            ratio = result[metric] / baseline[metric]
+            if metric in _LOWER_IS_BETTER and ratio > 1 + tolerance or metric not in _LOWER_IS_BETTER and ratio < 1 - tolerance:
+                regressions.append('{} {}: {:.4g} against {:.4g} in the baseline'.format(name, metric, result[metric], baseline[metric]))
+
+    return regressions
+
+
+def _get_environment() -> Dict[str, str]:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': str(os.cpu_count())
+    }
+
+
+def _print_results(results: Dict[str, Dict]) -> None:
+    print('{:<16}{:>8}{:>12}{:>12}{:>12}{:>12}{:>12}{:>12}'.format('workload', 'items', 'docs/s', 'items/s', 'p50 (s)', 'p90 (s)', 'p99 (s)', 'RSS (MB)'))
+    for name, result in results.items():
+        peak_rss = result['peak_rss'] / 1024 / 1024 if result['peak_rss'] is not None else float('nan')
+        print('{:<16}{:>8}{:>12.3f}{:>12.1f}{:>12.3f}{:>12.3f}{:>12.3f}{:>12.1f}'.format(
+            name, result['items'], result['throughput'], result['items_per_second'],
+            result['latency_p50'], result['latency_p90'], result['latency_p99'], peak_rss
+        ))
+
+
+def main(arguments: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m test.benchmark', description='Benchmarks the generation of large synthetic documents')
+    parser.add_argument('--workload', action='append', choices=[workload.name for workload in WORKLOADS],
+                        help='Workload to run, can be repeated (Default: all workloads)')
+    parser.add_argument('--iterations', type=int, default=10, help='Timed generations of each workload (Default: 10)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Factor applied to the size of the workloads (Default: 1.0)')
+    parser.add_argument('--baseline', default=BASELINES_PATH, help='Baselines file (Default: test/benchmark/baselines.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baselines instead of comparing them')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Accepted relative degradation over the baselines (Default: 0.2)')
+    parser.add_argument('--output', help='File the results are written to, as JSON')
+    options = parser.parse_args(arguments)
+
+    names = options.workload or [workload.name for workload in WORKLOADS]
+    results = run_workloads(names, options.iterations, options.scale)
+    _print_results(results)
+
+    if options.output is not None:
+        with open(options.output, 'w') as f:
+            json.dump({'environment': _get_environment(), 'scale': options.scale, 'workloads': results}, f, indent=2)
+
+    if options.save_baseline:
+        baselines = {'environment': _get_environment(), 'scale': options.scale, 'workloads': dict()}
+        if os.path.isfile(options.baseline):
+            with open(options.baseline) as f:
+                baselines = json.load(f)
+            baselines['environment'] = _get_environment()
+            if baselines.get('scale') != options.scale:
+                baselines['scale'] = options.scale
+                baselines['workloads'] = dict()
+        baselines['workloads'].update(results)
+        with open(options.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2)
+            f.write('\n')
+        print('Baselines saved to {}'.format(options.baseline))
+        return 0
+
+    if not os.path.isfile(options.baseline):
+        print('No baselines to compare to, run with --save-baseline first')
+        return 0
+
+    with open(options.baseline) as f:
+        baselines = json.load(f)
+    if baselines.get('scale') != options.scale:
+        print('Baselines were measured at scale {}, results are not compared'.format(baselines.get('scale')))
+        return 0
+
+    regressions = compare(results, baselines['workloads'], options.tolerance)
+    for regression in regressions:
+        print('Regression: {}'.format(regression))
+
+    return 1 if regressions else 0
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from unittest import TestCase
+
+from test.benchmark.import_time import PACKAGE_MODULE, measure_import
+from test.benchmark.runner import compare, percentile, run_workload
+from test.benchmark.workloads import WORKLOADS
+
+
+class TestBenchmark(TestCase):
+    def test_workloads_should_generate_documents(self):
+        for workload in WORKLOADS:
+            with self.subTest(workload=workload.name):
+                result = run_workload(workload, iterations=1, scale=0.01)
+
+                self.assertGreater(result['throughput'], 0)
+                self.assertLessEqual(result['latency_p50'], result['latency_max'])
+
+    def test_percentile_should_return_nearest_rank(self):
+        values = [0.4, 0.1, 0.3, 0.2]
+
+        self.assertEqual(0.2, percentile(values, 50))
+        self.assertEqual(0.4, percentile(values, 99))
+        self.assertEqual(0.1, percentile(values, 0))
+
+    def test_compare_should_report_degradations_beyond_tolerance(self):
+        baselines = {'ioc_table': {'throughput': 10.0, 'latency_p50': 0.1, 'latency_p90': 0.2, 'peak_rss': 100}}
+        results = {'ioc_table': {'throughput': 7.0, 'latency_p50': 0.11, 'latency_p90': 0.3, 'peak_rss': None}}
+
+        regressions = compare(results, baselines, tolerance=0.2)
+
+        self.assertEqual(2, len(regressions))
+        self.assertTrue(regressions[0].startswith('ioc_table throughput'))
+        self.assertTrue(regressions[1].startswith('ioc_table latency_p90'))
+
+    def test_package_import_should_not_load_lazy_modules(self):
+        self.assertEqual([], measure_import(PACKAGE_MODULE)['lazy_modules'])
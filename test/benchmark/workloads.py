@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import struct
+import zlib
+from typing import Callable, Dict, List
+
+from docx import Document
+
+_TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'component', 'templates')
+
+# Holds the markdown style definitions, the benchmark templates are built from it
+_STYLES_TEMPLATE_PATH = os.path.join(_TEMPLATES_PATH, 'markdown_filter_template.docx')
+
+_NESTED_SUB_DOCUMENT_PATH = os.path.join(_TEMPLATES_PATH, 'sub_document_filter_template_part_with_nested_variable.docx')
+
+_IOC_TYPES = ('ip', 'domain', 'sha256', 'url')
+
+
+class Workload(object):
+    """
+    Template and data of a benchmarked generation, built in a working directory
+    """
+
+    def __init__(self, name: str, description: str, build: Callable[[str, float], Dict], item_count: Callable[[Dict], int]):
+        """
+        :param name: str
+        :param description: str
+        :param build: callable
+            Writes the template and its resources in the working directory for the given scale, and returns the data
+        :param item_count: callable
+            Number of items (rows, notes, images...) of the data, used to compute the item throughput
+        """
+        self.name = name
+        self.description = description
+        self.build = build
+        self.item_count = item_count
+
+
+def _scaled(count: int, scale: float) -> int:
+    return max(1, int(count * scale))
+
+
+def _build_template(template_path: str, lines: List[str], ioc_table: bool = False) -> None:
+    document = Document(_STYLES_TEMPLATE_PATH)
+    first_paragraph, second_paragraph = document.paragraphs[:2]
+
+    for line in lines:
+        first_paragraph.insert_paragraph_before(line)
+
+    if ioc_table:
+        table = document.add_table(rows=4, cols=3)
+        for cell, text in zip(table.rows[0].cells, ('Type', 'Value', 'Description')):
+            cell.text = text
+        table.cell(1, 0).text = '{%tr for ioc in iocs %}'
+        for cell, text in zip(table.rows[2].cells, ('{{ ioc.type }}', '{{r addHyperlink(ioc.value, ioc.url) }}', '{{ ioc.description }}')):
+            cell.text = text
+        table.cell(3, 0).text = '{%tr endfor %}'
+        first_paragraph._p.addprevious(table._tbl)
+
+    for paragraph in (first_paragraph, second_paragraph):
+        paragraph._p.getparent().remove(paragraph._p)
+
+    document.save(template_path)
+
+
+def _write_png(path: str, width: int, height: int, seed: int) -> None:
+    # Distinct RGB images without any imaging library, each row being a rotation of the first one
+    first_row = bytes((seed * 31 + x * 7) & 0xFF for x in range(width * 3))
+    rows = b''.join(b'\x00' + first_row[y % len(first_row):] + first_row[:y % len(first_row)] for y in range(height))
+
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(rows, 6)))
+        f.write(chunk(b'IEND', b''))
+
+
+def _markdown_note(index: int) -> str:
+    return '\n'.join([
+        'Analysis note {} on host **WKS-{:04d}**, see [the ticket](https://tickets.example.com/{}) for *context*.'.format(index, index, index),
+        '',
+        'Observed commands:',
+        '',
+        '* `powershell -enc {}`'.format('A' * 40),
+        '* ~~false positive~~ confirmed by the analyst',
+        '* lateral movement to [DC-{:02d}](https://assets.example.com/dc/{})'.format(index % 10, index % 10),
+        '',
+        '1. Isolate the host',
+        '2. Collect the memory',
+        '3. Reset the credentials',
+        '',
+        'Process | PID | Parent',
+        '--- | --- | ---',
+        'cmd.exe | {} | explorer.exe'.format(1000 + index),
+        'rundll32.exe | {} | cmd.exe'.format(2000 + index),
+        '',
+        '> Escalated to the incident manager',
+        '',
+        '```',
+        'reg query HKLM\\Software\\Microsoft\\Windows\\CurrentVersion\\Run',
+        '```',
+    ])
+
+
+def _plain_text_finding(index: int) -> str:
+    if index % 10 == 0:
+        # Some findings still hold markdown
+        return 'Finding {}: the **persistence** was set by `schtasks.exe` on WKS-{:04d}.'.format(index, index)
+
+    paragraphs = [
+        'Finding {}: the scheduled task created on WKS-{:04d} on 2021-03-{:02d} ran a renamed copy of the remote access tool.'.format(
+            index, index, 1 + index % 28),
+        'The binary reached the command & control server every 5 minutes until the host was isolated by the SOC.',
+        'Recommendation: remove the task, reset the local administrator password and monitor the outbound traffic.'
+    ]
+    return '\n\n'.join(paragraphs[:1 + index % 3])
+
+
+def _build_ioc_table(directory: str, scale: float) -> Dict:
+    _build_template(os.path.join(directory, 'template.docx'), ['IOC table'], ioc_table=True)
+
+    iocs = []
+    for index in range(_scaled(2000, scale)):
+        ioc_type = _IOC_TYPES[index % len(_IOC_TYPES)]
+        iocs.append({
+            'type': ioc_type,
+            'value': '{}-{:05d}.malicious.example.com'.format(ioc_type, index),
+            'url': 'https://intel.example.com/ioc/{}'.format(index),
+            'description': 'Seen on {} hosts between 2021-03-01 and 2021-03-{:02d}'.format(index % 50, 1 + index % 28)
+        })
+
+    return {'iocs': iocs}
+
+
+def _build_markdown_notes(directory: str, scale: float) -> Dict:
+    _build_template(os.path.join(directory, 'template.docx'), ['{%p for note in notes %}', '{{p note|markdown }}', '{%p endfor %}'])
+
+    return {'notes': [_markdown_note(index) for index in range(_scaled(300, scale))]}
+
+
+def _build_plain_text(directory: str, scale: float) -> Dict:
+    _build_template(os.path.join(directory, 'template.docx'), ['{%p for finding in findings %}', '{{p finding|markdown }}', '{%p endfor %}'])
+
+    return {'findings': [_plain_text_finding(index) for index in range(_scaled(3000, scale))]}
+
+
+def _build_images(directory: str, scale: float) -> Dict:
+    _build_template(os.path.join(directory, 'template.docx'), ['{%p for image in images %}', '{{p addPicture(image) }}', '{%p endfor %}'])
+
+    images_directory = os.path.join(directory, 'images')
+    os.makedirs(images_directory, exist_ok=True)
+    images = []
+    for index in range(_scaled(200, scale)):
+        image_path = os.path.join(images_directory, 'image_{}.png'.format(index))
+        # Some images are wider than the page and scaled down
+        _write_png(image_path, (320, 1280, 2400)[index % 3], 200, index)
+        images.append(image_path)
+
+    return {'images': images}
+
+
+def _build_sub_documents(directory: str, scale: float) -> Dict:
+    _build_template(os.path.join(directory, 'template.docx'), [
+        '{%p for sub_document in sub_documents %}', '{{p addSubDocument(sub_document) }}', '{%p endfor %}', '{{ first_level }}'
+    ])
+
+    # Each sub document adds another one at the next render level, which adds a variable rendered at the level after
+    nesting_document = Document()
+    nesting_document.add_paragraph('Sub document adding a nested sub document')
+    nesting_document.add_paragraph('{{p addSubDocument(nested_sub_document) }}')
+    nesting_document_path = os.path.join(directory, 'nesting_sub_document.docx')
+    nesting_document.save(nesting_document_path)
+
+    return {
+        'sub_documents': [nesting_document_path] * _scaled(50, scale),
+        'nested_sub_document': _NESTED_SUB_DOCUMENT_PATH,
+        'nested_variable': 'Nested variable',
+        # Rendered text holding tags is rendered again at the next level
+        'first_level': '{{ second_level }}',
+        'second_level': '{{ third_level }}',
+        'third_level': 'Last level'
+    }
+
+
+def _build_full_report(directory: str, scale: float) -> Dict:
+    data = dict()
+    for build in (_build_ioc_table, _build_markdown_notes, _build_images, _build_sub_documents):
+        data.update(build(directory, scale / 4))
+
+    _build_template(os.path.join(directory, 'template.docx'), [
+        '{%p for note in notes %}', '{{p note|markdown }}', '{%p endfor %}',
+        '{%p for image in images %}', '{{p addPicture(image) }}', '{%p endfor %}',
+        '{%p for sub_document in sub_documents %}', '{{p addSubDocument(sub_document) }}', '{%p endfor %}', '{{ first_level }}'
+    ], ioc_table=True)
+
+    return data
+
+
+WORKLOADS = [
+    Workload('ioc_table', 'IOC table rows with a hyperlink each', _build_ioc_table, lambda data: len(data['iocs'])),
+    Workload('markdown_notes', 'Markdown notes with lists, tables, quotes and code', _build_markdown_notes, lambda data: len(data['notes'])),
+    Workload('plain_text', 'Findings passed through the markdown filter, mostly without any markdown syntax', _build_plain_text,
+             lambda data: len(data['findings'])),
+    Workload('images', 'Distinct PNG images, some scaled to the page', _build_images, lambda data: len(data['images'])),
+    Workload('sub_documents', 'Nested sub documents over multiple render levels', _build_sub_documents, lambda data: len(data['sub_documents'])),
+    Workload('full_report', 'All of the above at a quarter of their size', _build_full_report,
+             lambda data: len(data['iocs']) + len(data['notes']) + len(data['images']) + len(data['sub_documents'])),
+]
@@ -18,16 +18,39 @@
 #  along with this program; if not, write to the Free Software Foundation,
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+import asyncio
+import functools
+import io
 import os
 import re
+import threading
+import zipfile
+from http.server import HTTPServer, SimpleHTTPRequestHandler
 from tempfile import TemporaryDirectory
-from unittest import TestCase
+from unittest import TestCase, skipIf
 
 from docx import Document
 from docx.opc.constants import RELATIONSHIP_TYPE
+from docx.oxml.ns import nsmap
+from jinja2 import FileSystemBytecodeCache
 
+from docx_generator.adapters.image_optimizer_adapter import Image, ImageOptimizer
+from docx_generator.cache.markdown_cache import MarkdownCache
 from docx_generator.docx_generator import DocxGenerator
+from docx_generator.exceptions.rendering_cancelled_error import RenderingCancelledError
 from docx_generator.exceptions.rendering_error import RenderingError
+from docx_generator.profiling.render_report import RenderReport
+from docx_generator.workers.markdown_prerender import MarkdownPrerenderer
+
+
+class CrashingValue(object):
+    def __str__(self):
+        os._exit(1)
+
+
+class FailingValue(object):
+    def __str__(self):
+        raise ValueError('Value can not be rendered')
 
 
 class TestDocxGenerator(TestCase):
@@ -81,6 +104,28 @@ class TestDocxGenerator(TestCase):
 
         self.assertTrue(has_been_found, 'Text passed as data is not found in the generated document.')
 
+    def test_should_generate_docx_from_template_bytes_to_bytes(self):
+        with open(os.path.join(self._base_path, self._template_path, 'basic_template.docx'), 'rb') as template_file:
+            template = template_file.read()
+
+        result = self._subject.generate_docx_stream(self._base_path, template, {'name': 'Report Name'})
+
+        document = Document(io.BytesIO(result))
+        self.assertIn('Report Name', '\n'.join(paragraph.text for paragraph in document.paragraphs))
+
+    def test_should_generate_docx_from_template_stream_to_output_stream(self):
+        output = io.BytesIO()
+        with open(os.path.join(self._base_path, self._template_path, 'basic_template.docx'), 'rb') as template_file:
+            result = self._subject.generate_docx_stream(self._base_path, template_file, {'name': 'Report Name'}, output)
+
+        self.assertIsNone(result)
+        document = Document(io.BytesIO(output.getvalue()))
+        self.assertIn('Report Name', '\n'.join(paragraph.text for paragraph in document.paragraphs))
+
+    def test_should_raise_rendering_error_if_template_stream_is_not_a_docx(self):
+        with self.assertRaises(RenderingError):
+            self._subject.generate_docx_stream(self._base_path, b'not a docx', {})
+
     def test_should_generate_docx_from_template_with_timestamp_to_date_filter(self):
         data = {
             'date': '1589480671562'
@@ -134,6 +179,65 @@ class TestDocxGenerator(TestCase):
         self.assertTrue(data['hyperlink_url'] in found_hyperlinks)
         self.assertTrue(data['mail_url'] in found_hyperlinks)
 
+    def test_should_generate_docx_from_template_with_table_global(self):
+        template = Document(os.path.join(self._base_path, self._template_path, 'markdown_filter_template.docx'))
+        template.paragraphs[0].text = '{{p addTable(iocs, [\'type\', \'value\']) }}'
+        template.paragraphs[1].text = '{{p addTable(matrix) }}'
+        template.save(os.path.join(self._base_path, self._results_path, 'table_template.docx'))
+
+        render_report = RenderReport()
+        data = {
+            'iocs': [{'type': 'domain', 'value': 'a&b-{}.example.com'.format(index), 'seen': index} for index in range(600)],
+            'matrix': [['first line\nsecond line', None]]
+        }
+        output_path = os.path.join(self._results_path, 'table_result.docx')
+
+        self._subject.generate_docx(self._base_path, os.path.join(self._results_path, 'table_template.docx'), data, output_path,
+                                    render_report=render_report)
+
+        document = Document(os.path.join(self._base_path, output_path))
+        iocs_table, matrix_table = document.tables
+        self.assertEqual(601, len(iocs_table.rows))
+        self.assertEqual(['type', 'value'], [cell.text for cell in iocs_table.rows[0].cells])
+        self.assertEqual(['domain', 'a&b-599.example.com'], [cell.text for cell in iocs_table.rows[-1].cells])
+        self.assertEqual(['first line\nsecond line', ''], [cell.text for cell in matrix_table.rows[0].cells])
+        self.assertEqual(601, render_report.counters['table_rows'])
+
+    def test_should_generate_docx_with_table_global_in_header_and_table_cell(self):
+        template = Document(os.path.join(self._base_path, self._template_path, 'markdown_filter_template.docx'))
+        template.sections[0].header.paragraphs[0].text = '{{p addTable(header_rows) }}'
+        template.paragraphs[0].text = ''
+        template.paragraphs[1].text = ''
+        template.add_table(rows=1, cols=1).cell(0, 0).paragraphs[0].text = '{{p addTable(cell_rows) }}'
+        template.save(os.path.join(self._base_path, self._results_path, 'table_template.docx'))
+
+        data = {'header_rows': [['Case 42', 'TLP:AMBER']], 'cell_rows': [['nested']]}
+        output_path = os.path.join(self._results_path, 'table_result.docx')
+
+        self._subject.generate_docx(self._base_path, os.path.join(self._results_path, 'table_template.docx'), data, output_path)
+
+        document = Document(os.path.join(self._base_path, output_path))
+        self.assertEqual(['Case 42', 'TLP:AMBER'], [cell.text for cell in document.sections[0].header.tables[0].rows[0].cells])
+        cell_element = document.tables[-1].cell(0, 0)._tc
+        self.assertEqual('nested', cell_element.xpath('string(w:tbl)'))
+        self.assertEqual('p', cell_element[-1].tag.rpartition('}')[2])
+
+    def test_should_skip_table_global_without_any_row(self):
+        template = Document(os.path.join(self._base_path, self._template_path, 'markdown_filter_template.docx'))
+        template.paragraphs[0].text = '{{p addTable(empty_rows) }}{{p addTable(empty_columns) }}'
+        template.paragraphs[1].text = '{{p addTable(empty_rows, [\'type\']) }}'
+        template.save(os.path.join(self._base_path, self._results_path, 'table_template.docx'))
+
+        output_path = os.path.join(self._results_path, 'table_result.docx')
+
+        self._subject.generate_docx(self._base_path, os.path.join(self._results_path, 'table_template.docx'),
+                                    {'empty_rows': [], 'empty_columns': {}}, output_path)
+
+        document = Document(os.path.join(self._base_path, output_path))
+        self.assertEqual(1, len(document.tables))
+        self.assertEqual(['type'], [cell.text for cell in document.tables[0].rows[0].cells])
+        self.assertNotIn('docx-generator-table-', '\n'.join(paragraph.text for paragraph in document.paragraphs))
+
     def test_should_generate_docx_from_template_with_image_global(self):
         data = {
             'image1': os.path.abspath(os.path.join(self._base_path, './images/test_image.jpg')),
@@ -147,6 +251,97 @@ class TestDocxGenerator(TestCase):
             os.path.join(self._results_path, self._output_filenames['image_filter_template_result'])
         )
 
+    def test_should_generate_docx_from_template_with_remote_images_and_skip_failed_downloads(self):
+        handler = functools.partial(SimpleHTTPRequestHandler, directory=os.path.join(self._base_path, 'images'))
+        server = HTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        url = 'http://127.0.0.1:{}/'.format(server.server_port)
+        data = {
+            'image1': url + 'test_image.jpg',
+            'image2': url + 'missing_image.jpg'
+        }
+        output_path = os.path.join(self._results_path, self._output_filenames['image_filter_template_result'])
+
+        self._subject.generate_docx(self._base_path, os.path.join(self._template_path, 'image_filter_template.docx'), data, output_path)
+
+        document = Document(os.path.join(self._base_path, output_path))
+        self.assertEqual(1, len(document.inline_shapes))
+        self.assertNotIn('docx-generator-picture-', '\n'.join(paragraph.text for paragraph in document.paragraphs))
+
+    def test_should_generate_docx_with_remote_images_in_header_and_table_cell(self):
+        handler = functools.partial(SimpleHTTPRequestHandler, directory=os.path.join(self._base_path, 'images'))
+        server = HTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        template = Document()
+        template.sections[0].header.paragraphs[0].text = '{{p addPicture(header_image) }}'
+        template.add_table(rows=1, cols=1).cell(0, 0).paragraphs[0].text = '{{p addPicture(cell_image) }}'
+        template.save(os.path.join(self._base_path, self._results_path, 'remote_image_template.docx'))
+
+        url = 'http://127.0.0.1:{}/'.format(server.server_port)
+        data = {'header_image': url + 'test_image_small.jpg', 'cell_image': url + 'missing_image.jpg'}
+        output_path = os.path.join(self._results_path, self._output_filenames['image_filter_template_result'])
+
+        self._subject.generate_docx(self._base_path, os.path.join(self._results_path, 'remote_image_template.docx'), data, output_path)
+
+        document = Document(os.path.join(self._base_path, output_path))
+        header = document.sections[0].header
+        self.assertNotIn('docx-generator-picture-', '\n'.join(paragraph.text for paragraph in header.paragraphs))
+        blip = header._element.xpath('.//a:blip')[0]
+        self.assertIn(blip.get('{{{}}}embed'.format(nsmap['r'])), header.part.rels)
+        cell_element = document.tables[0].cell(0, 0)._tc
+        self.assertEqual('p', cell_element[-1].tag.rpartition('}')[2])
+        self.assertEqual('', cell_element.xpath('string(.)'))
+
+    def test_should_store_identical_images_once(self):
+        image_path = os.path.join(self._base_path, 'images', 'test_image_small.jpg')
+        sub_document = Document()
+        sub_document.add_picture(image_path)
+        sub_document.save(os.path.join(self._base_path, self._results_path, 'image_sub_document.docx'))
+
+        template = Document()
+        for _ in range(2):
+            template.add_paragraph('{{p addSubDocument(sub_document) }}')
+            template.add_paragraph('{{p addPicture(image) }}')
+        template.save(os.path.join(self._base_path, self._results_path, 'image_template.docx'))
+
+        data = {
+            'sub_document': os.path.join(self._base_path, self._results_path, 'image_sub_document.docx'),
+            'image': image_path
+        }
+        output_path = os.path.join(self._results_path, self._output_filenames['image_filter_template_result'])
+
+        self._subject.generate_docx(self._base_path, os.path.join(self._results_path, 'image_template.docx'), data, output_path)
+
+        with zipfile.ZipFile(os.path.join(self._base_path, output_path)) as package:
+            media = [name for name in package.namelist() if name.startswith('word/media/')]
+        self.assertEqual(1, len(media))
+        self.assertEqual(4, len(Document(os.path.join(self._base_path, output_path)).inline_shapes))
+
+    @skipIf(Image is None, 'Pillow is not installed')
+    def test_should_embed_optimized_images(self):
+        image_optimizer = ImageOptimizer(os.path.join(self._base_path, self._results_path, 'optimized_images'), dpi=96)
+        subject = DocxGenerator(logger_mode='DEBUG', image_optimizer=image_optimizer)
+        image_path = os.path.join(self._base_path, 'images', 'test_image.jpg')
+        data = {
+            'image1': image_path,
+            'image2': os.path.join(self._base_path, 'images', 'test_image_small.jpg')
+        }
+        output_path = os.path.join(self._results_path, self._output_filenames['image_filter_template_result'])
+
+        subject.generate_docx(self._base_path, os.path.join(self._template_path, 'image_filter_template.docx'), data, output_path)
+
+        with zipfile.ZipFile(os.path.join(self._base_path, output_path)) as package:
+            media_sizes = [item.file_size for item in package.infolist() if item.filename.startswith('word/media/')]
+        self.assertEqual(2, len(media_sizes))
+        self.assertLess(max(media_sizes), os.path.getsize(image_path))
+        self.assertEqual(2, len(Document(os.path.join(self._base_path, output_path)).inline_shapes))
+
     def test_should_generate_docx_from_template_with_image_from_uuid_global(self):
         data = {
             'uuid': '5bacc2bc-5b90-4c47-93d7-d9291911c4b3',
@@ -195,6 +390,84 @@ class TestDocxGenerator(TestCase):
             data,
             os.path.join(self._results_path, self._output_filenames['markdown_filter_template_result'])
         )
+
+    def test_should_reuse_rendered_markdown_with_hyperlinks_of_each_document(self):
+        markdown_cache = MarkdownCache()
+        subject = DocxGenerator(logger_mode='DEBUG', markdown_cache=markdown_cache)
+        data = {
+            'text_for_paragraph': '[first](http://first.example.com) then [second](http://second.example.com)',
+            'text_for_code_block': '**toto**'
+        }
+        output_paths = [os.path.join(self._results_path, 'markdown_cache_result_{}.docx'.format(index)) for index in range(2)]
+
+        for output_path in output_paths:
+            subject.generate_docx(self._base_path, os.path.join(self._template_path, 'markdown_filter_template.docx'), data, output_path)
+
+        self.assertEqual(2, markdown_cache.get_statistics()['hits'])
+        for output_path in output_paths:
+            generated_document = Document(os.path.join(self._base_path, output_path))
+            hyperlinks = {rel_id: rel._target for rel_id, rel in generated_document.part.rels.items() if rel.reltype == RELATIONSHIP_TYPE.HYPERLINK}
+            used_rel_ids = generated_document.element.body.xpath('.//w:hyperlink/@r:id')
+            self.assertEqual(['http://first.example.com', 'http://second.example.com'], [hyperlinks[rel_id] for rel_id in used_rel_ids])
+
+    def test_should_generate_same_document_with_markdown_converted_before_rendering(self):
+        markdown_prerenderer = MarkdownPrerenderer(max_workers=1, min_characters=0)
+        self.addCleanup(markdown_prerenderer.shutdown)
+        data = {
+            'text_for_paragraph': '**Links**: [first](http://first.example.com) then [second](http://second.example.com)',
+            'text_for_code_block': '* [second](http://second.example.com)\n* plain item'
+        }
+
+        document_parts = []
+        for prerenderer in (None, markdown_prerenderer):
+            subject = DocxGenerator(logger_mode='DEBUG', markdown_cache=MarkdownCache(max_entries=0), markdown_prerenderer=prerenderer)
+            render_report = RenderReport(trace_memory=False)
+            output_path = os.path.join(self._results_path, 'markdown_prerender_result.docx')
+            subject.generate_docx(self._base_path, os.path.join(self._template_path, 'markdown_filter_template.docx'), data, output_path,
+                                  render_report=render_report)
+            with zipfile.ZipFile(os.path.join(self._base_path, output_path)) as package:
+                document_parts.append((package.read('word/document.xml'), package.read('word/_rels/document.xml.rels')))
+
+        self.assertEqual(2, render_report.get_phases('markdown_prerender')[0].details['texts'])
+        self.assertEqual(document_parts[0], document_parts[1])
+
+    def test_should_report_phases_and_counters_of_generation(self):
+        render_report = RenderReport()
+        data = {
+            'text_for_paragraph': '[first](http://first.example.com) then **strong**',
+            'text_for_code_block': 'toto'
+        }
+
+        self._subject.generate_docx(self._base_path, os.path.join(self._template_path, 'markdown_filter_template.docx'), data,
+                                    os.path.join(self._results_path, 'render_report_result.docx'), render_report=render_report)
+
+        phase_names = [phase.name for phase in render_report.phases]
+        for phase_name in ('template_load', 'jinja_render', 'render_level', 'markdown', 'save'):
+            self.assertIn(phase_name, phase_names)
+        self.assertEqual(2, render_report.counters['markdown_calls'])
+        self.assertEqual(len(data['text_for_paragraph']) + len(data['text_for_code_block']), render_report.counters['markdown_characters'])
+        self.assertEqual(1, render_report.counters['links'])
+        self.assertEqual(1, render_report.get_phases('render_level')[0].details['level'])
+        self.assertGreater(render_report.wall_time, 0)
+        self.assertGreater(render_report.peak_memory, 0)
+
+    def test_should_remove_style_definitions_from_generated_docx(self):
+        data = {
+            'text_for_paragraph': '**Strong text**',
+            'text_for_code_block': 'toto'
+        }
+
+        self._subject.generate_docx(
+            self._base_path,
+            os.path.join(self._template_path, 'markdown_filter_template.docx'),
+            data,
+            os.path.join(self._results_path, self._output_filenames['markdown_filter_template_result'])
+        )
+
+        document = Document(os.path.join(self._base_path, self._results_path, self._output_filenames['markdown_filter_template_result']))
+        for paragraph in document.paragraphs:
+            self.assertIsNone(re.search(r'##\s*(begin|end)\s*style', paragraph.text, re.IGNORECASE), 'Style definition found in the generated document.')
+
     def test_should_not_fail_with_specific_markdown(self):
         markdown_text = '***possibly an error***'
 
@@ -244,6 +517,11 @@ class TestDocxGenerator(TestCase):
             os.path.join(self._results_path, self._output_filenames['recursive_render_result'])
         )
 
+        document = Document(os.path.join(self._base_path, self._results_path, self._output_filenames['recursive_render_result']))
+        document_text = '\n'.join(paragraph.text for paragraph in document.paragraphs)
+        self.assertIn(data['nested_variable_level_2'], document_text)
+        self.assertNotIn('{{', document_text)
+
     def test_should_generate_docx_with_nested_variables_up_to_5_render(self):
         subdoc_path = os.path.join(self._base_path, self._template_path, 'sub_document_filter_template_part_with_nested_variable.docx')
 
@@ -264,6 +542,22 @@ class TestDocxGenerator(TestCase):
             os.path.join(self._results_path, self._output_filenames['recursive_max_depth_render_result'])
         )
 
+    def test_should_stop_rendering_when_a_level_does_not_change_the_document(self):
+        data = {
+            'name': '{{ name }}'
+        }
+
+        with self.assertLogs('docx_generator.docx_generator', level='INFO') as logs:
+            self._subject.generate_docx(
+                self._base_path,
+                os.path.join(self._template_path, 'basic_template.docx'),
+                data,
+                os.path.join(self._results_path, self._output_filenames['basic_template_result'])
+            )
+
+        self.assertTrue(any('did not change the document' in line for line in logs.output))
+        self.assertFalse(any('Start rendering for level 3' in line for line in logs.output))
+
     def test_should_raise_rendering_error_if_global_does_not_exist(self):
         data = {'value': 'test values'}
 
@@ -296,3 +590,93 @@ class TestDocxGenerator(TestCase):
                 data,
                 os.path.join(self._results_path, self._output_filenames['unclosed_jinja_control_tag_result'])
             )
+
+    def test_should_generate_many_docx_from_the_same_template(self):
+        jobs = [
+            ({'name': 'Report {}'.format(index)}, os.path.join(self._results_path, 'batch_result_{}.docx'.format(index)))
+            for index in range(4)
+        ]
+
+        results = list(self._subject.generate_many(self._base_path, os.path.join(self._template_path, 'basic_template.docx'), jobs, max_workers=2))
+
+        self.assertEqual(4, len(results))
+        for result in results:
+            self.assertTrue(result.is_success, result.error)
+            document = Document(os.path.join(self._base_path, result.output_path))
+            self.assertIn('Report {}'.format(result.index), '\n'.join(paragraph.text for paragraph in document.paragraphs))
+
+    def test_generate_many_should_use_bytecode_cache_of_the_generator(self):
+        bytecode_directory = os.path.join(self._base_path, self._results_path, 'bytecode')
+        os.mkdir(bytecode_directory)
+        subject = DocxGenerator(logger_mode='DEBUG', bytecode_cache=FileSystemBytecodeCache(bytecode_directory))
+        jobs = [({'name': 'Report'}, os.path.join(self._results_path, 'batch_result.docx'))]
+
+        results = list(subject.generate_many(self._base_path, os.path.join(self._template_path, 'basic_template.docx'), jobs, max_workers=1))
+
+        self.assertTrue(results[0].is_success, results[0].error)
+        self.assertNotEqual([], os.listdir(bytecode_directory))
+
+    def test_generate_many_should_report_failing_and_crashing_jobs_without_stopping_the_batch(self):
+        jobs = [
+            ({'name': 'Report 0'}, os.path.join(self._results_path, 'batch_result_0.docx')),
+            ({'name': CrashingValue()}, os.path.join(self._results_path, 'batch_result_1.docx')),
+            ({'name': FailingValue()}, os.path.join(self._results_path, 'batch_result_2.docx')),
+            ({'name': 'Report 3'}, os.path.join(self._results_path, 'batch_result_3.docx'))
+        ]
+
+        results = {
+            result.index: result
+            for result in self._subject.generate_many(self._base_path, os.path.join(self._template_path, 'basic_template.docx'), jobs, max_workers=2)
+        }
+
+        self.assertEqual([0, 1, 2, 3], sorted(results))
+        self.assertTrue(results[0].is_success)
+        self.assertFalse(results[1].is_success)
+        self.assertIn('Value can not be rendered', results[2].error)
+        self.assertTrue(results[3].is_success)
+
+    def test_should_generate_docx_asynchronously(self):
+        template_path = os.path.join(self._template_path, 'basic_template.docx')
+        output_paths = [os.path.join(self._results_path, 'async_result_{}.docx'.format(index)) for index in range(2)]
+
+        async def generate_concurrently():
+            await asyncio.gather(*(
+                self._subject.generate_docx_async(self._base_path, template_path, {'name': 'Report {}'.format(index)}, output_path)
+                for index, output_path in enumerate(output_paths)
+            ))
+
+        asyncio.run(generate_concurrently())
+
+        for index, output_path in enumerate(output_paths):
+            document = Document(os.path.join(self._base_path, output_path))
+            self.assertIn('Report {}'.format(index), '\n'.join(paragraph.text for paragraph in document.paragraphs))
+
+    def test_should_propagate_cancellation_of_asynchronous_generation(self):
+        async def generate_and_cancel():
+            task = asyncio.ensure_future(self._subject.generate_docx_async(
+                self._base_path,
+                os.path.join(self._template_path, 'basic_template.docx'),
+                {'name': 'Report Name'},
+                os.path.join(self._results_path, self._output_filenames['basic_template_result'])
+            ))
+            await asyncio.sleep(0)
+            task.cancel()
+            await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(generate_and_cancel())
+
+    def test_should_not_write_output_of_cancelled_generation(self):
+        cancel_event = threading.Event()
+        cancel_event.set()
+
+        with self.assertRaises(RenderingCancelledError):
+            self._subject.generate_docx(
+                self._base_path,
+                os.path.join(self._template_path, 'basic_template.docx'),
+                {'name': 'Report Name'},
+                os.path.join(self._results_path, self._output_filenames['basic_template_result']),
+                cancel_event
+            )
+
+        self.assertFalse(os.path.exists(os.path.join(self._base_path, self._results_path, self._output_filenames['basic_template_result'])))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import pickle
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from jinja2 import FileSystemBytecodeCache
+
+from docx_generator.adapters.jinja_adapter import BytecodeCachingEnvironment
+from docx_generator.cache.bytecode_cache import MemoryBytecodeCache
+
+
+class TestBytecodeCache(TestCase):
+    def setUp(self) -> None:
+        self._bytecode_cache = MemoryBytecodeCache()
+        self._subject = BytecodeCachingEnvironment(bytecode_cache=self._bytecode_cache)
+
+    def test_from_string_should_compile_same_source_once(self):
+        first_template = self._subject.from_string('{{ value }}')
+        second_template = self._subject.from_string('{{ value }}')
+
+        self.assertEqual('1', second_template.render(value=1))
+        self.assertIs(first_template.root_render_func.__code__, second_template.root_render_func.__code__)
+        statistics = self._bytecode_cache.get_statistics()
+        self.assertEqual(1, statistics['misses'])
+        self.assertEqual(1, statistics['hits'])
+
+    def test_bind_should_keep_globals_and_filters_of_each_render(self):
+        first_environment = self._subject.bind()
+        second_environment = self._subject.bind()
+        first_environment.globals['name'] = lambda: 'first'
+        first_environment.filters['shout'] = str.upper
+        second_environment.globals['name'] = lambda: 'second'
+        second_environment.filters['shout'] = str.lower
+
+        source = '{{ name()|shout }}'
+
+        self.assertEqual('FIRST', first_environment.from_string(source).render())
+        self.assertEqual('second', second_environment.from_string(source).render())
+        self.assertNotIn('name', self._subject.globals)
+
+    def test_from_string_should_load_code_compiled_by_another_process(self):
+        with TemporaryDirectory() as directory:
+            BytecodeCachingEnvironment(bytecode_cache=FileSystemBytecodeCache(directory)).from_string('{{ value }}')
+            bytecode_cache = FileSystemBytecodeCache(directory)
+            environment = BytecodeCachingEnvironment(bytecode_cache=bytecode_cache)
+            environment.compile = None
+
+            self.assertEqual('2', environment.from_string('{{ value }}').render(value=2))
+
+    def test_pickle_should_copy_cache_without_compiled_code(self):
+        self._subject.from_string('{{ value }}')
+
+        worker_cache = pickle.loads(pickle.dumps(self._bytecode_cache))
+        BytecodeCachingEnvironment(bytecode_cache=worker_cache).from_string('{{ value }}')
+
+        self.assertEqual(1, worker_cache.get_statistics()['misses'])
+        self.assertEqual(1, worker_cache.get_statistics()['entries'])
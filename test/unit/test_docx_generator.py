@@ -19,10 +19,19 @@
 #  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import os
+import pickle
+import threading
 from unittest import TestCase
 
 from docx_generator.docx_generator import DocxGenerator
 from docx_generator.exceptions.rendering_error import RenderingError
+from docx_generator.globals.picture_globals import PictureGlobals
+
+
+class _CaptionedPictureGlobals(PictureGlobals):
+    def __init__(self, template, base_path: str, caption: str = None):
+        super().__init__(template, base_path)
+        self.caption = caption
 
 
 class TestDocxGenerator(TestCase):
@@ -59,3 +68,13 @@ class TestDocxGenerator(TestCase):
     def test_generate_docx_should_raise_error_if_result_path_does_not_exist(self):
         with self.assertRaises(RenderingError):
             self._subject.generate_docx(self._base_path, self._template_path, {}, 'invalid/test.docx')
+
+    def test_worker_options_should_keep_configured_image_handler(self):
+        image_handler = _CaptionedPictureGlobals(None, '', caption='Figure')
+        image_handler.set_cancel_event(threading.Event())
+        subject = DocxGenerator(image_handler=image_handler)
+
+        worker_options = pickle.loads(pickle.dumps(subject._get_worker_options()))
+
+        self.assertIsInstance(worker_options['image_handler'], _CaptionedPictureGlobals)
+        self.assertEqual('Figure', worker_options['image_handler'].caption)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from unittest import TestCase
+
+import mistletoe
+from docx import Document
+from docxtpl import DocxTemplate
+
+from docx_generator.adapters.docx.style_adapter import DocxStyleAdapter
+from docx_generator.adapters.mistletoe.DocxRenderer import DocxRenderer
+
+
+class TestDocxRenderer(TestCase):
+    def setUp(self) -> None:
+        template = DocxTemplate('test/unit/template/test_template.docx')
+        template.docx = Document('test/unit/template/test_template.docx')
+        self._subject = DocxRenderer(template)
+        self._subject.set_style(DocxStyleAdapter(name='default', paragraph='<w:pPr/>', ul='<w:pPr/>'))
+
+    def test_render_plain_text_should_render_as_mistletoe(self):
+        texts = [
+            'Host WKS-0042 was compromised on 2021-03-01 at 10:00 (UTC).',
+            'Tom & Jerry\'s "report", 50% done: see http://example.com/report?id=1.',
+            'First line\nSecond line\n\n\nSecond paragraph\n',
+            '\nAfter a blank line\t with a tab',
+            ''
+        ]
+
+        for text in texts:
+            with self.subTest(text=text):
+                xml = self._subject.render_plain_text(text)
+                self.assertEqual(mistletoe.markdown(text + '\r\n', self._subject), xml)
+
+    def test_render_plain_text_should_reject_markdown_syntax(self):
+        texts = ['**strong**', 'snake_case', '[link](http://example.com)', '<b>html</b>', '# title', '- item', '1. item', '. item',
+                 'Title\n===', '    code', 'hard  \nbreak', 'pipe | table', 'line\rfeed', 'back\\slash']
+
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertIsNone(self._subject.render_plain_text(text))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import logging
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from docx_generator.adapters.file_adapter import UuidFolderIndex
+from docx_generator.exceptions.rendering_error import RenderingError
+
+_UUID = '466cf6e1-569d-4239-ae34-9a4d9b52fd5c'
+
+
+class TestUuidFolderIndex(TestCase):
+    def setUp(self) -> None:
+        self._directory = TemporaryDirectory()
+        self._logger = logging.getLogger(__name__)
+        self._subject = UuidFolderIndex(self._directory.name)
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def _add_file(self, file_uuid: str, file_name: str) -> str:
+        folder_path = os.path.join(self._directory.name, file_uuid)
+        os.makedirs(folder_path, exist_ok=True)
+        file_path = os.path.join(folder_path, file_name)
+        open(file_path, 'wb').close()
+        return file_path
+
+    def test_recover_file_path_should_return_file_of_uuid_folder(self):
+        file_path = self._add_file(_UUID, 'picture.png')
+
+        self.assertEqual(file_path, self._subject.recover_file_path(self._logger, 'Picture', _UUID))
+
+    def test_recover_file_path_should_look_up_folder_missing_from_listing(self):
+        with self.assertRaises(RenderingError):
+            self._subject.recover_file_path(self._logger, 'Picture', _UUID)
+
+        file_path = self._add_file(_UUID, 'picture.png')
+
+        self.assertEqual(file_path, self._subject.recover_file_path(self._logger, 'Picture', _UUID))
+
+    def test_recover_file_path_should_reject_invalid_uuid_and_multiple_files(self):
+        self._add_file(_UUID, 'first.png')
+        self._add_file(_UUID, 'second.png')
+
+        with self.assertRaises(RenderingError):
+            self._subject.recover_file_path(self._logger, 'Picture', 'not-a-uuid')
+        with self.assertRaises(RenderingError):
+            self._subject.recover_file_path(self._logger, 'Picture', _UUID)
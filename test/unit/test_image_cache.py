@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import functools
+import io
+import os
+import threading
+import time
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from docx_generator.adapters.remote_image_adapter import RemoteImageFetcher
+from docx_generator.cache.image_cache import ImageDownloadCache
+
+
+class _CountingRequestHandler(SimpleHTTPRequestHandler):
+    statuses = []
+    cache_control = None
+    send_validators = True
+
+    def send_response(self, code, message=None):
+        self.statuses.append(code)
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if self.send_validators or keyword != 'Last-Modified':
+            super().send_header(keyword, value)
+
+    def end_headers(self):
+        if self.cache_control is not None:
+            super().send_header('Cache-Control', self.cache_control)
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestImageDownloadCache(TestCase):
+    def setUp(self) -> None:
+        self._directory = TemporaryDirectory()
+        self._subject = ImageDownloadCache(os.path.join(self._directory.name, 'cache'), max_size=10)
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def test_store_should_share_content_between_urls(self):
+        first_path = self._subject.store('http://host/a.png', io.BytesIO(b'image'), etag='"1"')
+        second_path = self._subject.store('http://host/b.png?size=large', io.BytesIO(b'image'))
+
+        self.assertEqual(first_path, second_path)
+        self.assertEqual('"1"', self._subject.lookup('http://host/a.png').etag)
+        self.assertEqual(first_path, self._subject.lookup('http://host/b.png?size=large').path)
+        self.assertIsNone(self._subject.lookup('http://host/c.png'))
+
+    def test_evict_should_remove_least_recently_used_images_over_max_size(self):
+        old_path = self._subject.store('http://host/old.png', io.BytesIO(b'123456'))
+        recent_path = self._subject.store('http://host/recent.png', io.BytesIO(b'abcdef'))
+        os.utime(old_path, (time.time() - 7200, time.time() - 7200))
+        os.utime(recent_path, (time.time() - 3600, time.time() - 3600))
+
+        self._subject.evict()
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(recent_path))
+        self.assertIsNone(self._subject.lookup('http://host/old.png'))
+
+    def test_evict_should_keep_recently_used_images_over_max_size(self):
+        first_path = self._subject.store('http://host/a.png', io.BytesIO(b'123456'))
+        second_path = self._subject.store('http://host/b.png', io.BytesIO(b'abcdef'))
+
+        self._subject.evict()
+
+        self.assertTrue(os.path.exists(first_path))
+        self.assertTrue(os.path.exists(second_path))
+
+    def test_lookup_should_ignore_metadata_of_unexpected_shape(self):
+        self._subject.store('http://host/a.png', io.BytesIO(b'image'))
+        for metadata in ('{}', '[]', '{"content": 1}'):
+            with open(self._subject._get_metadata_path('http://host/a.png'), 'w') as f:
+                f.write(metadata)
+
+            self.assertIsNone(self._subject.lookup('http://host/a.png'))
+
+    def _download_twice(self, cache_control: str = None, send_validators: bool = True):
+        with open(os.path.join(self._directory.name, 'image.png'), 'wb') as f:
+            f.write(b'image')
+        handler = type('_RequestHandler', (_CountingRequestHandler,), {'statuses': [], 'cache_control': cache_control,
+                                                                       'send_validators': send_validators})
+        server = HTTPServer(('127.0.0.1', 0), functools.partial(handler, directory=self._directory.name))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        fetcher = RemoteImageFetcher(image_cache=ImageDownloadCache(os.path.join(self._directory.name, 'cache')))
+        url = 'http://127.0.0.1:{}/image.png'.format(server.server_port)
+
+        first_path = fetcher.download(url, self._directory.name)
+        second_path = fetcher.download(url, self._directory.name)
+
+        self.assertEqual(first_path, second_path)
+        return handler.statuses
+
+    def test_fetcher_should_revalidate_cached_image(self):
+        self.assertEqual([200, 304], self._download_twice())
+
+    def test_fetcher_should_download_again_image_without_validator(self):
+        self.assertEqual([200, 200], self._download_twice(send_validators=False))
+
+    def test_fetcher_should_reuse_fresh_image_without_request(self):
+        self.assertEqual([200], self._download_twice(cache_control='max-age=600'))
+        self.assertEqual([200, 304], self._download_twice(cache_control='no-cache'))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+from concurrent.futures import Future
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipIf
+
+from docx.shared import Inches
+
+from docx_generator.adapters.image_optimizer_adapter import Image, ImageOptimizer
+
+
+@skipIf(Image is None, 'Pillow is not installed')
+class TestImageOptimizer(TestCase):
+    def setUp(self) -> None:
+        self._directory = TemporaryDirectory()
+        self._subject = ImageOptimizer(os.path.join(self._directory.name, 'cache'), dpi=100)
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def _save_image(self, name: str, width: int, height: int, **options) -> str:
+        path = os.path.join(self._directory.name, name)
+        Image.new('RGB', (width, height), 'red').save(path, **options)
+        return path
+
+    def test_optimize_should_downsample_image_wider_than_page(self):
+        image_path = self._save_image('screenshot.png', 3840, 2160)
+
+        optimized_path = self._subject.optimize(image_path, Inches(6))
+
+        with Image.open(optimized_path) as optimized_image:
+            self.assertEqual((600, 338), optimized_image.size)
+            self.assertEqual('PNG', optimized_image.format)
+            self.assertAlmostEqual(100, optimized_image.info['dpi'][0], places=0)
+
+    def test_optimize_should_keep_small_image_as_is(self):
+        image_path = self._save_image('icon.png', 32, 32)
+
+        self.assertEqual(image_path, self._subject.optimize(image_path, Inches(6)))
+        self.assertEqual(image_path, self._subject.optimize(image_path, Inches(6)))
+
+    def test_optimize_should_reuse_processed_image_of_same_content(self):
+        first_path = self._subject.optimize(self._save_image('first.jpg', 2000, 1000), Inches(6))
+        second_path = self._subject.optimize(self._save_image('second.jpg', 2000, 1000), Inches(6))
+
+        self.assertEqual(first_path, second_path)
+
+    def test_optimize_should_rotate_jpeg_as_its_exif_orientation_says(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        image_path = self._save_image('photo.jpg', 40, 20, exif=exif.tobytes())
+
+        optimized_path = self._subject.optimize(image_path, Inches(6))
+
+        with Image.open(optimized_path) as optimized_image:
+            self.assertEqual((20, 40), optimized_image.size)
+            self.assertNotIn('exif', optimized_image.info)
+
+    def test_optimize_should_convert_unsupported_formats_to_png(self):
+        optimized_path = self._subject.optimize(self._save_image('capture.bmp', 10, 10), Inches(6))
+
+        with Image.open(optimized_path) as optimized_image:
+            self.assertEqual('PNG', optimized_image.format)
+
+    def test_submit_should_optimize_once_image_path_is_known(self):
+        image_path = Future()
+        optimized_path = self._subject.submit(image_path, Inches(6))
+
+        image_path.set_result(self._save_image('downloaded.png', 1000, 1000))
+
+        with Image.open(optimized_path.result(timeout=10)) as optimized_image:
+            self.assertEqual((600, 600), optimized_image.size)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import pickle
+from unittest import TestCase
+
+from docx_generator.adapters.docx.style_adapter import DocxStyleAdapter
+from docx_generator.cache.markdown_cache import LINK_PLACEHOLDER, MarkdownCache, RenderedMarkdown
+
+
+class TestMarkdownCache(TestCase):
+    def test_resolve_should_replace_link_placeholders_by_relationship_ids(self):
+        xml = '<w:hyperlink r:id="{}"/><w:hyperlink r:id="{}"/>'.format(LINK_PLACEHOLDER.format(0), LINK_PLACEHOLDER.format(1))
+        rendered_markdown = RenderedMarkdown(xml, ('http://a', 'http://b'))
+        relationship_ids = {'http://a': 'rId7', 'http://b': 'rId9'}
+
+        self.assertEqual('<w:hyperlink r:id="rId7"/><w:hyperlink r:id="rId9"/>', rendered_markdown.resolve(relationship_ids.get))
+
+    def test_get_statistics_should_compute_hit_rate(self):
+        cache = MarkdownCache()
+        key = cache.get_key('**text**', 'default', 'style hash')
+        cache.get(key)
+        cache.put(key, RenderedMarkdown('<w:p/>'))
+        cache.get(key)
+        cache.get(key)
+
+        statistics = cache.get_statistics()
+        self.assertEqual(2, statistics['hits'])
+        self.assertAlmostEqual(2 / 3, statistics['hit_rate'])
+
+    def test_pickle_should_keep_bounds_of_the_cache_without_its_entries(self):
+        cache = MarkdownCache(max_entries=1)
+        first_key = cache.get_key('first', 'default', 'style hash')
+        cache.put(first_key, RenderedMarkdown('<w:p/>'))
+
+        worker_cache = pickle.loads(pickle.dumps(cache))
+        second_key = cache.get_key('second', 'default', 'style hash')
+        worker_cache.put(second_key, RenderedMarkdown('<w:p/>'))
+        worker_cache.put(first_key, RenderedMarkdown('<w:p/>'))
+
+        self.assertIsNone(worker_cache.get(second_key))
+        self.assertEqual(1, worker_cache.get_statistics()['evictions'])
+        self.assertIsNotNone(cache.get(first_key))
+
+    def test_style_content_hash_should_only_depend_on_style_content(self):
+        first_style = DocxStyleAdapter(name='default', paragraph='<w:pPr/>', strong='<w:rPr><w:b/></w:rPr>')
+        same_style = DocxStyleAdapter(name='default', strong='<w:rPr><w:b/></w:rPr>', paragraph='<w:pPr/>')
+        other_style = DocxStyleAdapter(name='default', paragraph='<w:pPr><w:jc w:val="center"/></w:pPr>')
+
+        self.assertEqual(first_style.content_hash, same_style.content_hash)
+        self.assertNotEqual(first_style.content_hash, other_style.content_hash)
+        self.assertIsNone(other_style.strong)
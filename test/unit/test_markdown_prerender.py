@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import io
+import os
+from unittest import TestCase
+
+from docx import Document
+from docxtpl import DocxTemplate
+
+from docx_generator.cache.markdown_cache import MarkdownCache
+from docx_generator.cache.template_cache import TemplateCache
+from docx_generator.workers.markdown_prerender import ITEMS, MarkdownPrerenderer, find_markdown_fields, iter_field_texts, parse_data_path
+
+
+class TestMarkdownPrerender(TestCase):
+    def _build_template(self, *lines: str) -> DocxTemplate:
+        document = Document()
+        for line in lines:
+            document.add_paragraph(line)
+        stream = io.BytesIO()
+        document.save(stream)
+
+        template = DocxTemplate(stream)
+        template.init_docx()
+        return template
+
+    def test_find_markdown_fields_should_follow_loops_and_attributes(self):
+        template = self._build_template(
+            '{%p for finding in report.findings %}',
+            '{{p finding.notes|markdown("analyst") }}',
+            '{%p endfor %}',
+            '{{p summary|markdown }}',
+            '{{p summary|upper|markdown }}',
+            '{{p description|markdown(style) }}'
+        )
+
+        self.assertEqual({('report', 'findings', ITEMS, 'notes'): 'analyst', ('summary',): 'default'}, find_markdown_fields(template))
+
+    def test_iter_field_texts_should_find_texts_of_every_item(self):
+        data = {'report': {'findings': [{'notes': 'first'}, {'notes': 'second'}, {'title': 'no notes'}]}}
+
+        texts = list(iter_field_texts(data, parse_data_path('report.findings[].notes')))
+
+        self.assertEqual(['first', 'second'], texts)
+        self.assertEqual(('notes', ITEMS, ITEMS, 'text'), parse_data_path('notes[][].text'))
+
+    def test_prerender_should_start_new_workers_once_a_worker_died(self):
+        template, styles = TemplateCache().load(os.path.join(os.getcwd(), 'test/component/templates/markdown_filter_template.docx'))
+        subject = MarkdownPrerenderer(max_workers=1, min_characters=0)
+        self.addCleanup(subject.shutdown)
+
+        self.assertEqual(1, len(subject.prerender(template, styles, {'text_for_paragraph': '**first**'})))
+        for process in list(subject._executor._processes.values()):
+            process.kill()
+            process.join()
+
+        self.assertEqual(dict(), subject.prerender(template, styles, {'text_for_paragraph': '**second**'}))
+        self.assertEqual(1, len(subject.prerender(template, styles, {'text_for_paragraph': '**third**'})))
+
+    def test_prerender_should_not_count_cache_probes_in_statistics(self):
+        template_cache = TemplateCache()
+        template_path = os.path.join(os.getcwd(), 'test/component/templates/markdown_filter_template.docx')
+        markdown_cache = MarkdownCache()
+        subject = MarkdownPrerenderer(max_workers=1, min_characters=0)
+        self.addCleanup(subject.shutdown)
+
+        for _ in range(2):
+            template, styles = template_cache.load(template_path)
+            subject.prerender(template, styles, {'text_for_paragraph': '**first**'}, markdown_cache)
+
+        self.assertEqual(1, markdown_cache.get_statistics()['entries'])
+        self.assertEqual(0, markdown_cache.get_statistics()['hits'] + markdown_cache.get_statistics()['misses'])
+        self.assertEqual(1, len(subject._template_fields))
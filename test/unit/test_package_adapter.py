@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import io
+import zipfile
+from unittest import TestCase
+
+from docx import Document
+from docxtpl import DocxTemplate
+
+from docx_generator.adapters.docx.package_adapter import get_rendered_xml_hash, get_uncompressed_size, has_jinja_tags
+
+
+class TestPackageAdapter(TestCase):
+    def setUp(self) -> None:
+        self._subject = DocxTemplate(None)
+        self._subject.docx = Document()
+        self._subject.docx.add_paragraph('Plain text with a single { brace')
+
+    def test_has_jinja_tags_should_be_false_without_tags(self):
+        self.assertFalse(has_jinja_tags(self._subject))
+
+    def test_has_jinja_tags_should_find_tags_split_across_runs(self):
+        paragraph = self._subject.docx.add_paragraph('{{ ')
+        paragraph.add_run('variable }}')
+
+        self.assertTrue(has_jinja_tags(self._subject))
+
+    def test_has_jinja_tags_should_find_tags_in_nested_tables(self):
+        outer_cell = self._subject.docx.add_table(rows=1, cols=1).cell(0, 0)
+        outer_cell.add_table(rows=1, cols=1).cell(0, 0).paragraphs[0].text = '{% if value %}'
+
+        self.assertTrue(has_jinja_tags(self._subject))
+
+    def test_has_jinja_tags_should_find_tags_in_headers(self):
+        self._subject.docx.sections[0].header.paragraphs[0].text = '{{ title }}'
+
+        self.assertTrue(has_jinja_tags(self._subject))
+
+    def test_get_rendered_xml_hash_should_change_with_document(self):
+        xml_hash = get_rendered_xml_hash(self._subject)
+        self.assertEqual(xml_hash, get_rendered_xml_hash(self._subject))
+
+        self._subject.docx.add_paragraph('New paragraph')
+
+        self.assertNotEqual(xml_hash, get_rendered_xml_hash(self._subject))
+
+    def test_get_uncompressed_size_should_sum_package_files(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as package:
+            package.writestr('word/document.xml', 'a' * 1000)
+            package.writestr('[Content_Types].xml', 'b' * 24)
+
+        self.assertEqual(1024, get_uncompressed_size(buffer.getvalue()))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import io
+import os
+import zipfile
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from docx import Document
+from docxtpl import DocxTemplate
+
+from docx_generator.adapters.docx.package_writer import DocxPackageWriter
+
+
+class TestDocxPackageWriter(TestCase):
+    def setUp(self) -> None:
+        self._template = DocxTemplate(None)
+        self._template.docx = Document()
+        self._template.docx.add_paragraph('Paragraph ' * 1000)
+        self._template.docx.add_picture(os.path.join(os.getcwd(), 'test/component/images/test_image_small.jpg'))
+
+    def _save(self, subject: DocxPackageWriter) -> zipfile.ZipFile:
+        output = io.BytesIO()
+        subject.save(self._template, output)
+        return zipfile.ZipFile(output)
+
+    def test_save_should_store_media_and_deflate_xml_parts(self):
+        package = self._save(DocxPackageWriter())
+
+        self.assertIsNone(package.testzip())
+        compression_types = {item.filename: item.compress_type for item in package.infolist()}
+        self.assertEqual(zipfile.ZIP_STORED, compression_types['word/media/image1.jpg'])
+        self.assertEqual(zipfile.ZIP_DEFLATED, compression_types['word/document.xml'])
+        self.assertEqual(1, len(Document(io.BytesIO(package.fp.getvalue())).inline_shapes))
+
+    def test_save_should_write_same_parts_as_docxtpl(self):
+        expected_output = io.BytesIO()
+        self._template.save(expected_output)
+        expected_package = zipfile.ZipFile(expected_output)
+
+        package = self._save(DocxPackageWriter(compression_level=1, max_workers=2, parallel_threshold=0, stored_extensions=()))
+
+        self.assertEqual(expected_package.namelist(), package.namelist())
+        for name in package.namelist():
+            self.assertEqual(zipfile.ZIP_DEFLATED, package.getinfo(name).compress_type)
+            self.assertEqual(expected_package.read(name), package.read(name), name)
+
+    def test_save_should_write_to_file(self):
+        with TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, 'result.docx')
+
+            DocxPackageWriter().save(self._template, output_path)
+
+            self.assertTrue(self._template.is_saved)
+            self.assertEqual('Paragraph ' * 1000, Document(output_path).paragraphs[0].text)
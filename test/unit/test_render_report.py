@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import threading
+import tracemalloc
+from unittest import TestCase
+
+from docx_generator.profiling.render_report import RenderReport, report_phase
+
+
+class TestRenderReport(TestCase):
+    def test_should_record_peak_memory_of_nested_phases(self):
+        subject = RenderReport()
+        subject.start()
+        with subject.phase('outer', level=1):
+            with subject.phase('inner') as details:
+                buffer = bytearray(4 * 1024 * 1024)
+                details['size'] = len(buffer)
+                del buffer
+        subject.stop()
+
+        inner, outer = subject.phases
+        self.assertEqual(('inner', 'outer'), (inner.name, outer.name))
+        self.assertEqual({'size': 4 * 1024 * 1024}, inner.details)
+        self.assertEqual({'level': 1}, outer.details)
+        self.assertGreaterEqual(inner.peak_memory, 4 * 1024 * 1024)
+        self.assertGreaterEqual(outer.peak_memory, inner.peak_memory)
+        self.assertGreaterEqual(subject.peak_memory, outer.peak_memory)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_should_not_trace_memory_of_phases_in_other_threads(self):
+        subject = RenderReport()
+        subject.start()
+
+        def run_phase():
+            with subject.phase('background'):
+                subject.count('images')
+
+        thread = threading.Thread(target=run_phase)
+        thread.start()
+        thread.join()
+        subject.stop()
+
+        self.assertIsNone(subject.get_phases('background')[0].peak_memory)
+        self.assertEqual(1, subject.to_dict()['counters']['images'])
+
+    def test_report_phase_should_do_nothing_without_report(self):
+        with report_phase(None, 'phase', level=1) as details:
+            details['cached'] = True
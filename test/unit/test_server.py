@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import os
+import shutil
+import threading
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from docx_generator.workers.server import STATUS_REJECTED, STATUS_SUCCESS, STATUS_TIMEOUT, ReportServer
+
+
+class TestReportServer(TestCase):
+    def setUp(self) -> None:
+        self._directory = TemporaryDirectory()
+        shutil.copy('test/component/templates/basic_template.docx', self._directory.name)
+        os.mkdir(os.path.join(self._directory.name, 'output'))
+
+        self._results = []
+        self._lock = threading.Lock()
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def _reply(self, result):
+        with self._lock:
+            self._results.append(result)
+
+    def _run(self, server: ReportServer, job_count: int) -> None:
+        server.start()
+        for index in range(job_count):
+            server.submit({'id': index, 'base_path': self._directory.name, 'template_path': 'basic_template.docx',
+                           'data': {}, 'output_path': 'output/{}.docx'.format(index)}, self._reply)
+        server.close()
+
+    def test_server_should_generate_jobs_over_recycled_workers(self):
+        server = ReportServer(templates=[(self._directory.name, 'basic_template.docx')], max_workers=2, max_jobs_per_worker=1)
+
+        self._run(server, 5)
+
+        self.assertEqual([STATUS_SUCCESS] * 5, [result['status'] for result in sorted(self._results, key=lambda result: result['id'])])
+        self.assertEqual(5, len(os.listdir(os.path.join(self._directory.name, 'output'))))
+
+    def test_server_should_reject_jobs_over_max_pending(self):
+        self._run(ReportServer(max_workers=1, max_pending=1), 4)
+
+        statuses = [result['status'] for result in self._results]
+        self.assertIn(STATUS_REJECTED, statuses)
+        self.assertEqual(set(), set(statuses) - {STATUS_REJECTED, STATUS_SUCCESS})
+
+    def test_server_should_stop_jobs_running_over_timeout(self):
+        self._run(ReportServer(max_workers=1, job_timeout=0.001), 2)
+
+        self.assertEqual([STATUS_TIMEOUT, STATUS_TIMEOUT], [result['status'] for result in self._results])
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from typing import Set, Tuple
+from unittest import TestCase
+
+import mistletoe
+from docx import Document
+from docxtpl import DocxTemplate
+
+from docx_generator.adapters.docx.docx_adapter import list_level_style, make_paragraph
+from docx_generator.adapters.docx.style_adapter import LIST_LEVELS, DocxStyleAdapter
+from docx_generator.adapters.mistletoe.DocxRenderer import DocxRenderer
+
+_LIST_PPR = '<w:pPr><w:numPr><w:ilvl w:val="0"/><w:numId w:val="1"/></w:numPr></w:pPr>'
+
+
+class TestCompiledStyle(TestCase):
+    def setUp(self) -> None:
+        self._template = DocxTemplate('test/unit/template/test_template.docx')
+        self._template.docx = Document('test/unit/template/test_template.docx')
+
+    def _render(self, style: DocxStyleAdapter, markdown: str) -> Tuple[str, Set[str]]:
+        renderer = DocxRenderer(self._template)
+        renderer.set_style(style)
+        xml = mistletoe.markdown(markdown, renderer)
+        return xml, renderer.warnings
+
+    def test_compiled_style_should_hold_item_openings_of_each_list_level(self):
+        compiled_style = DocxStyleAdapter(name='default', ul=_LIST_PPR).compiled
+
+        self.assertEqual(LIST_LEVELS, len(compiled_style.ul_levels))
+        self.assertEqual('<w:p>' + _LIST_PPR, compiled_style.ul_levels[0])
+        self.assertEqual('</w:p><w:p>' + list_level_style(_LIST_PPR, 3), compiled_style.ul_levels[3])
+        self.assertIsNone(compiled_style.ol_levels)
+        with self.assertRaises(AttributeError):
+            compiled_style.ul = '<w:pPr/>'
+
+    def test_nested_list_should_render_as_with_list_level_style(self):
+        style = DocxStyleAdapter(name='default', ul=_LIST_PPR, paragraph='<w:pPr/>')
+        markdown = '* first\n  * second\n' + ''.join('  ' * level + '* item\n' for level in range(12))
+
+        xml, _ = self._render(style, markdown)
+
+        self.assertIn(make_paragraph(list_level_style(_LIST_PPR, 1), '<w:r><w:t xml:space="preserve">second</w:t></w:r>', True), xml)
+        self.assertIn(list_level_style(_LIST_PPR, 11), xml)
+
+    def test_renderer_should_only_warn_about_undefined_descriptors_of_the_render(self):
+        style = DocxStyleAdapter(name='default', paragraph='<w:pPr/>')
+
+        _, first_warnings = self._render(style, '**strong**\n\n# Title\n')
+        _, second_warnings = self._render(style, 'text\n')
+
+        self.assertEqual({'Try to use strong on style default but is not defined', 'Try to use header1 on style default but is not defined'},
+                         first_warnings)
+        self.assertEqual(set(), second_warnings)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import os
+import pickle
+import shutil
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from docx_generator.cache.sub_document_cache import SubDocumentCache
+
+
+class TestSubDocumentCache(TestCase):
+    def setUp(self) -> None:
+        self._directory = TemporaryDirectory()
+        self._sub_document_path = os.path.join(self._directory.name, 'annex.docx')
+        shutil.copy('test/component/templates/sub_document_filter_template_part.docx', self._sub_document_path)
+
+        self._subject = SubDocumentCache()
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def test_load_should_return_independent_copies(self):
+        first_document, first_is_cached = self._subject.load(self._sub_document_path)
+        second_document, second_is_cached = self._subject.load(self._sub_document_path)
+
+        first_document.add_paragraph('Only in the first copy')
+
+        self.assertFalse(first_is_cached)
+        self.assertTrue(second_is_cached)
+        self.assertNotEqual(len(first_document.paragraphs), len(second_document.paragraphs))
+
+    def test_load_should_reuse_touched_but_unchanged_sub_document(self):
+        self._subject.load(self._sub_document_path)
+        os.utime(self._sub_document_path, ns=(0, 0))
+
+        _, is_cached = self._subject.load(self._sub_document_path)
+
+        self.assertTrue(is_cached)
+        self.assertEqual(1, self._subject.get_statistics()['entries'])
+
+    def test_load_should_evict_sub_documents_over_max_memory(self):
+        subject = SubDocumentCache(max_memory=1)
+
+        subject.load(self._sub_document_path)
+
+        self.assertEqual(0, subject.get_statistics()['entries'])
+
+    def test_pickled_cache_should_start_empty(self):
+        self._subject.load(self._sub_document_path)
+
+        subject = pickle.loads(pickle.dumps(self._subject))
+        _, is_cached = subject.load(self._sub_document_path)
+
+        self.assertFalse(is_cached)
+        self.assertEqual(1, subject.get_statistics()['entries'])
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import shutil
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from docx_generator.cache.lru_cache import LruCache
+from docx_generator.cache.template_cache import TemplateCache
+
+
+class TestTemplateCache(TestCase):
+    def setUp(self) -> None:
+        self._directory = TemporaryDirectory()
+        self._template_path = os.path.join(self._directory.name, 'test_template.docx')
+        shutil.copy('test/unit/template/test_template.docx', self._template_path)
+
+        self._subject = TemplateCache()
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def test_load_should_count_a_miss_then_a_hit(self):
+        self._subject.load(self._template_path)
+        self._subject.load(self._template_path)
+
+        statistics = self._subject.get_statistics()
+        self.assertEqual(1, statistics['misses'])
+        self.assertEqual(1, statistics['hits'])
+
+    def test_load_should_return_independent_copies(self):
+        first_template, first_styles = self._subject.load(self._template_path)
+        second_template, second_styles = self._subject.load(self._template_path)
+
+        first_template.docx.add_paragraph('Only in the first copy')
+
+        self.assertIsNot(first_template.docx, second_template.docx)
+        self.assertNotEqual(len(first_template.docx.paragraphs), len(second_template.docx.paragraphs))
+        self.assertIs(first_styles, second_styles)
+
+    def test_load_should_reload_modified_template(self):
+        template, _ = self._subject.load(self._template_path)
+        template.docx.add_paragraph('Modified template')
+        template.docx.save(self._template_path)
+        os.utime(self._template_path, ns=(0, 0))
+
+        reloaded_template, _ = self._subject.load(self._template_path)
+
+        self.assertEqual('Modified template', reloaded_template.docx.paragraphs[-1].text)
+        self.assertEqual(1, self._subject.get_statistics()['entries'])
+
+    def test_lru_cache_should_evict_least_recently_used_entry(self):
+        cache = LruCache(max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(1, cache.get_statistics()['evictions'])
+
+    def test_lru_cache_should_evict_entries_over_max_size(self):
+        cache = LruCache(max_entries=10, max_size=10)
+        cache.put('a', 1, size=6)
+        cache.put('b', 2, size=6)
+
+        self.assertNotIn('a', cache)
+        self.assertEqual(6, cache.get_statistics()['size'])
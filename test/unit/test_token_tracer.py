@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#
+#  docx-generator Source Code
+#  Copyright (C) 2021 - Airbus CyberSecurity (SAS)
+#  ir@cyberactionlab.net
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import logging
+import pickle
+from unittest import TestCase
+
+import mistletoe
+from docx import Document
+from docxtpl import DocxTemplate
+
+from docx_generator.adapters.docx.style_adapter import DocxStyleAdapter
+from docx_generator.adapters.logging_adapter import TokenTracer
+from docx_generator.adapters.mistletoe.DocxRenderer import DocxRenderer
+
+
+class TestTokenTracer(TestCase):
+    def setUp(self) -> None:
+        self._template = DocxTemplate('test/unit/template/test_template.docx')
+        self._template.docx = Document('test/unit/template/test_template.docx')
+        self._style = DocxStyleAdapter(name='default', paragraph='<w:pPr/>', strong='<w:rPr><w:b/></w:rPr>')
+
+    def _render(self, renderer: DocxRenderer, markdown: str) -> str:
+        renderer.set_style(self._style)
+        return mistletoe.markdown(markdown, renderer)
+
+    def test_should_count_rendered_tokens_by_type(self):
+        tracer = TokenTracer(max_dumps=2, max_dump_depth=0)
+        renderer = DocxRenderer(self._template, token_tracer=tracer)
+
+        self._render(renderer, 'First **strong** paragraph\n\nSecond paragraph\n')
+
+        statistics = tracer.get_statistics()
+        self.assertEqual(2, statistics['Paragraph']['count'])
+        self.assertEqual(1, statistics['Strong']['count'])
+        self.assertEqual(1, statistics['Document']['count'])
+        self.assertGreaterEqual(statistics['Document']['time'], statistics['Paragraph']['time'])
+
+        dumps = tracer.get_dumps()
+        self.assertEqual(2, len(dumps))
+        self.assertEqual('Document', dumps[0]['type'])
+        self.assertEqual('2 children', dumps[0]['children'])
+
+    def test_should_trace_tokens_with_a_copy_sent_to_a_worker(self):
+        tracer = pickle.loads(pickle.dumps(TokenTracer(max_dumps=1)))
+        renderer = DocxRenderer(self._template, token_tracer=tracer)
+
+        self._render(renderer, '**strong**\n')
+
+        self.assertEqual(1, tracer.get_statistics()['Strong']['count'])
+        self.assertEqual(1, len(tracer.get_dumps()))
+
+    def test_should_not_wrap_render_functions_without_tracer(self):
+        logging.getLogger('docx_generator.adapters.mistletoe.DocxRenderer').setLevel(logging.INFO)
+        self.addCleanup(logging.getLogger('docx_generator.adapters.mistletoe.DocxRenderer').setLevel, logging.NOTSET)
+
+        renderer = DocxRenderer(self._template)
+
+        self.assertEqual(renderer.render_strong, renderer.render_map['Strong'])
+        self.assertIn('<w:b/>', self._render(renderer, '**strong**\n'))